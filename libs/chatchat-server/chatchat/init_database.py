@@ -12,6 +12,8 @@ from chatchat.server.knowledge_base.migrate import (
     create_tables,
     folder2db,
     import_from_db,
+    migrate_tables,
+    pg_index_stats,
     prune_db_docs,
     prune_folder_files,
     reset_tables,
@@ -34,6 +36,10 @@ def worker(args: dict):
             reset_tables()
             print("database tables reset")
 
+        if args.get("migrate_tables"):
+            migrate_tables()
+            print("database tables migrated")
+
         if args.get("recreate_vs"):
             create_tables()
             print("recreating all vector stores")
@@ -54,6 +60,8 @@ def worker(args: dict):
             prune_db_docs(args.get("kb_name"))
         elif args.get("prune_folder"):
             prune_folder_files(args.get("kb_name"))
+        elif args.get("pg_index_stats"):
+            pg_index_stats(args.get("kb_name"))
 
         end_time = datetime.now()
         print(f"总计用时\t：{end_time-start_time}\n")
@@ -85,6 +93,13 @@ def worker(args: dict):
             "create empty tables, or drop the database tables before recreate vector stores"
         ),
 )
+@click.option(
+        "--migrate-tables",
+        is_flag=True,
+        help=(
+            "upgrade tables created by older versions: add new columns and indexes"
+        ),
+)
 @click.option(
         "-u",
         "--update-in-db",
@@ -127,6 +142,15 @@ def worker(args: dict):
             """
         ),
 )
+@click.option(
+        "--pg-index-stats",
+        is_flag=True,
+        help=(
+            """
+            show vector index health and size of pg knowledge bases.
+            """
+        ),
+)
 @click.option(
         "-n",
         "--kb-name",
@@ -140,7 +164,7 @@ def worker(args: dict):
         "-e",
         "--embed-model",
         type=str,
-        default=get_default_embedding(),
+        default=get_default_embedding,
         help=("specify embeddings model."),
 )
 @click.option(
@@ -4,9 +4,10 @@ from functools import cached_property
 from io import StringIO
 import os
 from pathlib import Path
+import threading
 import typing as t
 
-from memoization import cached, CachingAlgorithmFlag
+from loguru import logger
 from pydantic import BaseModel, Field, ConfigDict, computed_field
 from pydantic_settings import BaseSettings, PydanticBaseSettingsSource, YamlConfigSettingsSource, SettingsConfigDict
 import ruamel.yaml
@@ -15,7 +16,7 @@ from ruamel.yaml.comments import CommentedBase, TaggedScalar
 
 __all__ = ["YamlTemplate", "MyBaseModel", "BaseFileSettings", "Field",
            "SubModelComment", "SettingsConfigDict",
-           "computed_field", "cached_property", "settings_property"]
+           "computed_field", "cached_property", "settings_property", "settings_watcher"]
 
 
 def import_yaml() -> ruamel.yaml.YAML:
@@ -231,25 +232,106 @@ def _lazy_load_key(settings: BaseSettings):
     for n in ["env_file", "json_file", "yaml_file", "toml_file"]:
         key = None
         if file := settings.model_config.get(n):
-            if os.path.isfile(file) and os.path.getsize(file) > 0:
-                key = int(os.path.getmtime(file))
+            try:
+                stat = os.stat(file)
+            except OSError:
+                stat = None
+            if stat is not None and stat.st_size > 0:
+                key = (stat.st_mtime_ns, stat.st_size)
         keys.append(key)
     return tuple(keys)
 
 
 _T = t.TypeVar("_T", bound=BaseFileSettings)
 
-@cached(max_size=1, algorithm=CachingAlgorithmFlag.LRU, thread_safe=True, custom_key_maker=_lazy_load_key)
-def _cached_settings(settings: _T) -> _T:
+
+class _SettingsHolder(t.Generic[_T]):
+    """
+    持有当前生效的配置对象。配置文件变化时创建新的配置对象并整体替换，
+    已经取得的旧对象不会被修改。
+    """
+
+    def __init__(self, settings: _T):
+        self.settings = settings
+        self.key = _lazy_load_key(settings)
+
+    def reload(self, force: bool = False) -> bool:
+        settings = self.settings
+        if not (settings.auto_reload or force):
+            return False
+        key = _lazy_load_key(settings)
+        if key == self.key and not force:
+            return False
+        try:
+            new_settings = settings.__class__()
+        except Exception as e:
+            # 配置文件可能正在编辑中，保留原有配置，等待下次检查
+            logger.warning(f"failed to reload {settings.__class__.__name__}: {e}")
+            return False
+        new_settings.auto_reload = settings.auto_reload
+        self.settings, self.key = new_settings, key
+        return True
+
+
+class SettingsWatcher:
     """
-    the sesstings is cached, and refreshed when configuration files changed
+    在后台线程中定期检查配置文件，文件变化后重新加载。
+    读取配置时只是一次内存访问，不再产生文件系统调用。
     """
-    if settings.auto_reload:
-        settings.__init__()
-    return settings
+
+    def __init__(self, interval: float = 1):
+        self.interval = interval
+        self._holders: t.List[_SettingsHolder] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def register(self, holder: _SettingsHolder):
+        with self._lock:
+            self._holders.append(holder)
+        self.start()
+
+    def check(self, force: bool = False) -> t.List[str]:
+        """检查所有配置文件，返回重新加载的配置类名"""
+        reloaded = []
+        with self._lock:
+            for holder in self._holders:
+                if holder.reload(force=force):
+                    reloaded.append(holder.settings.__class__.__name__)
+        return reloaded
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="SettingsWatcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread = None
+
+    def _after_fork(self):
+        # 子进程中不会继承线程，需要重新创建锁和线程
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        if self._holders:
+            self.start()
+
+
+settings_watcher = SettingsWatcher()
+os.register_at_fork(after_in_child=settings_watcher._after_fork)
 
 
 def settings_property(settings: _T):
+    holder = _SettingsHolder(settings)
+    settings_watcher.register(holder)
+
     def wrapper(self) -> _T:
-        return _cached_settings(settings)
+        return holder.settings
     return property(wrapper)
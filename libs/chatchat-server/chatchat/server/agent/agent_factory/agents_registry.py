@@ -1,3 +1,4 @@
+from functools import lru_cache
 from typing import List, Sequence
 
 from langchain import hub
@@ -14,6 +15,14 @@ from chatchat.server.agent.agent_factory.glm3_agent import (
 )
 
 
+@lru_cache
+def _default_structured_chat_prompt() -> ChatPromptTemplate:
+    """
+    默认的 structured chat agent 模板只从 langchain hub 下载一次
+    """
+    return hub.pull("hwchase17/structured-chat-agent")
+
+
 def agents_registry(
         llm: BaseLanguageModel,
         tools: Sequence[BaseTool] = [],
@@ -42,7 +51,7 @@ def agents_registry(
         if prompt is not None:
             prompt = ChatPromptTemplate.from_messages([SystemMessage(content=prompt)])
         else:
-            prompt = hub.pull("hwchase17/structured-chat-agent")  # default prompt
+            prompt = _default_structured_chat_prompt()  # default prompt
         agent = create_structured_chat_agent(llm=llm, tools=tools, prompt=prompt)
 
         agent_executor = AgentExecutor(
@@ -35,7 +35,7 @@ def search_knowledgebase(query: str, database: str, config: dict):
 def search_local_knowledgebase(
     database: str = Field(
         description="Database for Knowledge Search",
-        choices=[kb.kb_name for kb in list_kbs().data],
+        choices=[kb.kb_name for kb in list_kbs(cursor=None, limit=None).data],
     ),
     query: str = Field(description="Query for Knowledge Search"),
 ):
@@ -1,7 +1,6 @@
 from langchain.chains import LLMChain
 from langchain_community.utilities import SQLDatabase
 from langchain_core.prompts.prompt import PromptTemplate
-from langchain_experimental.sql import SQLDatabaseChain, SQLDatabaseSequentialChain
 from sqlalchemy import event
 from sqlalchemy.exc import OperationalError
 
@@ -45,6 +44,9 @@ def intercept_sql(conn, cursor, statement, parameters, context, executemany):
 
 
 def query_database(query: str, config: dict):
+    # langchain_experimental 导入较慢，在调用工具时才导入
+    from langchain_experimental.sql import SQLDatabaseChain, SQLDatabaseSequentialChain
+
     model_name= config["model_name"]
     top_k = config["top_k"]
     return_intermediate_steps = config["return_intermediate_steps"]
@@ -33,7 +33,7 @@ class OpenAIBaseInput(BaseModel):
 
 class OpenAIChatInput(OpenAIBaseInput):
     messages: List[ChatCompletionMessageParam]
-    model: str = get_default_llm()
+    model: str = Field(default_factory=get_default_llm)
     frequency_penalty: Optional[float] = None
     function_call: Optional[completion_create_params.FunctionCall] = None
     functions: List[completion_create_params.Function] = None
@@ -11,7 +11,7 @@ from chatchat.server.chat.chat import chat
 from chatchat.server.chat.kb_chat import kb_chat
 from chatchat.server.chat.feedback import chat_feedback
 from chatchat.server.chat.file_chat import file_chat
-from chatchat.server.db.repository import add_message_to_db
+from chatchat.server.db.repository import aadd_message_to_db
 from chatchat.server.utils import (
     get_OpenAIClient,
     get_prompt_template,
@@ -107,7 +107,7 @@ async def chat_completions(
         if tool_input := extra.get("tool_input"):
             try:
                 message_id = (
-                    add_message_to_db(
+                    await aadd_message_to_db(
                         chat_type="tool_call",
                         query=body.messages[-1]["content"],
                         conversation_id=conversation_id,
@@ -158,7 +158,7 @@ async def chat_completions(
     if body.tools:
         try:
             message_id = (
-                add_message_to_db(
+                await aadd_message_to_db(
                     chat_type="agent_chat",
                     query=body.messages[-1]["content"],
                     conversation_id=conversation_id,
@@ -189,7 +189,7 @@ async def chat_completions(
     else:  # LLM chat directly
         try: # query is complex object that unable add to db when using qwen-vl-chat 
             message_id = (
-                add_message_to_db(
+                await aadd_message_to_db(
                     chat_type="llm_chat",
                     query=body.messages[-1]["content"],
                     conversation_id=conversation_id,
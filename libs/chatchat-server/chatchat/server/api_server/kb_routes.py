@@ -12,6 +12,9 @@ from chatchat.server.knowledge_base.kb_api import create_kb, delete_kb, list_kbs
 from chatchat.server.knowledge_base.kb_doc_api import (
     delete_docs,
     download_doc,
+    export_docs,
+    export_files,
+    list_docs,
     list_files,
     recreate_vector_store,
     search_docs,
@@ -19,13 +22,16 @@ from chatchat.server.knowledge_base.kb_doc_api import (
     update_info,
     upload_docs,
     search_temp_docs,
+    upload_chunk,
+    upload_status,
+    complete_upload,
 )
 from chatchat.server.knowledge_base.kb_summary_api import (
     recreate_summary_vector_store,
     summary_doc_ids_to_vector_store,
     summary_file_to_vector_store,
 )
-from chatchat.server.utils import BaseResponse, ListResponse
+from chatchat.server.utils import BaseResponse, PageResponse
 from chatchat.server.knowledge_base.kb_cache.faiss_cache import memo_faiss_pool
 
 
@@ -67,7 +73,7 @@ async def kb_chat_endpoint(
 
 
 kb_router.get(
-    "/list_knowledge_bases", response_model=ListResponse, summary="获取知识库列表"
+    "/list_knowledge_bases", response_model=PageResponse, summary="获取知识库列表，指定 limit 时分页返回"
 )(list_kbs)
 
 kb_router.post(
@@ -79,9 +85,21 @@ kb_router.post(
 )(delete_kb)
 
 kb_router.get(
-    "/list_files", response_model=ListResponse, summary="获取知识库内的文件列表"
+    "/list_files", response_model=PageResponse, summary="获取知识库内的文件列表，指定 limit 时分页返回"
 )(list_files)
 
+kb_router.post(
+    "/list_docs", response_model=PageResponse, summary="分页列出知识库内的文档"
+)(list_docs)
+
+kb_router.get(
+    "/export_files", summary="以 NDJSON 格式流式导出知识库内的文件列表"
+)(export_files)
+
+kb_router.post(
+    "/export_docs", summary="以 NDJSON 格式流式导出知识库内的文档"
+)(export_docs)
+
 kb_router.post("/search_docs", response_model=List[dict], summary="搜索知识库")(
     search_docs
 )
@@ -92,6 +110,18 @@ kb_router.post(
     summary="上传文件到知识库，并/或进行向量化",
 )(upload_docs)
 
+kb_router.post(
+    "/upload_chunk", response_model=BaseResponse, summary="分块上传大文件，支持断点续传"
+)(upload_chunk)
+
+kb_router.get(
+    "/upload_status", response_model=BaseResponse, summary="查询分块上传已接收的大小"
+)(upload_status)
+
+kb_router.post(
+    "/complete_upload", response_model=BaseResponse, summary="完成分块上传，保存文件到知识库并/或向量化"
+)(complete_upload)
+
 kb_router.post(
     "/delete_docs", response_model=BaseResponse, summary="删除知识库内指定文件"
 )(delete_docs)
@@ -123,6 +153,11 @@ kb_router.post("/search_temp_docs", summary="检索临时知识库")(
 #     return list(memo_faiss_pool.keys())
 
 
+@kb_router.get("/temp_kb_stats", response_model=BaseResponse, summary="临时知识库缓存统计（当前进程）")
+def temp_kb_stats():
+    return BaseResponse(data=memo_faiss_pool.stats())
+
+
 summary_router = APIRouter(prefix="/kb_summary_api")
 summary_router.post(
     "/summary_file_to_vector_store", summary="单个知识库根据文件名称摘要"
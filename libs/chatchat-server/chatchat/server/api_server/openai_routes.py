@@ -15,6 +15,7 @@ from openai import AsyncClient
 from sse_starlette.sse import EventSourceResponse, ServerSentEvent
 
 from chatchat.settings import Settings
+from chatchat.server.chat.stream_encoder import ChatStreamEncoder, dumps
 from chatchat.server.utils import get_config_platforms, get_model_info, get_OpenAIClient
 from chatchat.utils import build_logger
 
@@ -71,33 +72,32 @@ async def openai_request(
     """
 
     async def generator():
-        try:
-            for x in header:
+        encoder = ChatStreamEncoder(**extra_json)
+
+        def encode_extra(items: Iterable) -> Iterable[str]:
+            for x in items:
                 if isinstance(x, str):
-                    x = OpenAIChatOutput(content=x, object="chat.completion.chunk")
+                    yield encoder.encode(x)
                 elif isinstance(x, dict):
                     x = OpenAIChatOutput.model_validate(x)
+                    for k, v in extra_json.items():
+                        setattr(x, k, v)
+                    yield dumps(x.model_dump())
                 else:
-                    raise RuntimeError(f"unsupported value: {header}")
-                for k, v in extra_json.items():
-                    setattr(x, k, v)
-                yield x.model_dump_json()
+                    raise RuntimeError(f"unsupported value: {items}")
+
+        try:
+            for x in encode_extra(header):
+                yield x
 
             async for chunk in await method(**params):
                 for k, v in extra_json.items():
                     setattr(chunk, k, v)
+                # openai 的响应对象由 pydantic-core 序列化，不需要再转换
                 yield chunk.model_dump_json()
 
-            for x in tail:
-                if isinstance(x, str):
-                    x = OpenAIChatOutput(content=x, object="chat.completion.chunk")
-                elif isinstance(x, dict):
-                    x = OpenAIChatOutput.model_validate(x)
-                else:
-                    raise RuntimeError(f"unsupported value: {tail}")
-                for k, v in extra_json.items():
-                    setattr(x, k, v)
-                yield x.model_dump_json()
+            for x in encode_extra(tail):
+                yield x
         except asyncio.exceptions.CancelledError:
             logger.warning("streaming progress has been interrupted by user.")
             return
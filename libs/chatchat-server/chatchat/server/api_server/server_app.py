@@ -16,6 +16,7 @@ from chatchat.server.api_server.openai_routes import openai_router
 from chatchat.server.api_server.server_routes import server_router
 from chatchat.server.api_server.tool_routes import tool_router
 from chatchat.server.chat.completion import completion
+from chatchat.server.knowledge_base.kb_cache.faiss_cache import memo_faiss_pool
 from chatchat.server.utils import MakeFastAPIOffline
 
 
@@ -51,6 +52,9 @@ def create_app(run_mode: str = None):
         summary="要求llm模型补全(通过LLMChain)",
     )(completion)
 
+    # 定期清理过期的临时知识库及临时目录
+    memo_faiss_pool.start_sweeper()
+
     # 媒体文件
     app.mount("/media", StaticFiles(directory=Settings.basic_settings.MEDIA_PATH), name="media")
 
@@ -61,17 +65,20 @@ def create_app(run_mode: str = None):
     return app
 
 
-def run_api(host, port, **kwargs):
+def run_api(host, port, workers: int = 1, **kwargs):
+    # 多进程模式下 uvicorn 需要以导入字符串的方式在各子进程中创建 app
+    target = "chatchat.server.api_server.server_app:app" if workers > 1 else app
     if kwargs.get("ssl_keyfile") and kwargs.get("ssl_certfile"):
         uvicorn.run(
-            app,
+            target,
             host=host,
             port=port,
+            workers=workers,
             ssl_keyfile=kwargs.get("ssl_keyfile"),
             ssl_certfile=kwargs.get("ssl_certfile"),
         )
     else:
-        uvicorn.run(app, host=host, port=port)
+        uvicorn.run(target, host=host, port=port, workers=workers)
 
 
 app = create_app()
@@ -87,6 +94,7 @@ if __name__ == "__main__":
     parser.add_argument("--port", type=int, default=7861)
     parser.add_argument("--ssl_keyfile", type=str)
     parser.add_argument("--ssl_certfile", type=str)
+    parser.add_argument("--workers", type=int, default=Settings.basic_settings.API_WORKERS)
     # 初始化消息
     args = parser.parse_args()
     args_dict = vars(args)
@@ -94,6 +102,7 @@ if __name__ == "__main__":
     run_api(
         host=args.host,
         port=args.port,
+        workers=args.workers,
         ssl_keyfile=args.ssl_keyfile,
         ssl_certfile=args.ssl_certfile,
     )
@@ -5,7 +5,7 @@ from typing import List
 
 from fastapi import APIRouter, Body, Request
 
-from chatchat.server.utils import BaseResponse, get_tool, get_tool_config
+from chatchat.server.utils import BaseResponse, get_tool, get_tool_config, reload_tools
 from chatchat.utils import build_logger
 
 
@@ -45,3 +45,16 @@ async def call_tool(
             return {"code": 500, "msg": msg}
     else:
         return {"code": 500, "msg": f"no tool named '{name}'"}
+
+
+@tool_router.post("/reload", response_model=BaseResponse)
+async def reload_tool_registry(
+    reimport: bool = Body(False, embed=True, description="是否重新导入工具模块"),
+):
+    try:
+        tools = reload_tools(reimport=reimport)
+        return {"data": list(tools)}
+    except Exception:
+        msg = "failed to reload tools"
+        logger.exception(msg)
+        return {"code": 500, "msg": msg}
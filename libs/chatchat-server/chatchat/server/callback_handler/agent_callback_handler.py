@@ -1,8 +1,8 @@
 from __future__ import annotations
 
 import asyncio
-import json
-from typing import Any, Dict, List, Optional
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List, Optional
 from uuid import UUID
 
 from langchain.callbacks import AsyncIteratorCallbackHandler
@@ -10,10 +10,6 @@ from langchain.schema import AgentAction, AgentFinish
 from langchain_core.outputs import LLMResult
 
 
-def dumps(obj: Dict) -> str:
-    return json.dumps(obj, ensure_ascii=False)
-
-
 class AgentStatus:
     llm_start: int = 1
     llm_new_token: int = 2
@@ -25,42 +21,116 @@ class AgentStatus:
     error: int = 8
 
 
+@dataclass
+class AgentEvent:
+    """
+    Agent 执行过程中的事件，在进程内传递，只在输出到 HTTP 时序列化
+    """
+
+    status: int
+    text: str = ""
+    run_id: Optional[str] = None
+    tool: Optional[str] = None  # 工具名称（tool_start/agent_action）
+    tool_input: Any = None
+    tool_output: Any = None
+    is_error: bool = False
+
+
+class StopSequenceMatcher:
+    """
+    增量匹配停止序列。可能是停止序列开头的尾部字符先暂存，跨多个 token 的停止序列也能识别
+    """
+
+    def __init__(self, stops: List[str]):
+        self.stops = stops
+        self.first_chars = {s[0] for s in stops}
+        self.buffer = ""
+        self.stopped = False
+
+    def feed(self, token: str) -> Optional[str]:
+        """
+        返回可以输出的文本；遇到停止序列时返回其之前的文本，之后的 token 都返回 None
+        """
+        if self.stopped:
+            return None
+        text = self.buffer + token
+        self.buffer = ""
+        if not any(c in text for c in self.first_chars):
+            return text
+
+        pos = min((i for i in (text.find(s) for s in self.stops) if i != -1), default=-1)
+        if pos != -1:
+            self.stopped = True
+            return text[:pos]
+
+        hold = 0
+        for s in self.stops:
+            for n in range(min(len(s) - 1, len(text)), hold, -1):
+                if text.endswith(s[:n]):
+                    hold = n
+                    break
+        if hold:
+            self.buffer = text[-hold:]
+            return text[:-hold]
+        return text
+
+    def flush(self) -> str:
+        """
+        返回暂存的文本（未被确认为停止序列）
+        """
+        text, self.buffer = self.buffer, ""
+        return "" if self.stopped else text
+
+    def reset(self):
+        self.buffer = ""
+        self.stopped = False
+
+
 class AgentExecutorAsyncIteratorCallbackHandler(AsyncIteratorCallbackHandler):
-    def __init__(self):
+    """
+    将 Agent 事件放入有界队列，消费者跟不上时回调会等待，避免事件在内存中无限堆积。
+    done 只在 agent 运行结束时由 wrap_done 设置：嵌套的 chain 结束时若停止消费，
+    agent 仍在运行，队列满后回调会一直等待
+    """
+
+    special_tokens = ["\nAction:", "\nObservation:", "<|observation|>"]
+
+    def __init__(self, maxsize: int = 256):
         super().__init__()
-        self.queue = asyncio.Queue()
+        self.queue: asyncio.Queue[AgentEvent] = asyncio.Queue(maxsize=maxsize)
         self.done = asyncio.Event()
-        self.out = True
+        self.matcher = StopSequenceMatcher(self.special_tokens)
+
+    async def aiter(self) -> AsyncIterator[AgentEvent]:
+        while True:
+            if not self.queue.empty():
+                yield self.queue.get_nowait()
+                continue
+            if self.done.is_set():
+                break
+            get = asyncio.ensure_future(self.queue.get())
+            done = asyncio.ensure_future(self.done.wait())
+            await asyncio.wait([get, done], return_when=asyncio.FIRST_COMPLETED)
+            done.cancel()
+            if get.done():
+                yield get.result()
+            else:
+                get.cancel()
 
     async def on_llm_start(
         self, serialized: Dict[str, Any], prompts: List[str], **kwargs: Any
     ) -> None:
-        data = {
-            "status": AgentStatus.llm_start,
-            "text": "",
-        }
-        self.done.clear()
-        self.queue.put_nowait(dumps(data))
+        await self.queue.put(AgentEvent(AgentStatus.llm_start))
 
     async def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
-        special_tokens = ["\nAction:", "\nObservation:", "<|observation|>"]
-        for stoken in special_tokens:
-            if stoken in token:
-                before_action = token.split(stoken)[0]
-                data = {
-                    "status": AgentStatus.llm_new_token,
-                    "text": before_action + "\n",
-                }
-                self.queue.put_nowait(dumps(data))
-                self.out = False
-                break
-
-        if token is not None and token != "" and self.out:
-            data = {
-                "status": AgentStatus.llm_new_token,
-                "text": token,
-            }
-            self.queue.put_nowait(dumps(data))
+        if not token:
+            return
+        was_stopped = self.matcher.stopped
+        text = self.matcher.feed(token)
+        if self.matcher.stopped and not was_stopped:
+            await self.queue.put(AgentEvent(AgentStatus.llm_new_token, text + "\n"))
+        elif text:
+            await self.queue.put(AgentEvent(AgentStatus.llm_new_token, text))
 
     async def on_chat_model_start(
         self,
@@ -73,28 +143,19 @@ class AgentExecutorAsyncIteratorCallbackHandler(AsyncIteratorCallbackHandler):
         metadata: Optional[Dict[str, Any]] = None,
         **kwargs: Any,
     ) -> None:
-        data = {
-            "status": AgentStatus.llm_start,
-            "text": "",
-        }
-        self.done.clear()
-        self.queue.put_nowait(dumps(data))
+        await self.queue.put(AgentEvent(AgentStatus.llm_start))
 
     async def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
-        data = {
-            "status": AgentStatus.llm_end,
-            "text": response.generations[0][0].message.content,
-        }
-        self.queue.put_nowait(dumps(data))
+        if text := self.matcher.flush():
+            await self.queue.put(AgentEvent(AgentStatus.llm_new_token, text))
+        await self.queue.put(
+            AgentEvent(AgentStatus.llm_end, response.generations[0][0].message.content)
+        )
 
     async def on_llm_error(
         self, error: Exception | KeyboardInterrupt, **kwargs: Any
     ) -> None:
-        data = {
-            "status": AgentStatus.error,
-            "text": str(error),
-        }
-        self.queue.put_nowait(dumps(data))
+        await self.queue.put(AgentEvent(AgentStatus.error, str(error)))
 
     async def on_tool_start(
         self,
@@ -107,13 +168,14 @@ class AgentExecutorAsyncIteratorCallbackHandler(AsyncIteratorCallbackHandler):
         metadata: Optional[Dict[str, Any]] = None,
         **kwargs: Any,
     ) -> None:
-        data = {
-            "run_id": str(run_id),
-            "status": AgentStatus.tool_start,
-            "tool": serialized["name"],
-            "tool_input": input_str,
-        }
-        self.queue.put_nowait(dumps(data))
+        await self.queue.put(
+            AgentEvent(
+                AgentStatus.tool_start,
+                run_id=str(run_id),
+                tool=serialized["name"],
+                tool_input=input_str,
+            )
+        )
 
     async def on_tool_end(
         self,
@@ -125,13 +187,10 @@ class AgentExecutorAsyncIteratorCallbackHandler(AsyncIteratorCallbackHandler):
         **kwargs: Any,
     ) -> None:
         """Run when tool ends running."""
-        data = {
-            "run_id": str(run_id),
-            "status": AgentStatus.tool_end,
-            "tool_output": output,
-        }
         # self.done.clear()
-        self.queue.put_nowait(dumps(data))
+        await self.queue.put(
+            AgentEvent(AgentStatus.tool_end, run_id=str(run_id), tool_output=str(output))
+        )
 
     async def on_tool_error(
         self,
@@ -143,14 +202,15 @@ class AgentExecutorAsyncIteratorCallbackHandler(AsyncIteratorCallbackHandler):
         **kwargs: Any,
     ) -> None:
         """Run when tool errors."""
-        data = {
-            "run_id": str(run_id),
-            "status": AgentStatus.tool_end,
-            "tool_output": str(error),
-            "is_error": True,
-        }
         # self.done.clear()
-        self.queue.put_nowait(dumps(data))
+        await self.queue.put(
+            AgentEvent(
+                AgentStatus.tool_end,
+                run_id=str(run_id),
+                tool_output=str(error),
+                is_error=True,
+            )
+        )
 
     async def on_agent_action(
         self,
@@ -161,13 +221,14 @@ class AgentExecutorAsyncIteratorCallbackHandler(AsyncIteratorCallbackHandler):
         tags: Optional[List[str]] = None,
         **kwargs: Any,
     ) -> None:
-        data = {
-            "status": AgentStatus.agent_action,
-            "tool_name": action.tool,
-            "tool_input": action.tool_input,
-            "text": action.log,
-        }
-        self.queue.put_nowait(dumps(data))
+        await self.queue.put(
+            AgentEvent(
+                AgentStatus.agent_action,
+                action.log,
+                tool=action.tool,
+                tool_input=action.tool_input,
+            )
+        )
 
     async def on_agent_finish(
         self,
@@ -183,11 +244,9 @@ class AgentExecutorAsyncIteratorCallbackHandler(AsyncIteratorCallbackHandler):
                 "Thought:", ""
             )
 
-        data = {
-            "status": AgentStatus.agent_finish,
-            "text": finish.return_values["output"],
-        }
-        self.queue.put_nowait(dumps(data))
+        await self.queue.put(
+            AgentEvent(AgentStatus.agent_finish, finish.return_values["output"])
+        )
 
     async def on_chain_end(
         self,
@@ -198,5 +257,4 @@ class AgentExecutorAsyncIteratorCallbackHandler(AsyncIteratorCallbackHandler):
         tags: List[str] | None = None,
         **kwargs: Any,
     ) -> None:
-        self.done.set()
-        self.out = True
+        self.matcher.reset()
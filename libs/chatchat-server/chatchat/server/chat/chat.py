@@ -1,7 +1,6 @@
 import asyncio
 import json
-import uuid
-from typing import AsyncIterable, List
+from typing import AsyncIterable, Dict, List
 
 from fastapi import Body
 from langchain.chains import LLMChain
@@ -10,12 +9,12 @@ from langchain_core.messages import AIMessage, HumanMessage, convert_to_messages
 from sse_starlette.sse import EventSourceResponse
 
 from chatchat.settings import Settings
-from chatchat.server.agent.agent_factory.agents_registry import agents_registry
-from chatchat.server.api_server.api_schemas import OpenAIChatOutput
 from chatchat.server.callback_handler.agent_callback_handler import (
+    AgentEvent,
     AgentExecutorAsyncIteratorCallbackHandler,
     AgentStatus,
 )
+from chatchat.server.chat.stream_encoder import ChatStreamEncoder, coalesce
 from chatchat.server.chat.utils import History
 from chatchat.server.memory.conversation_db_buffer_memory import (
     ConversationBufferDBMemory,
@@ -85,6 +84,9 @@ def create_models_chains(
         chat_prompt = ChatPromptTemplate.from_messages([input_msg])
 
     if "action_model" in models and tools:
+        # langchain.agents 导入较慢，只在使用 Agent 时导入
+        from chatchat.server.agent.agent_factory.agents_registry import agents_registry
+
         llm = models["action_model"]
         llm.callbacks = callbacks
         agent_executor = agents_registry(
@@ -122,122 +124,133 @@ async def chat(
 ):
     """Agent 对话"""
 
-    async def chat_iterator() -> AsyncIterable[OpenAIChatOutput]:
-        try:
-            callback = AgentExecutorAsyncIteratorCallbackHandler()
-            callbacks = [callback]
+    async def agent_events() -> AsyncIterable[Dict]:
+        callback = AgentExecutorAsyncIteratorCallbackHandler()
+        callbacks = [callback]
 
-            # Enable langchain-chatchat to support langfuse
-            import os
+        # Enable langchain-chatchat to support langfuse
+        import os
 
-            langfuse_secret_key = os.environ.get("LANGFUSE_SECRET_KEY")
-            langfuse_public_key = os.environ.get("LANGFUSE_PUBLIC_KEY")
-            langfuse_host = os.environ.get("LANGFUSE_HOST")
-            if langfuse_secret_key and langfuse_public_key and langfuse_host:
-                from langfuse import Langfuse
-                from langfuse.callback import CallbackHandler
+        langfuse_secret_key = os.environ.get("LANGFUSE_SECRET_KEY")
+        langfuse_public_key = os.environ.get("LANGFUSE_PUBLIC_KEY")
+        langfuse_host = os.environ.get("LANGFUSE_HOST")
+        if langfuse_secret_key and langfuse_public_key and langfuse_host:
+            from langfuse import Langfuse
+            from langfuse.callback import CallbackHandler
 
-                langfuse_handler = CallbackHandler()
-                callbacks.append(langfuse_handler)
+            langfuse_handler = CallbackHandler()
+            callbacks.append(langfuse_handler)
 
-            models, prompts = create_models_from_config(
-                callbacks=callbacks, configs=chat_model_config, stream=stream, max_tokens=max_tokens
-            )
-            all_tools = get_tool().values()
-            tools = [tool for tool in all_tools if tool.name in tool_config]
-            tools = [t.copy(update={"callbacks": callbacks}) for t in tools]
-            full_chain = create_models_chains(
-                prompts=prompts,
-                models=models,
-                conversation_id=conversation_id,
-                tools=tools,
-                callbacks=callbacks,
-                history=history,
-                history_len=history_len,
-                metadata=metadata,
-            )
+        models, prompts = create_models_from_config(
+            callbacks=callbacks, configs=chat_model_config, stream=stream, max_tokens=max_tokens
+        )
+        all_tools = get_tool().values()
+        tools = [tool for tool in all_tools if tool.name in tool_config]
+        tools = [t.copy(update={"callbacks": callbacks}) for t in tools]
+        full_chain = create_models_chains(
+            prompts=prompts,
+            models=models,
+            conversation_id=conversation_id,
+            tools=tools,
+            callbacks=callbacks,
+            history=history,
+            history_len=history_len,
+            metadata=metadata,
+        )
 
-            _history = [History.from_data(h) for h in history]
-            chat_history = [h.to_msg_tuple() for h in _history]
+        _history = [History.from_data(h) for h in history]
+        chat_history = [h.to_msg_tuple() for h in _history]
 
-            history_message = convert_to_messages(chat_history)
+        history_message = convert_to_messages(chat_history)
 
-            task = asyncio.create_task(
-                wrap_done(
-                    full_chain.ainvoke(
-                        {
-                            "input": query,
-                            "chat_history": history_message,
-                        }
-                    ),
-                    callback.done,
-                )
+        task = asyncio.create_task(
+            wrap_done(
+                full_chain.ainvoke(
+                    {
+                        "input": query,
+                        "chat_history": history_message,
+                    }
+                ),
+                callback.done,
             )
+        )
 
-            last_tool = {}
-            async for chunk in callback.aiter():
-                data = json.loads(chunk)
-                data["tool_calls"] = []
-                data["message_type"] = MsgType.TEXT
+        last_tool = {}
+        try:
+            async for event in coalesce(
+                callback.aiter(),
+                can_merge=lambda e: e.status == AgentStatus.llm_new_token,
+                merge=lambda events: AgentEvent(
+                    AgentStatus.llm_new_token, "".join(e.text for e in events)
+                ),
+            ):
+                data = {
+                    "status": event.status,
+                    "text": event.text if isinstance(event.text, str) else str(event.text),
+                    "tool_calls": [],
+                    "message_type": MsgType.TEXT,
+                    "model": models["llm_model"].model_name,
+                }
 
-                if data["status"] == AgentStatus.tool_start:
+                if event.status == AgentStatus.tool_start:
                     last_tool = {
                         "index": 0,
-                        "id": data["run_id"],
+                        "id": event.run_id,
                         "type": "function",
                         "function": {
-                            "name": data["tool"],
-                            "arguments": data["tool_input"],
+                            "name": event.tool,
+                            "arguments": event.tool_input,
                         },
                         "tool_output": None,
                         "is_error": False,
                     }
                     data["tool_calls"].append(last_tool)
-                if data["status"] in [AgentStatus.tool_end]:
+                if event.status in [AgentStatus.tool_end]:
                     last_tool.update(
-                        tool_output=data["tool_output"],
-                        is_error=data.get("is_error", False),
+                        tool_output=event.tool_output,
+                        is_error=event.is_error,
                     )
                     data["tool_calls"] = [last_tool]
                     last_tool = {}
                     try:
-                        tool_output = json.loads(data["tool_output"])
+                        tool_output = json.loads(event.tool_output)
                         if message_type := tool_output.get("message_type"):
                             data["message_type"] = message_type
                     except:
                         ...
-                elif data["status"] == AgentStatus.agent_finish:
+                elif event.status == AgentStatus.agent_finish:
                     try:
-                        tool_output = json.loads(data["text"])
+                        tool_output = json.loads(event.text)
                         if message_type := tool_output.get("message_type"):
                             data["message_type"] = message_type
                     except:
                         ...
-                text_value = data.get("text", "")
-                content = text_value if isinstance(text_value, str) else str(text_value)
-                ret = OpenAIChatOutput(
-                    id=f"chat{uuid.uuid4()}",
-                    object="chat.completion.chunk",
-                    content=content,
-                    role="assistant",
-                    tool_calls=data["tool_calls"],
-                    model=models["llm_model"].model_name,
-                    status=data["status"],
-                    message_type=data["message_type"],
-                    message_id=message_id,
-                )
-                yield ret.model_dump_json()
-            # yield OpenAIChatOutput( # return blank text lastly
-            #         id=f"chat{uuid.uuid4()}",
-            #         object="chat.completion.chunk",
-            #         content="",
-            #         role="assistant",
-            #         model=models["llm_model"].model_name,
-            #         status = data["status"],
-            #         message_type = data["message_type"],
-            #         message_id=message_id,
-            # )
+                yield data
+            # callback.done 只由 wrap_done 在 agent 结束时设置，此时 task 已经完成
             await task
+        finally:
+            # 客户端断开时不再消费事件，需要结束 agent，否则回调会一直等待队列
+            if not task.done():
+                task.cancel()
+
+    async def chat_iterator() -> AsyncIterable[str]:
+        encoder = ChatStreamEncoder(message_id=message_id)
+        try:
+            async for data in agent_events():
+                encoder.model = data["model"]
+                if data["tool_calls"]:
+                    yield encoder.encode(
+                        data["text"],
+                        tool_calls=data["tool_calls"],
+                        status=data["status"],
+                        message_type=data["message_type"],
+                    )
+                else:
+                    yield encoder.token(
+                        data["text"],
+                        status=data["status"],
+                        message_type=data["message_type"],
+                    )
         except asyncio.exceptions.CancelledError:
             logger.warning("streaming progress has been interrupted by user.")
             return
@@ -249,25 +262,19 @@ async def chat(
     if stream:
         return EventSourceResponse(chat_iterator())
     else:
-        ret = OpenAIChatOutput(
-            id=f"chat{uuid.uuid4()}",
+        ret = ChatStreamEncoder(message_id=message_id).output(
             object="chat.completion",
-            content="",
-            role="assistant",
             finish_reason="stop",
             tool_calls=[],
             status=AgentStatus.agent_finish,
             message_type=MsgType.TEXT,
-            message_id=message_id,
         )
 
-        async for chunk in chat_iterator():
-            data = json.loads(chunk)
-            if text := data["choices"][0]["delta"]["content"]:
-                ret.content += text
+        async for data in agent_events():
+            if data["text"]:
+                ret.content += data["text"]
             if data["status"] == AgentStatus.tool_end:
-                ret.tool_calls += data["choices"][0]["delta"]["tool_calls"]
+                ret.tool_calls += data["tool_calls"]
             ret.model = data["model"]
-            ret.created = data["created"]
 
         return ret.model_dump()
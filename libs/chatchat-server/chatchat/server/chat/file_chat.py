@@ -14,7 +14,7 @@ from sse_starlette.sse import EventSourceResponse
 from chatchat.settings import Settings
 from chatchat.server.chat.utils import History
 from chatchat.server.knowledge_base.kb_cache.faiss_cache import memo_faiss_pool
-from chatchat.server.knowledge_base.utils import KnowledgeFile
+from chatchat.server.knowledge_base.utils import KnowledgeFile, save_to_temp_file
 from chatchat.server.utils import (
     BaseResponse,
     get_ChatOpenAI,
@@ -50,12 +50,9 @@ def _parse_files_in_thread(
         try:
             filename = file.filename
             file_path = os.path.join(dir, filename)
-            file_content = file.file.read()  # 读取上传文件的内容
-
-            if not os.path.isdir(os.path.dirname(file_path)):
-                os.makedirs(os.path.dirname(file_path))
-            with open(file_path, "wb") as f:
-                f.write(file_content)
+            # 按块写入磁盘，不把整个文件读入内存
+            tmp_path, _, _ = save_to_temp_file(file.file, file_path)
+            os.replace(tmp_path, file_path)
             kb_file = KnowledgeFile(filename=filename, knowledge_base_name="temp")
             kb_file.filepath = file_path
             docs = kb_file.file2text(
@@ -104,6 +101,7 @@ def upload_temp_docs(
     try:
         with memo_faiss_pool.load_vector_store(kb_name=id).acquire() as vs:
             vs.add_documents(documents)
+        memo_faiss_pool.check_memory(keep=id)
     except Exception as e:
         logger.error(f"Failed to add documents to faiss: {e}")
 
@@ -1,7 +1,6 @@
 from __future__ import annotations
 
 import asyncio, json
-import uuid
 from typing import AsyncIterable, List, Optional, Literal
 
 from fastapi import Body, Request
@@ -12,8 +11,7 @@ from langchain.prompts.chat import ChatPromptTemplate
 
 
 from chatchat.settings import Settings
-from chatchat.server.agent.tools_factory.search_internet import search_engine
-from chatchat.server.api_server.api_schemas import OpenAIChatOutput
+from chatchat.server.chat.stream_encoder import ChatStreamEncoder, coalesce
 from chatchat.server.chat.utils import History
 from chatchat.server.knowledge_base.kb_service.base import KBServiceFactory
 from chatchat.server.knowledge_base.kb_doc_api import search_docs, search_temp_docs
@@ -47,7 +45,7 @@ async def kb_chat(query: str = Body(..., description="用户输入", examples=["
                         "content": "虎头虎脑"}]]
                 ),
                 stream: bool = Body(True, description="流式输出"),
-                model: str = Body(get_default_llm(), description="LLM 模型名称。"),
+                model: str = Body(None, description="LLM 模型名称，为空时使用默认模型。"),
                 temperature: float = Body(Settings.model_settings.TEMPERATURE, description="LLM 采样温度", ge=0.0, le=2.0),
                 max_tokens: Optional[int] = Body(
                     Settings.model_settings.MAX_TOKENS,
@@ -60,6 +58,7 @@ async def kb_chat(query: str = Body(..., description="用户输入", examples=["
                 return_direct: bool = Body(False, description="直接返回检索结果，不送入 LLM"),
                 request: Request = None,
                 ):
+    model = model or get_default_llm()
     if mode == "local_kb":
         kb = KBServiceFactory.get_service_by_name(kb_name)
         if kb is None:
@@ -95,6 +94,9 @@ async def kb_chat(query: str = Body(..., description="用户输入", examples=["
                                                 score_threshold=score_threshold)
                 source_documents = format_reference(kb_name, docs, api_address(is_public=True))
             elif mode == "search_engine":
+                # 导入 tools_factory 会加载全部工具，只在使用搜索引擎时导入
+                from chatchat.server.agent.tools_factory.search_internet import search_engine
+
                 result = await run_in_threadpool(search_engine, query, top_k, kb_name)
                 docs = [x.dict() for x in result.get("docs", [])]
                 source_documents = [f"""出处 [{i + 1}] [{d['metadata']['filename']}]({d['metadata']['source']}) \n\n{d['page_content']}\n\n""" for i,d in enumerate(docs)]
@@ -111,15 +113,11 @@ async def kb_chat(query: str = Body(..., description="用户输入", examples=["
             # ))
             # rich.print(docs)
             if return_direct:
-                yield OpenAIChatOutput(
-                    id=f"chat{uuid.uuid4()}",
-                    model=None,
+                yield ChatStreamEncoder().encode(
                     object="chat.completion",
-                    content="",
-                    role="assistant",
                     finish_reason="stop",
                     docs=source_documents,
-                ) .model_dump_json()
+                )
                 return
 
             callback = AsyncIteratorCallbackHandler()
@@ -180,39 +178,18 @@ async def kb_chat(query: str = Body(..., description="用户输入", examples=["
             if len(source_documents) == 0:  # 没有找到相关文档
                 source_documents.append(f"<span style='color:red'>未找到相关文档,该回答为大模型自身能力解答！</span>")
 
+            encoder = ChatStreamEncoder(model=model)
             if stream:
                 # yield documents first
-                ret = OpenAIChatOutput(
-                    id=f"chat{uuid.uuid4()}",
-                    object="chat.completion.chunk",
-                    content="",
-                    role="assistant",
-                    model=model,
-                    docs=source_documents,
-                )
-                yield ret.model_dump_json()
+                yield encoder.encode(docs=source_documents)
 
-                async for token in callback.aiter():
-                    ret = OpenAIChatOutput(
-                        id=f"chat{uuid.uuid4()}",
-                        object="chat.completion.chunk",
-                        content=token,
-                        role="assistant",
-                        model=model,
-                    )
-                    yield ret.model_dump_json()
+                async for text in coalesce(callback.aiter()):
+                    yield encoder.token(text)
             else:
                 answer = ""
                 async for token in callback.aiter():
                     answer += token
-                ret = OpenAIChatOutput(
-                    id=f"chat{uuid.uuid4()}",
-                    object="chat.completion",
-                    content=answer,
-                    role="assistant",
-                    model=model,
-                )
-                yield ret.model_dump_json()
+                yield encoder.encode(answer, object="chat.completion")
             await task
         except asyncio.exceptions.CancelledError:
             logger.warning("streaming progress has been interrupted by user.")
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+import uuid
+from typing import Any, AsyncIterable, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from chatchat.settings import Settings
+from chatchat.server.api_server.api_schemas import OpenAIChatOutput
+from chatchat.server.utils import MsgType
+
+try:
+    import orjson
+
+    def dumps(obj: Any) -> str:
+        return orjson.dumps(obj).decode()
+
+except ImportError:
+
+    def dumps(obj: Any) -> str:
+        return json.dumps(obj, ensure_ascii=False)
+
+
+class ChatStreamEncoder:
+    """
+    流式输出编码器，输出格式与 OpenAIChatOutput.model_dump_json 一致。
+    一次响应只生成一个 id；token 帧使用预先序列化的模板，每个 token 只需序列化 content。
+    """
+
+    def __init__(self, model: Optional[str] = None, message_id: Optional[str] = None, **extra):
+        self.id = f"chat{uuid.uuid4()}"
+        self.created = int(time.time())
+        self.model = model
+        self.message_id = message_id
+        self.extra = extra
+        self._templates: Dict[Tuple[Optional[int], int], str] = {}
+
+    def output(self, content: str = "", object: str = "chat.completion.chunk", **kwargs) -> OpenAIChatOutput:
+        fields = {"model": self.model, "message_id": self.message_id, **self.extra, **kwargs}
+        return OpenAIChatOutput(
+            id=self.id,
+            created=self.created,
+            object=object,
+            content=content,
+            role="assistant",
+            **fields,
+        )
+
+    def encode(self, content: str = "", object: str = "chat.completion.chunk", **kwargs) -> str:
+        """
+        通用帧，用于文档、工具调用、非流式结果等低频输出
+        """
+        return dumps(self.output(content, object=object, **kwargs).model_dump())
+
+    def token(self, content: str, status: Optional[int] = None, message_type: int = MsgType.TEXT) -> str:
+        """
+        只包含文本增量的 chunk 帧
+        """
+        key = (status, message_type)
+        if (prefix := self._templates.get(key)) is None:
+            head = self.output(status=status, message_type=message_type).model_dump()
+            head.pop("choices")
+            prefix = dumps(head)[:-1] + ',"choices":[{"delta":{"content":'
+            self._templates[key] = prefix
+        return prefix + dumps(content) + ',"tool_calls":[]},"role":"assistant"}]}'
+
+
+async def coalesce(
+    items: AsyncIterable,
+    interval_ms: Optional[int] = None,
+    max_items: Optional[int] = None,
+    can_merge: Optional[Callable[[Any], bool]] = None,
+    merge: Callable[[List], Any] = "".join,
+) -> AsyncIterator:
+    """
+    合并流式输出以减少 SSE 帧数：累计 interval_ms 毫秒或 max_items 个元素后用 merge 合并输出。
+    can_merge 返回 False 的元素会先输出已累计的内容，再原样输出。
+    interval_ms/max_items 默认读取 STREAM_COALESCE_MS/STREAM_COALESCE_TOKENS，都为 0 时不合并。
+    """
+    if interval_ms is None:
+        interval_ms = Settings.model_settings.STREAM_COALESCE_MS
+    if max_items is None:
+        max_items = Settings.model_settings.STREAM_COALESCE_TOKENS
+    if not interval_ms and not max_items:
+        async for item in items:
+            yield item
+        return
+
+    loop = asyncio.get_running_loop()
+    it = items.__aiter__()
+    buffer = []
+    deadline = None
+    pending = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(it.__anext__())
+            timeout = None if deadline is None else max(deadline - loop.time(), 0)
+            # 不能用 wait_for，超时会取消 __anext__ 并结束上游的异步生成器
+            done, _ = await asyncio.wait({pending}, timeout=timeout)
+            if not done:
+                yield merge(buffer)
+                buffer, deadline = [], None
+                continue
+
+            try:
+                item = pending.result()
+            except StopAsyncIteration:
+                pending = None
+                break
+            pending = None
+
+            if can_merge is not None and not can_merge(item):
+                if buffer:
+                    yield merge(buffer)
+                    buffer, deadline = [], None
+                yield item
+                continue
+
+            buffer.append(item)
+            if deadline is None and interval_ms:
+                deadline = loop.time() + interval_ms / 1000
+            if (max_items and len(buffer) >= max_items) or (
+                deadline is not None and loop.time() >= deadline
+            ):
+                yield merge(buffer)
+                buffer, deadline = [], None
+    finally:
+        if pending is not None:
+            pending.cancel()
+    if buffer:
+        yield merge(buffer)
@@ -11,6 +11,18 @@ from chatchat.utils import build_logger
 logger = build_logger()
 
 
+@lru_cache(maxsize=256)
+def _msg_template(content: str, role: str) -> ChatMessagePromptTemplate:
+    """
+    解析 jinja2 模板的开销较大，相同的模板（如 prompt 配置）只解析一次。返回值在多个请求间共用，不要修改
+    """
+    return ChatMessagePromptTemplate.from_template(
+        content,
+        "jinja2",
+        role=role,
+    )
+
+
 class History(BaseModel):
     """
     对话历史
@@ -37,11 +49,7 @@ class History(BaseModel):
         else:
             content = self.content
 
-        return ChatMessagePromptTemplate.from_template(
-            content,
-            "jinja2",
-            role=role,
-        )
+        return _msg_template(content, role)
 
     @classmethod
     def from_data(cls, h: Union[List, Tuple, Dict]) -> "History":
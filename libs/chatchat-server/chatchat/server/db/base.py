@@ -1,17 +1,98 @@
 import json
 
-from sqlalchemy import create_engine
+from sqlalchemy import Engine, create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import DeclarativeMeta, declarative_base
 from sqlalchemy.orm import sessionmaker
 
 from chatchat.settings import Settings
+from chatchat.utils import build_logger
+
+
+logger = build_logger()
+
+
+def get_engine_options(uri: str) -> dict:
+    """
+    根据数据库类型生成 create_engine 参数：SQLite 不使用连接池参数，其它数据库使用 SQLALCHEMY_POOL_OPTIONS。
+    """
+    options = {
+        "json_serializer": lambda obj: json.dumps(obj, ensure_ascii=False),
+        **Settings.basic_settings.SQLALCHEMY_ENGINE_OPTIONS,
+    }
+    if make_url(uri).get_backend_name() != "sqlite":
+        options.update(Settings.basic_settings.SQLALCHEMY_POOL_OPTIONS)
+    return options
+
+
+def set_sqlite_pragmas(engine: Engine):
+    """
+    在 SQLite 连接建立时执行 SQLITE_PRAGMAS，其它数据库不做处理。
+    """
+    pragmas = Settings.basic_settings.SQLITE_PRAGMAS
+    if engine.dialect.name != "sqlite" or not pragmas:
+        return
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for k, v in pragmas.items():
+                cursor.execute(f"PRAGMA {k}={v}")
+        finally:
+            cursor.close()
 
 
 engine = create_engine(
     Settings.basic_settings.SQLALCHEMY_DATABASE_URI,
-    json_serializer=lambda obj: json.dumps(obj, ensure_ascii=False),
+    **get_engine_options(Settings.basic_settings.SQLALCHEMY_DATABASE_URI),
 )
+set_sqlite_pragmas(engine)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base: DeclarativeMeta = declarative_base()
+
+
+# 同步驱动对应的异步驱动
+_ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+}
+
+_async_engine = None
+_async_session_factory = None
+
+
+def get_async_database_uri() -> str:
+    if uri := Settings.basic_settings.SQLALCHEMY_ASYNC_DATABASE_URI:
+        return uri
+    url = make_url(Settings.basic_settings.SQLALCHEMY_DATABASE_URI)
+    if driver := _ASYNC_DRIVERS.get(url.get_backend_name()):
+        return url.set(drivername=driver).render_as_string(hide_password=False)
+    return ""
+
+
+def get_async_session_factory():
+    """
+    返回异步 session 工厂。未安装对应的异步驱动时返回 None，调用方应回退到同步接口。
+    """
+    global _async_engine, _async_session_factory
+
+    if _async_session_factory is None:
+        try:
+            from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+            uri = get_async_database_uri()
+            if not uri:
+                return None
+            _async_engine = create_async_engine(uri, **get_engine_options(uri))
+            set_sqlite_pragmas(_async_engine.sync_engine)
+            _async_session_factory = async_sessionmaker(
+                bind=_async_engine, autoflush=False, expire_on_commit=False
+            )
+        except ImportError as e:
+            logger.warning(f"async database driver is not available, fallback to sync session: {e}")
+            _async_session_factory = False
+    return _async_session_factory or None
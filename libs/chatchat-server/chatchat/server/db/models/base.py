@@ -15,3 +15,15 @@ class BaseModel:
     )
     create_by = Column(String, default=None, comment="创建者")
     update_by = Column(String, default=None, comment="更新者")
+
+
+def lower_key_default(column_name: str):
+    """
+    生成小写归一化键列的默认值，用于按名称的等值查询（替代 ilike）。
+    """
+
+    def _default(context):
+        value = context.get_current_parameters().get(column_name)
+        return value.lower() if value is not None else None
+
+    return _default
@@ -5,6 +5,7 @@ from pydantic import BaseModel
 from sqlalchemy import Column, DateTime, Integer, String, func
 
 from chatchat.server.db.base import Base
+from chatchat.server.db.models.base import lower_key_default
 
 
 class KnowledgeBaseModel(Base):
@@ -15,6 +16,9 @@ class KnowledgeBaseModel(Base):
     __tablename__ = "knowledge_base"
     id = Column(Integer, primary_key=True, autoincrement=True, comment="知识库ID")
     kb_name = Column(String(50), comment="知识库名称")
+    kb_name_key = Column(
+        String(50), default=lower_key_default("kb_name"), index=True, comment="小写的知识库名称，用于查询"
+    )
     kb_info = Column(String(200), comment="知识库简介(用于Agent)")
     vs_type = Column(String(50), comment="向量库类型")
     embed_model = Column(String(50), comment="嵌入模型名称")
@@ -14,6 +14,8 @@ class MessageModel(Base):
     chat_type = Column(String(50), comment="聊天类型")
     query = Column(String(4096), comment="用户问题")
     response = Column(String(4096), comment="模型回答")
+    query_tokens = Column(Integer, default=None, comment="用户问题的token数，用于裁剪历史记录")
+    response_tokens = Column(Integer, default=None, comment="模型回答的token数，用于裁剪历史记录")
     # 记录知识库id等，以便后续扩展
     meta_data = Column(JSON, default={})
     # 满分100 越高表示评价越好
@@ -10,7 +10,7 @@ def add_kb_to_db(session, kb_name, kb_info, vs_type, embed_model):
     # 创建知识库实例
     kb = (
         session.query(KnowledgeBaseModel)
-        .filter(KnowledgeBaseModel.kb_name.ilike(kb_name))
+        .filter(KnowledgeBaseModel.kb_name_key == kb_name.lower())
         .first()
     )
     if not kb:
@@ -26,13 +26,24 @@ def add_kb_to_db(session, kb_name, kb_info, vs_type, embed_model):
 
 
 @with_session
-def list_kbs_from_db(session, min_file_count: int = -1):
-    kbs = (
-        session.query(KnowledgeBaseModel)
-        .filter(KnowledgeBaseModel.file_count > min_file_count)
-        .all()
+def list_kbs_from_db(
+    session,
+    min_file_count: int = -1,
+    cursor: int = None,
+    limit: int = None,
+):
+    """
+    列出知识库，按 id 排序。指定 cursor 时只返回 id 大于 cursor 的知识库，limit 为返回数量上限。
+    """
+    kbs = session.query(KnowledgeBaseModel).filter(
+        KnowledgeBaseModel.file_count > min_file_count
     )
-    kbs = [KnowledgeBaseSchema.model_validate(kb) for kb in kbs]
+    if cursor is not None:
+        kbs = kbs.filter(KnowledgeBaseModel.id > cursor)
+    kbs = kbs.order_by(KnowledgeBaseModel.id)
+    if limit is not None:
+        kbs = kbs.limit(limit)
+    kbs = [KnowledgeBaseSchema.model_validate(kb) for kb in kbs.all()]
     return kbs
 
 
@@ -40,7 +51,7 @@ def list_kbs_from_db(session, min_file_count: int = -1):
 def kb_exists(session, kb_name):
     kb = (
         session.query(KnowledgeBaseModel)
-        .filter(KnowledgeBaseModel.kb_name.ilike(kb_name))
+        .filter(KnowledgeBaseModel.kb_name_key == kb_name.lower())
         .first()
     )
     status = True if kb else False
@@ -51,7 +62,7 @@ def kb_exists(session, kb_name):
 def load_kb_from_db(session, kb_name):
     kb = (
         session.query(KnowledgeBaseModel)
-        .filter(KnowledgeBaseModel.kb_name.ilike(kb_name))
+        .filter(KnowledgeBaseModel.kb_name_key == kb_name.lower())
         .first()
     )
     if kb:
@@ -65,7 +76,7 @@ def load_kb_from_db(session, kb_name):
 def delete_kb_from_db(session, kb_name):
     kb = (
         session.query(KnowledgeBaseModel)
-        .filter(KnowledgeBaseModel.kb_name.ilike(kb_name))
+        .filter(KnowledgeBaseModel.kb_name_key == kb_name.lower())
         .first()
     )
     if kb:
@@ -77,7 +88,7 @@ def delete_kb_from_db(session, kb_name):
 def get_kb_detail(session, kb_name: str) -> dict:
     kb: KnowledgeBaseModel = (
         session.query(KnowledgeBaseModel)
-        .filter(KnowledgeBaseModel.kb_name.ilike(kb_name))
+        .filter(KnowledgeBaseModel.kb_name_key == kb_name.lower())
         .first()
     )
     if kb:
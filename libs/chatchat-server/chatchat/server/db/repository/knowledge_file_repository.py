@@ -1,4 +1,6 @@
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, insert, select
 
 from chatchat.server.db.models.knowledge_base_model import KnowledgeBaseModel
 from chatchat.server.db.models.knowledge_file_model import (
@@ -21,12 +23,19 @@ def list_file_num_docs_id_by_kb_name_and_file_name(
     """
     doc_ids = (
         session.query(FileDocModel.doc_id)
-        .filter_by(kb_name=kb_name, file_name=file_name)
+        .filter_by(kb_name_key=kb_name.lower(), file_name_key=file_name.lower())
         .all()
     )
     return [int(_id[0]) for _id in doc_ids]
 
 
+def _doc_filter(kb_name: str, file_name: str = None) -> list:
+    conditions = [FileDocModel.kb_name_key == kb_name.lower()]
+    if file_name:
+        conditions.append(FileDocModel.file_name_key == file_name.lower())
+    return conditions
+
+
 @with_session
 def list_docs_from_db(
     session,
@@ -38,13 +47,96 @@ def list_docs_from_db(
     列出某知识库某文件对应的所有Document。
     返回形式：[{"id": str, "metadata": dict}, ...]
     """
-    docs = session.query(FileDocModel).filter(FileDocModel.kb_name.ilike(kb_name))
-    if file_name:
-        docs = docs.filter(FileDocModel.file_name.ilike(file_name))
+    docs, _ = list_docs_page_from_db(
+        kb_name=kb_name, file_name=file_name, metadata=metadata
+    )
+    return docs
+
+
+@with_session
+def list_docs_page_from_db(
+    session,
+    kb_name: str,
+    file_name: str = None,
+    metadata: Dict = {},
+    cursor: int = None,
+    limit: int = None,
+) -> Tuple[List[Dict], Optional[int]]:
+    """
+    分页列出某知识库某文件对应的Document，按记录 id 排序。
+    返回形式：([{"id": str, "metadata": dict}, ...], 下一页的 cursor)，没有更多数据时 cursor 为 None
+    """
+    docs = session.query(
+        FileDocModel.id, FileDocModel.doc_id, FileDocModel.meta_data
+    ).filter(*_doc_filter(kb_name, file_name))
     for k, v in metadata.items():
         docs = docs.filter(FileDocModel.meta_data[k].as_string() == str(v))
+    if cursor is not None:
+        docs = docs.filter(FileDocModel.id > cursor)
+    docs = docs.order_by(FileDocModel.id)
+    if limit is not None:
+        docs = docs.limit(limit + 1)
+    docs = docs.all()
 
-    return [{"id": x.doc_id, "metadata": x.metadata} for x in docs.all()]
+    next_cursor = None
+    if limit is not None and len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = docs[-1].id
+    return [{"id": x.doc_id, "metadata": x.meta_data} for x in docs], next_cursor
+
+
+def _delete_docs(
+    session,
+    kb_name: str,
+    file_name: str = None,
+    returning: bool = True,
+) -> List[Dict]:
+    """
+    在当前 session 中批量删除文档记录，数据库支持时使用 DELETE ... RETURNING 一次完成。
+    """
+    conditions = _doc_filter(kb_name, file_name)
+    stmt = (
+        delete(FileDocModel)
+        .where(*conditions)
+        .execution_options(synchronize_session=False)
+    )
+    if not returning:
+        session.execute(stmt)
+        return []
+
+    if session.get_bind().dialect.delete_returning:
+        rows = session.execute(
+            stmt.returning(FileDocModel.doc_id, FileDocModel.meta_data)
+        ).all()
+    else:
+        rows = session.execute(
+            select(FileDocModel.doc_id, FileDocModel.meta_data).where(*conditions)
+        ).all()
+        session.execute(stmt)
+    return [{"id": x.doc_id, "metadata": x.meta_data} for x in rows]
+
+
+def _add_docs(session, kb_name: str, file_name: str, doc_infos: List[Dict]):
+    """
+    在当前 session 中批量插入文档记录（executemany）。
+    """
+    if not doc_infos:
+        return
+    kb_name_key, file_name_key = kb_name.lower(), file_name.lower()
+    session.execute(
+        insert(FileDocModel),
+        [
+            {
+                "kb_name": kb_name,
+                "file_name": file_name,
+                "kb_name_key": kb_name_key,
+                "file_name_key": file_name_key,
+                "doc_id": d["id"],
+                "meta_data": d["metadata"],
+            }
+            for d in doc_infos
+        ],
+    )
 
 
 @with_session
@@ -57,13 +149,7 @@ def delete_docs_from_db(
     删除某知识库某文件对应的所有Document，并返回被删除的Document。
     返回形式：[{"id": str, "metadata": dict}, ...]
     """
-    docs = list_docs_from_db(kb_name=kb_name, file_name=file_name)
-    query = session.query(FileDocModel).filter(FileDocModel.kb_name.ilike(kb_name))
-    if file_name:
-        query = query.filter(FileDocModel.file_name.ilike(file_name))
-    query.delete(synchronize_session=False)
-    session.commit()
-    return docs
+    return _delete_docs(session, kb_name=kb_name, file_name=file_name)
 
 
 @with_session
@@ -78,14 +164,7 @@ def add_docs_to_db(session, kb_name: str, file_name: str, doc_infos: List[Dict])
             "输入的server.db.repository.knowledge_file_repository.add_docs_to_db的doc_infos参数为None"
         )
         return False
-    for d in doc_infos:
-        obj = FileDocModel(
-            kb_name=kb_name,
-            file_name=file_name,
-            doc_id=d["id"],
-            meta_data=d["metadata"],
-        )
-        session.add(obj)
+    _add_docs(session, kb_name=kb_name, file_name=file_name, doc_infos=doc_infos)
     return True
 
 
@@ -93,7 +172,7 @@ def add_docs_to_db(session, kb_name: str, file_name: str, doc_infos: List[Dict])
 def count_files_from_db(session, kb_name: str) -> int:
     return (
         session.query(KnowledgeFileModel)
-        .filter(KnowledgeFileModel.kb_name.ilike(kb_name))
+        .filter(KnowledgeFileModel.kb_name_key == kb_name.lower())
         .count()
     )
 
@@ -102,7 +181,7 @@ def count_files_from_db(session, kb_name: str) -> int:
 def list_files_from_db(session, kb_name):
     files = (
         session.query(KnowledgeFileModel)
-        .filter(KnowledgeFileModel.kb_name.ilike(kb_name))
+        .filter(KnowledgeFileModel.kb_name_key == kb_name.lower())
         .all()
     )
     docs = [f.file_name for f in files]
@@ -117,23 +196,29 @@ def add_file_to_db(
     custom_docs: bool = False,
     doc_infos: List[Dict] = [],  # 形式：[{"id": str, "metadata": dict}, ...]
 ):
-    kb = session.query(KnowledgeBaseModel).filter_by(kb_name=kb_file.kb_name).first()
+    kb = (
+        session.query(KnowledgeBaseModel)
+        .filter_by(kb_name_key=kb_file.kb_name.lower())
+        .first()
+    )
     if kb:
         # 如果已经存在该文件，则更新文件信息与版本号
         existing_file: KnowledgeFileModel = (
             session.query(KnowledgeFileModel)
             .filter(
-                KnowledgeFileModel.kb_name.ilike(kb_file.kb_name),
-                KnowledgeFileModel.file_name.ilike(kb_file.filename),
+                KnowledgeFileModel.kb_name_key == kb_file.kb_name.lower(),
+                KnowledgeFileModel.file_name_key == kb_file.filename.lower(),
             )
             .first()
         )
         mtime = kb_file.get_mtime()
         size = kb_file.get_size()
+        file_hash = kb_file.get_hash()
 
         if existing_file:
             existing_file.file_mtime = mtime
             existing_file.file_size = size
+            existing_file.file_hash = file_hash
             existing_file.docs_count = docs_count
             existing_file.custom_docs = custom_docs
             existing_file.file_version += 1
@@ -147,14 +232,23 @@ def add_file_to_db(
                 text_splitter_name=kb_file.text_splitter_name or "SpacyTextSplitter",
                 file_mtime=mtime,
                 file_size=size,
+                file_hash=file_hash,
                 docs_count=docs_count,
                 custom_docs=custom_docs,
             )
             kb.file_count += 1
             session.add(new_file)
-        add_docs_to_db(
-            kb_name=kb_file.kb_name, file_name=kb_file.filename, doc_infos=doc_infos
-        )
+        if doc_infos is None:
+            print(
+                "输入的server.db.repository.knowledge_file_repository.add_file_to_db的doc_infos参数为None"
+            )
+        else:
+            _add_docs(
+                session,
+                kb_name=kb_file.kb_name,
+                file_name=kb_file.filename,
+                doc_infos=doc_infos,
+            )
     return True
 
 
@@ -163,38 +257,41 @@ def delete_file_from_db(session, kb_file: KnowledgeFile):
     existing_file = (
         session.query(KnowledgeFileModel)
         .filter(
-            KnowledgeFileModel.file_name.ilike(kb_file.filename),
-            KnowledgeFileModel.kb_name.ilike(kb_file.kb_name),
+            KnowledgeFileModel.file_name_key == kb_file.filename.lower(),
+            KnowledgeFileModel.kb_name_key == kb_file.kb_name.lower(),
         )
         .first()
     )
     if existing_file:
         session.delete(existing_file)
-        delete_docs_from_db(kb_name=kb_file.kb_name, file_name=kb_file.filename)
-        session.commit()
+        _delete_docs(
+            session,
+            kb_name=kb_file.kb_name,
+            file_name=kb_file.filename,
+            returning=False,
+        )
 
         kb = (
             session.query(KnowledgeBaseModel)
-            .filter(KnowledgeBaseModel.kb_name.ilike(kb_file.kb_name))
+            .filter(KnowledgeBaseModel.kb_name_key == kb_file.kb_name.lower())
             .first()
         )
         if kb:
             kb.file_count -= 1
-            session.commit()
     return True
 
 
 @with_session
 def delete_files_from_db(session, knowledge_base_name: str):
     session.query(KnowledgeFileModel).filter(
-        KnowledgeFileModel.kb_name.ilike(knowledge_base_name)
+        KnowledgeFileModel.kb_name_key == knowledge_base_name.lower()
     ).delete(synchronize_session=False)
     session.query(FileDocModel).filter(
-        FileDocModel.kb_name.ilike(knowledge_base_name)
+        FileDocModel.kb_name_key == knowledge_base_name.lower()
     ).delete(synchronize_session=False)
     kb = (
         session.query(KnowledgeBaseModel)
-        .filter(KnowledgeBaseModel.kb_name.ilike(knowledge_base_name))
+        .filter(KnowledgeBaseModel.kb_name_key == knowledge_base_name.lower())
         .first()
     )
     if kb:
@@ -209,37 +306,79 @@ def file_exists_in_db(session, kb_file: KnowledgeFile):
     existing_file = (
         session.query(KnowledgeFileModel)
         .filter(
-            KnowledgeFileModel.file_name.ilike(kb_file.filename),
-            KnowledgeFileModel.kb_name.ilike(kb_file.kb_name),
+            KnowledgeFileModel.file_name_key == kb_file.filename.lower(),
+            KnowledgeFileModel.kb_name_key == kb_file.kb_name.lower(),
         )
         .first()
     )
     return True if existing_file else False
 
 
+def _file_detail(file: KnowledgeFileModel) -> dict:
+    return {
+        "kb_name": file.kb_name,
+        "file_name": file.file_name,
+        "file_ext": file.file_ext,
+        "file_version": file.file_version,
+        "document_loader": file.document_loader_name,
+        "text_splitter": file.text_splitter_name,
+        "create_time": file.create_time,
+        "file_mtime": file.file_mtime,
+        "file_size": file.file_size,
+        "file_hash": file.file_hash,
+        "custom_docs": file.custom_docs,
+        "docs_count": file.docs_count,
+    }
+
+
 @with_session
 def get_file_detail(session, kb_name: str, filename: str) -> dict:
     file: KnowledgeFileModel = (
         session.query(KnowledgeFileModel)
         .filter(
-            KnowledgeFileModel.file_name.ilike(filename),
-            KnowledgeFileModel.kb_name.ilike(kb_name),
+            KnowledgeFileModel.file_name_key == filename.lower(),
+            KnowledgeFileModel.kb_name_key == kb_name.lower(),
         )
         .first()
     )
     if file:
-        return {
-            "kb_name": file.kb_name,
-            "file_name": file.file_name,
-            "file_ext": file.file_ext,
-            "file_version": file.file_version,
-            "document_loader": file.document_loader_name,
-            "text_splitter": file.text_splitter_name,
-            "create_time": file.create_time,
-            "file_mtime": file.file_mtime,
-            "file_size": file.file_size,
-            "custom_docs": file.custom_docs,
-            "docs_count": file.docs_count,
-        }
+        return _file_detail(file)
     else:
         return {}
+
+
+# 按码点（UTF-8 字节）比较字符串的排序规则，与 Python 的字符串比较一致。
+# 数据库默认排序规则（如 PostgreSQL 的 en_US.UTF-8）与 Python sorted 的顺序不同，混用时分页会遗漏或重复文件
+_BINARY_COLLATIONS = {
+    "postgresql": "C",
+    "mysql": "utf8mb4_bin",
+    "mariadb": "utf8mb4_bin",
+}
+
+
+def _binary_order(session, column):
+    collation = _BINARY_COLLATIONS.get(session.get_bind().dialect.name)
+    return column if collation is None else column.collate(collation)
+
+
+@with_session
+def list_file_details_from_db(
+    session,
+    kb_name: str,
+    cursor: str = None,
+    limit: int = None,
+) -> List[Dict]:
+    """
+    一次查询列出知识库中文件的详细信息，按小写文件名的码点顺序排序（与 Python 字符串比较一致）。
+    指定 cursor（小写文件名）时只返回排在其后的文件，limit 为返回数量上限。
+    """
+    file_name_key = _binary_order(session, KnowledgeFileModel.file_name_key)
+    files = session.query(KnowledgeFileModel).filter(
+        KnowledgeFileModel.kb_name_key == kb_name.lower()
+    )
+    if cursor is not None:
+        files = files.filter(file_name_key > cursor)
+    files = files.order_by(file_name_key)
+    if limit is not None:
+        files = files.limit(limit)
+    return [_file_detail(f) for f in files.all()]
@@ -1,8 +1,50 @@
+import threading
 import uuid
-from typing import Dict, List
+from collections import OrderedDict
+from typing import Dict, List, Tuple
 
+from sqlalchemy import select, update
+
+from chatchat.settings import Settings
 from chatchat.server.db.models.message_model import MessageModel
-from chatchat.server.db.session import with_session
+from chatchat.server.db.session import with_async_session, with_session
+
+
+# 进程内的对话历史缓存：{conversation_id: {limit: [message, ...]}}，新增或更新聊天记录时失效
+_HISTORY_CACHE_SIZE = 256
+_history_cache: OrderedDict = OrderedDict()
+_history_cache_lock = threading.Lock()
+
+
+def _get_cached_history(conversation_id: str, limit: int):
+    # 多进程模式下其它进程写入的消息无法使本进程的缓存失效，因此不使用缓存
+    if Settings.basic_settings.API_WORKERS > 1:
+        return None
+    with _history_cache_lock:
+        if conversation_id in _history_cache:
+            _history_cache.move_to_end(conversation_id)
+            return _history_cache[conversation_id].get(limit)
+
+
+def _set_cached_history(conversation_id: str, limit: int, messages: List[Dict]):
+    if Settings.basic_settings.API_WORKERS > 1:
+        return
+    with _history_cache_lock:
+        _history_cache.setdefault(conversation_id, {})[limit] = messages
+        _history_cache.move_to_end(conversation_id)
+        while len(_history_cache) > _HISTORY_CACHE_SIZE:
+            _history_cache.popitem(last=False)
+
+
+def invalidate_history_cache(conversation_id: str = None):
+    """
+    清除对话历史缓存，不指定 conversation_id 时清除全部
+    """
+    with _history_cache_lock:
+        if conversation_id is None:
+            _history_cache.clear()
+        else:
+            _history_cache.pop(conversation_id, None)
 
 
 @with_session
@@ -30,6 +72,7 @@ def add_message_to_db(
     )
     session.add(m)
     session.commit()
+    invalidate_history_cache(conversation_id)
     return m.id
 
 
@@ -38,14 +81,15 @@ def update_message(session, message_id, response: str = None, metadata: Dict = N
     """
     更新已有的聊天记录
     """
-    m = get_message_by_id(message_id)
+    m = session.query(MessageModel).filter_by(id=message_id).first()
     if m is not None:
         if response is not None:
             m.response = response
+            m.response_tokens = None
         if isinstance(metadata, dict):
             m.meta_data = metadata
-        session.add(m)
         session.commit()
+        invalidate_history_cache(m.conversation_id)
         return m.id
 
 
@@ -73,20 +117,100 @@ def feedback_message_to_db(session, message_id, feedback_score, feedback_reason)
 
 @with_session
 def filter_message(session, conversation_id: str, limit: int = 10):
-    messages = (
-        session.query(MessageModel)
+    """
+    返回最近的 limit 条聊天记录（按时间倒序），结果会缓存在进程内，请勿修改返回值。
+    """
+    if (data := _get_cached_history(conversation_id, limit)) is not None:
+        return data
+
+    messages = session.execute(
+        select(
+            MessageModel.id,
+            MessageModel.query,
+            MessageModel.response,
+            MessageModel.query_tokens,
+            MessageModel.response_tokens,
+        )
         .filter_by(conversation_id=conversation_id)
-        .
         # 用户最新的query 也会插入到db，忽略这个message record
-        filter(MessageModel.response != "")
-        .
+        .filter(MessageModel.response != "")
         # 返回最近的limit 条记录
-        order_by(MessageModel.create_time.desc())
+        .order_by(MessageModel.create_time.desc())
         .limit(limit)
-        .all()
-    )
+    ).all()
     # 直接返回 List[MessageModel] 报错
-    data = []
-    for m in messages:
-        data.append({"query": m.query, "response": m.response})
+    data = [dict(m._mapping) for m in messages]
+    _set_cached_history(conversation_id, limit, data)
     return data
+
+
+@with_session
+def update_message_tokens(
+    session,
+    conversation_id: str,
+    token_counts: Dict[str, Tuple[int, int]],
+):
+    """
+    保存聊天记录的 token 数，token_counts 形式：{message_id: (query_tokens, response_tokens)}。
+    同时更新缓存中的记录，不使缓存失效。
+    """
+    if not token_counts:
+        return
+    session.execute(
+        update(MessageModel),
+        [
+            {"id": k, "query_tokens": q, "response_tokens": r}
+            for k, (q, r) in token_counts.items()
+        ],
+    )
+    with _history_cache_lock:
+        for messages in _history_cache.get(conversation_id, {}).values():
+            for m in messages:
+                if (counts := token_counts.get(m["id"])) is not None:
+                    m["query_tokens"], m["response_tokens"] = counts
+
+
+# 以下为异步版本，供 API 中的异步接口使用。
+# 对话记忆、回调等 langchain 同步接口中使用同步版本
+
+
+@with_async_session(fallback=add_message_to_db)
+async def aadd_message_to_db(
+    session,
+    conversation_id: str,
+    chat_type,
+    query,
+    response="",
+    message_id=None,
+    metadata: Dict = {},
+):
+    """
+    新增聊天记录
+    """
+    if not message_id:
+        message_id = uuid.uuid4().hex
+    m = MessageModel(
+        id=message_id,
+        chat_type=chat_type,
+        query=query,
+        response=response,
+        conversation_id=conversation_id,
+        meta_data=metadata,
+    )
+    session.add(m)
+    await session.commit()
+    invalidate_history_cache(conversation_id)
+    return m.id
+
+
+@with_async_session(fallback=feedback_message_to_db)
+async def afeedback_message_to_db(session, message_id, feedback_score, feedback_reason):
+    """
+    反馈聊天记录
+    """
+    m = await session.get(MessageModel, message_id)
+    if m:
+        m.feedback_score = feedback_score
+        m.feedback_reason = feedback_reason
+    await session.commit()
+    return m.id
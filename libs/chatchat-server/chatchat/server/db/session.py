@@ -1,9 +1,12 @@
-from contextlib import contextmanager
+from contextlib import asynccontextmanager, contextmanager
 from functools import wraps
+from typing import Callable
 
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from chatchat.server.db.base import SessionLocal
+from chatchat.server.db.base import SessionLocal, get_async_session_factory
 
 
 @contextmanager
@@ -35,6 +38,40 @@ def with_session(f):
     return wrapper
 
 
+@asynccontextmanager
+async def async_session_scope() -> AsyncSession:
+    """异步上下文管理器用于自动获取 AsyncSession"""
+    session = get_async_session_factory()()
+    try:
+        yield session
+        await session.commit()
+    except:
+        await session.rollback()
+        raise
+    finally:
+        await session.close()
+
+
+def with_async_session(fallback: Callable = None):
+    """
+    异步版本的 with_session，被装饰函数的第一个参数为 AsyncSession。
+    未安装异步数据库驱动时，在线程中调用同步实现 fallback，避免阻塞事件循环。
+    """
+
+    def decorator(f):
+        @wraps(f)
+        async def wrapper(*args, **kwargs):
+            if fallback is not None and get_async_session_factory() is None:
+                # asyncio.to_thread 需要 python 3.9+
+                return await run_in_threadpool(fallback, *args, **kwargs)
+            async with async_session_scope() as session:
+                return await f(session, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
 def get_db() -> SessionLocal:
     db = SessionLocal()
     try:
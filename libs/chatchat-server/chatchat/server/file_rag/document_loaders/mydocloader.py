@@ -3,6 +3,8 @@ from typing import List
 import tqdm
 from langchain_community.document_loaders.unstructured import UnstructuredFileLoader
 
+from chatchat.server.file_rag.document_loaders.ocr import join_ocr_parts, ocr_pool
+
 
 class RapidOCRDocLoader(UnstructuredFileLoader):
     def _get_elements(self) -> List:
@@ -16,11 +18,10 @@ class RapidOCRDocLoader(UnstructuredFileLoader):
             from docx.table import Table, _Cell
             from docx.text.paragraph import Paragraph
             from PIL import Image
-            from rapidocr_onnxruntime import RapidOCR
 
-            ocr = RapidOCR()
             doc = Document(filepath)
-            resp = ""
+            # 按顺序保存文本和 OCR 任务，图片在 OCR 线程中并行识别，最后按顺序拼接
+            parts = []
 
             def iter_block_items(parent):
                 from docx.document import Document
@@ -46,7 +47,7 @@ class RapidOCRDocLoader(UnstructuredFileLoader):
                 b_unit.set_description("RapidOCRDocLoader  block index: {}".format(i))
                 b_unit.refresh()
                 if isinstance(block, Paragraph):
-                    resp += block.text.strip() + "\n"
+                    parts.append(block.text.strip() + "\n")
                     images = block._element.xpath(".//pic:pic")  # 获取所有图片
                     for image in images:
                         for img_id in image.xpath(".//a:blip/@r:embed"):  # 获取图片id
@@ -54,18 +55,16 @@ class RapidOCRDocLoader(UnstructuredFileLoader):
                                 img_id
                             ]  # 根据图片id获取对应的图片
                             if isinstance(part, ImagePart):
-                                image = Image.open(BytesIO(part._blob))
-                                result, _ = ocr(np.array(image))
-                                if result:
-                                    ocr_result = [line[1] for line in result]
-                                    resp += "\n".join(ocr_result)
+                                parts.append(ocr_pool.submit(
+                                    lambda blob: np.array(Image.open(BytesIO(blob))), part._blob
+                                ))
                 elif isinstance(block, Table):
                     for row in block.rows:
                         for cell in row.cells:
                             for paragraph in cell.paragraphs:
-                                resp += paragraph.text.strip() + "\n"
+                                parts.append(paragraph.text.strip() + "\n")
                 b_unit.update(1)
-            return resp
+            return join_ocr_parts(parts)
 
         text = doc2text(self.file_path)
         from unstructured.partition.text import partition_text
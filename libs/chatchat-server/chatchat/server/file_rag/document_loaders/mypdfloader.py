@@ -7,7 +7,7 @@ from langchain_community.document_loaders.unstructured import UnstructuredFileLo
 from PIL import Image
 
 from chatchat.settings import Settings
-from chatchat.server.file_rag.document_loaders.ocr import get_ocr
+from chatchat.server.file_rag.document_loaders.ocr import join_ocr_parts, ocr_pool
 
 
 class RapidOCRPDFLoader(UnstructuredFileLoader):
@@ -36,13 +36,21 @@ class RapidOCRPDFLoader(UnstructuredFileLoader):
             rotated_img = cv2.warpAffine(img, M, (new_w, new_h))
             return rotated_img
 
+        def pixmap_to_array(samples: bytes, height: int, width: int, rotation: int):
+            img_array = np.frombuffer(samples, dtype=np.uint8).reshape(height, width, -1)
+            if rotation != 0:  # 如果Page有旋转角度，则旋转图片
+                tmp_img = Image.fromarray(img_array)
+                ori_img = cv2.cvtColor(np.array(tmp_img), cv2.COLOR_RGB2BGR)
+                rot_img = rotate_img(img=ori_img, angle=360 - rotation)
+                img_array = cv2.cvtColor(rot_img, cv2.COLOR_RGB2BGR)
+            return img_array
+
         def pdf2text(filepath):
             import fitz  # pyMuPDF里面的fitz包，不要与pip install fitz混淆
-            import numpy as np
 
-            ocr = get_ocr()
             doc = fitz.open(filepath)
-            resp = ""
+            # 按页面顺序保存文本和 OCR 任务，图片在 OCR 线程中并行识别，最后按顺序拼接
+            parts = []
 
             b_unit = tqdm.tqdm(
                 total=doc.page_count, desc="RapidOCRPDFLoader context page index: 0"
@@ -53,9 +61,10 @@ class RapidOCRPDFLoader(UnstructuredFileLoader):
                 )
                 b_unit.refresh()
                 text = page.get_text("")
-                resp += text + "\n"
+                parts.append(text + "\n")
 
-                img_list = page.get_image_info(xrefs=True)
+                # 没有图片的页面不需要解析图片位置
+                img_list = page.get_image_info(xrefs=True) if page.get_images() else []
                 for img in img_list:
                     if xref := img.get("xref"):
                         bbox = img["bbox"]
@@ -66,29 +75,17 @@ class RapidOCRPDFLoader(UnstructuredFileLoader):
                             page.rect.height
                         ) < Settings.kb_settings.PDF_OCR_THRESHOLD[1]:
                             continue
+                        # pymupdf 不支持多线程，在当前线程取出像素数据，解码和旋转在 OCR 线程中完成
                         pix = fitz.Pixmap(doc, xref)
-                        samples = pix.samples
-                        if int(page.rotation) != 0:  # 如果Page有旋转角度，则旋转图片
-                            img_array = np.frombuffer(
-                                pix.samples, dtype=np.uint8
-                            ).reshape(pix.height, pix.width, -1)
-                            tmp_img = Image.fromarray(img_array)
-                            ori_img = cv2.cvtColor(np.array(tmp_img), cv2.COLOR_RGB2BGR)
-                            rot_img = rotate_img(img=ori_img, angle=360 - page.rotation)
-                            img_array = cv2.cvtColor(rot_img, cv2.COLOR_RGB2BGR)
-                        else:
-                            img_array = np.frombuffer(
-                                pix.samples, dtype=np.uint8
-                            ).reshape(pix.height, pix.width, -1)
-
-                        result, _ = ocr(img_array)
-                        if result:
-                            ocr_result = [line[1] for line in result]
-                            resp += "\n".join(ocr_result)
+                        parts.append(
+                            ocr_pool.submit(
+                                pixmap_to_array, pix.samples, pix.height, pix.width, int(page.rotation)
+                            )
+                        )
 
                 # 更新进度
                 b_unit.update(1)
-            return resp
+            return join_ocr_parts(parts)
 
         text = pdf2text(self.file_path)
         from unstructured.partition.text import partition_text
@@ -3,6 +3,8 @@ from typing import List
 import tqdm
 from langchain_community.document_loaders.unstructured import UnstructuredFileLoader
 
+from chatchat.server.file_rag.document_loaders.ocr import join_ocr_parts, ocr_pool
+
 
 class RapidOCRPPTLoader(UnstructuredFileLoader):
     def _get_elements(self) -> List:
@@ -12,27 +14,23 @@ class RapidOCRPPTLoader(UnstructuredFileLoader):
             import numpy as np
             from PIL import Image
             from pptx import Presentation
-            from rapidocr_onnxruntime import RapidOCR
 
-            ocr = RapidOCR()
             prs = Presentation(filepath)
-            resp = ""
+            # 按顺序保存文本和 OCR 任务，图片在 OCR 线程中并行识别，最后按顺序拼接
+            parts = []
 
             def extract_text(shape):
-                nonlocal resp
                 if shape.has_text_frame:
-                    resp += shape.text.strip() + "\n"
+                    parts.append(shape.text.strip() + "\n")
                 if shape.has_table:
                     for row in shape.table.rows:
                         for cell in row.cells:
                             for paragraph in cell.text_frame.paragraphs:
-                                resp += paragraph.text.strip() + "\n"
+                                parts.append(paragraph.text.strip() + "\n")
                 if shape.shape_type == 13:  # 13 表示图片
-                    image = Image.open(BytesIO(shape.image.blob))
-                    result, _ = ocr(np.array(image))
-                    if result:
-                        ocr_result = [line[1] for line in result]
-                        resp += "\n".join(ocr_result)
+                    parts.append(ocr_pool.submit(
+                        lambda blob: np.array(Image.open(BytesIO(blob))), shape.image.blob
+                    ))
                 elif shape.shape_type == 6:  # 6 表示组合
                     for child_shape in shape.shapes:
                         extract_text(child_shape)
@@ -52,7 +50,7 @@ class RapidOCRPPTLoader(UnstructuredFileLoader):
                 for shape in sorted_shapes:
                     extract_text(shape)
                 b_unit.update(1)
-            return resp
+            return join_ocr_parts(parts)
 
         text = ppt2text(self.file_path)
         from unstructured.partition.text import partition_text
@@ -1,4 +1,11 @@
-from typing import TYPE_CHECKING
+import os
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, Callable, List, Union
+
+from chatchat.settings import Settings
 
 if TYPE_CHECKING:
     try:
@@ -8,6 +15,9 @@ if TYPE_CHECKING:
 
 
 def get_ocr(use_cuda: bool = True) -> "RapidOCR":
+    """
+    创建一个新的 OCR 引擎，加载模型较慢，文档加载器应使用 ocr_pool
+    """
     try:
         from rapidocr_paddle import RapidOCR
 
@@ -19,3 +29,105 @@ def get_ocr(use_cuda: bool = True) -> "RapidOCR":
 
         ocr = RapidOCR()
     return ocr
+
+
+def ocr_result_text(result) -> str:
+    if result:
+        return "\n".join([line[1] for line in result])
+    return ""
+
+
+class OCRPool:
+    """
+    进程内共享的 OCR 引擎池。引擎在第一次使用时创建并一直复用，同一时间每个引擎只被一个线程使用。
+    submit 将图片交给与引擎数量相同的线程并行识别（onnxruntime 推理时会释放 GIL），
+    等待识别的图片数量有上限，避免大文件的图片全部解码后堆积在内存中。
+    """
+
+    def __init__(self, size: int = None, use_cuda: bool = True, engine_factory: Callable = None):
+        self._size = size
+        self.use_cuda = use_cuda
+        self.engine_factory = engine_factory or (lambda: get_ocr(self.use_cuda))
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._idle = queue.Queue()
+        self._created = 0
+        self._executor = None
+        self._pending = threading.BoundedSemaphore(self.size * 4)
+
+    @property
+    def size(self) -> int:
+        return max(self._size or Settings.kb_settings.OCR_WORKERS, 1)
+
+    def _check_pid(self):
+        # fork 出的子进程不能使用父进程的线程和引擎，重新创建
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._reset()
+
+    @contextmanager
+    def engine(self):
+        self._check_pid()
+        try:
+            ocr = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                create = self._created < self.size
+                if create:
+                    self._created += 1
+            if create:
+                try:
+                    ocr = self.engine_factory()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                ocr = self._idle.get()
+        try:
+            yield ocr
+        finally:
+            self._idle.put(ocr)
+
+    def __call__(self, img: Any) -> str:
+        """
+        在当前线程中识别图片（numpy 数组或文件路径），返回识别出的文本
+        """
+        with self.engine() as ocr:
+            result, _ = ocr(img)
+        return ocr_result_text(result)
+
+    def submit(self, func: Callable, *args) -> Future:
+        """
+        在 OCR 线程中执行 func(*args)（如图片预处理），再识别其返回的图片，返回 Future[str]。
+        等待识别的图片过多时阻塞
+        """
+        self._check_pid()
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.size, thread_name_prefix="ocr"
+                    )
+        self._pending.acquire()
+        try:
+            future = self._executor.submit(lambda: self(func(*args)))
+        except Exception:
+            self._pending.release()
+            raise
+        future.add_done_callback(lambda _: self._pending.release())
+        return future
+
+
+def join_ocr_parts(parts: List[Union[str, Future]]) -> str:
+    """
+    按顺序拼接文本和 OCR 结果
+    """
+    return "".join(p if isinstance(p, str) else p.result() for p in parts)
+
+
+ocr_pool = OCRPool()
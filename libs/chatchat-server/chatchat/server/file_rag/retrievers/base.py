@@ -19,7 +19,11 @@ class BaseRetrieverService(metaclass=ABCMeta):
         vectorstore: VectorStore,
         top_k: int,
         score_threshold: int | float,
+        search_kwargs: dict = None,
     ):
+        """
+        search_kwargs 会原样传给向量库的检索方法，用于传递各向量库自己的过滤条件（filter/expr 等）
+        """
         pass
 
     @abstractmethod
@@ -1,13 +1,65 @@
 from __future__ import annotations
 
+from typing import List, Optional
+
+import numpy as np
+from langchain.docstore.document import Document
 from langchain.retrievers import EnsembleRetriever
 from langchain.vectorstores import VectorStore
 from langchain_community.retrievers import BM25Retriever
+from langchain_core.callbacks.manager import CallbackManagerForRetrieverRun
 from langchain_core.retrievers import BaseRetriever
 
 from chatchat.server.file_rag.retrievers.base import BaseRetrieverService
 
 
+class FaissSelectorRetriever(BaseRetriever):
+    """
+    只在 faiss 索引的指定位置中检索。过滤通过 IDSelector 在 faiss 内部完成，不需要多取结果后再过滤。
+    """
+
+    vectorstore: VectorStore
+    positions: List[int]
+    k: int = 4
+    score_threshold: Optional[float] = None
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        import faiss
+
+        vs = self.vectorstore
+        if not self.positions:
+            return []
+        if not hasattr(faiss, "SearchParameters"):  # faiss < 1.7.3 不支持 IDSelector，在全部结果中过滤
+            allowed = {vs.index_to_docstore_id[i] for i in self.positions}
+            docs = vs.similarity_search_with_relevance_scores(
+                query,
+                k=self.k,
+                filter=lambda m: m.get("id") in allowed,
+                fetch_k=vs.index.ntotal,
+                score_threshold=self.score_threshold,
+            )
+            return [doc for doc, _ in docs]
+
+        vector = np.array([vs._embed_query(query)], dtype=np.float32)
+        if vs._normalize_L2:
+            faiss.normalize_L2(vector)
+        ids = np.array(self.positions, dtype=np.int64)
+        params = faiss.SearchParameters(sel=faiss.IDSelectorBatch(len(ids), faiss.swig_ptr(ids)))
+        scores, indices = vs.index.search(vector, min(self.k, len(ids)), params=params)
+
+        relevance_score_fn = vs._select_relevance_score_fn()
+        docs = []
+        for score, i in zip(scores[0], indices[0]):
+            if i == -1:
+                continue
+            if self.score_threshold is not None and relevance_score_fn(score) < self.score_threshold:
+                continue
+            docs.append(vs.docstore.search(vs.index_to_docstore_id[i]))
+        return docs
+
+
 class EnsembleRetrieverService(BaseRetrieverService):
     def do_init(
         self,
@@ -23,17 +75,32 @@ class EnsembleRetrieverService(BaseRetrieverService):
         vectorstore: VectorStore,
         top_k: int,
         score_threshold: int | float,
+        search_kwargs: dict = None,
     ):
-        faiss_retriever = vectorstore.as_retriever(
-            search_type="similarity_score_threshold",
-            search_kwargs={"score_threshold": score_threshold, "k": top_k},
-        )
+        """
+        search_kwargs 中的 positions 为 faiss 索引位置列表，指定时向量检索与 BM25 都只在这些文档中进行
+        """
+        search_kwargs = dict(search_kwargs or {})
+        positions = search_kwargs.pop("positions", None)
+        if positions is None:
+            faiss_retriever = vectorstore.as_retriever(
+                search_type="similarity_score_threshold",
+                search_kwargs={"score_threshold": score_threshold, "k": top_k, **search_kwargs},
+            )
+            docs = list(vectorstore.docstore._dict.values())
+        else:
+            faiss_retriever = FaissSelectorRetriever(
+                vectorstore=vectorstore,
+                positions=positions,
+                k=top_k,
+                score_threshold=score_threshold,
+            )
+            docs = [vectorstore.docstore._dict[vectorstore.index_to_docstore_id[i]] for i in positions]
         # TODO: 换个不用torch的实现方式
         # from cutword.cutword import Cutter
         import jieba
 
         # cutter = Cutter()
-        docs = list(vectorstore.docstore._dict.values())
         bm25_retriever = BM25Retriever.from_documents(
             docs,
             preprocess_func=jieba.lcut_for_search,
@@ -110,10 +110,12 @@ class MilvusVectorstoreRetrieverService(BaseRetrieverService):
         vectorstore: VectorStore,
         top_k: int,
         score_threshold: int or float,
+        search_kwargs: dict = None,
     ):
         retriever = MilvusRetriever(vectorstore=vectorstore, 
                                     search_type="similarity_score_threshold",
-                                    search_kwargs={"score_threshold": score_threshold, "k": top_k}
+                                    search_kwargs={"score_threshold": score_threshold, "k": top_k,
+                                                   **(search_kwargs or {})}
                                     )
         
         return MilvusVectorstoreRetrieverService(retriever=retriever, top_k=top_k)
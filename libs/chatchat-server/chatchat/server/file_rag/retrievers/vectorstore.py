@@ -22,10 +22,11 @@ class VectorstoreRetrieverService(BaseRetrieverService):
         vectorstore: VectorStore,
         top_k: int,
         score_threshold: int | float,
+        search_kwargs: dict = None,
     ):
         retriever = vectorstore.as_retriever(
             search_type="similarity_score_threshold",
-            search_kwargs={"score_threshold": score_threshold, "k": top_k},
+            search_kwargs={"score_threshold": score_threshold, "k": top_k, **(search_kwargs or {})},
         )
         return VectorstoreRetrieverService(retriever=retriever, top_k=top_k)
 
@@ -1,28 +1,43 @@
 import urllib
 
-from fastapi import Body
+from fastapi import Body, Query
 
 from chatchat.settings import Settings
 from chatchat.server.db.repository.knowledge_base_repository import list_kbs_from_db
 from chatchat.server.knowledge_base.kb_service.base import KBServiceFactory
 from chatchat.server.knowledge_base.utils import validate_kb_name
-from chatchat.server.utils import BaseResponse, ListResponse, get_default_embedding
+from chatchat.server.utils import BaseResponse, ListResponse, PageResponse
 from chatchat.utils import build_logger
 
 
 logger = build_logger()
 
 
-def list_kbs():
+def list_kbs(
+    cursor: str = Query(None, description="上一页返回的 next_cursor"),
+    limit: int = Query(None, ge=1, description="每页数量，为空时返回全部"),
+):
     # Get List of Knowledge Base
-    return ListResponse(data=list_kbs_from_db())
+    if limit is None and cursor is None:
+        return ListResponse(data=list_kbs_from_db())
+
+    try:
+        cursor = None if cursor is None else int(cursor)
+    except ValueError:
+        return PageResponse(code=400, msg=f"无效的 cursor：{cursor}", data=[])
+    kbs = list_kbs_from_db(cursor=cursor, limit=None if limit is None else limit + 1)
+    next_cursor = None
+    if limit is not None and len(kbs) > limit:
+        kbs = kbs[:limit]
+        next_cursor = str(kbs[-1].id)
+    return PageResponse(data=kbs, next_cursor=next_cursor)
 
 
 def create_kb(
     knowledge_base_name: str = Body(..., examples=["samples"]),
     vector_store_type: str = Body(Settings.kb_settings.DEFAULT_VS_TYPE),
     kb_info: str = Body("", description="知识库内容简介，用于Agent选择知识库。"),
-    embed_model: str = Body(get_default_embedding()),
+    embed_model: str = Body(None, description="嵌入模型名称，为空时使用默认嵌入模型"),
 ) -> BaseResponse:
     # Create selected knowledge base
     if not validate_kb_name(knowledge_base_name):
@@ -1,4 +1,5 @@
 import threading
+import time
 from collections import OrderedDict
 from contextlib import contextmanager
 from typing import Any, List, Tuple, Union, Generator
@@ -21,6 +22,7 @@ class ThreadSafeObject:
         self._pool = pool
         self._lock = threading.RLock()
         self._loaded = threading.Event()
+        self.last_access = time.time()
 
     def __repr__(self) -> str:
         cls = type(self).__name__
@@ -35,6 +37,7 @@ class ThreadSafeObject:
         owner = owner or f"thread {threading.get_native_id()}"
         try:
             self._lock.acquire()
+            self.last_access = time.time()
             if self._pool is not None:
                 self._pool._cache.move_to_end(self.key)
             logger.debug(f"{owner} 开始操作：{self.key}。{msg}")
@@ -1,4 +1,18 @@
 import os
+import pickle
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from contextlib import nullcontext
+from typing import Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # windows
+    fcntl = None
+    import msvcrt
 
 from langchain.docstore.in_memory import InMemoryDocstore
 from langchain.schema import Document
@@ -24,7 +38,103 @@ def _new_ds_search(self, search: str) -> Union[str, Document]:
 InMemoryDocstore.search = _new_ds_search
 
 
+def vs_version(vs_path: str) -> Optional[Tuple]:
+    """
+    向量库在磁盘上的版本。保存时以 os.replace 替换 index.faiss，文件的 inode 和修改时间随之改变，
+    各进程据此判断缓存是否已被其它进程修改。向量库不存在时返回 None
+    """
+    try:
+        st = os.stat(os.path.join(vs_path, "index.faiss"))
+    except OSError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+@contextmanager
+def vs_file_lock(vs_path: str, shared: bool = False):
+    """
+    向量库的进程间文件锁，写入时使用排它锁，从磁盘加载时使用共享锁，避免读到只替换了一半的文件。
+    锁文件位于向量库目录之外，清空向量库时不会被删除。
+    同一线程中不能嵌套获取同一个向量库的锁
+    """
+    lock_path = vs_path.rstrip("/\\") + ".lock"
+    os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+    with open(lock_path, "a+") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        else:  # windows 不支持共享锁，都使用排它锁
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def load_faiss_from_disk(vs_path: str, embeddings, mmap: bool = False) -> Tuple[FAISS, bool]:
+    """
+    从磁盘加载 FAISS 向量库，返回 (向量库, 是否只读)。
+    mmap=True 时以只读方式映射索引文件，多个进程共享同一份内存页；需要 faiss 1.8+，否则正常加载
+    """
+    import faiss
+
+    flags = getattr(faiss, "IO_FLAG_MMAP_IFC", None)
+    if not mmap or flags is None:
+        vector_store = FAISS.load_local(
+            vs_path,
+            embeddings,
+            normalize_L2=True,
+            allow_dangerous_deserialization=True,
+        )
+        return vector_store, False
+
+    index = faiss.read_index(os.path.join(vs_path, "index.faiss"), flags | faiss.IO_FLAG_READ_ONLY)
+    with open(os.path.join(vs_path, "index.pkl"), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    vector_store = FAISS(embeddings, index, docstore, index_to_docstore_id, normalize_L2=True)
+    return vector_store, True
+
+
+def save_faiss_to_disk(vector_store: FAISS, vs_path: str):
+    """
+    先写入临时目录再替换原文件，其它进程 mmap 的旧文件不受影响。多进程模式下调用方需持有 vs_file_lock
+    """
+    os.makedirs(vs_path, exist_ok=True)
+    tmp_path = tempfile.mkdtemp(prefix=".tmp_", dir=vs_path)
+    try:
+        vector_store.save_local(tmp_path)
+        for name in ["index.pkl", "index.faiss"]:
+            os.replace(os.path.join(tmp_path, name), os.path.join(vs_path, name))
+    finally:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+
 class ThreadSafeFaiss(ThreadSafeObject):
+    # 加载或保存时磁盘上的版本，见 vs_version
+    version: Optional[Tuple] = None
+    # 以 mmap 只读方式加载的索引不能修改，写入前需以可写方式重新加载
+    read_only: bool = False
+    # metadata 倒排索引：{key: {str(value): [position, ...]}}，按需为被过滤过的键建立
+    _metadata_index: Dict[str, Dict[str, List[int]]] = None
+    _metadata_index_owner: Dict = None
+    _metadata_index_size: int = 0
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # 尚未保存到磁盘的修改。批量写入时向量库只在最后保存，期间其它进程保存了同一向量库时，
+        # 重新加载后需要重放这些修改，否则已写入数据库的文档会从向量库中丢失
+        self._pending_adds: Dict[str, Tuple[str, List[float], Dict]] = {}
+        self._pending_deletes: set = set()
+
     def __repr__(self) -> str:
         cls = type(self).__name__
         return f"<{cls}: key: {self.key}, obj: {self._obj}, docs_count: {self.docs_count()}>"
@@ -32,13 +142,104 @@ class ThreadSafeFaiss(ThreadSafeObject):
     def docs_count(self) -> int:
         return len(self._obj.docstore._dict)
 
+    def memory_size(self) -> int:
+        """
+        估算占用的内存（字节）：向量 + 文档文本
+        """
+        vs = self._obj
+        if vs is None:
+            return 0
+        size = vs.index.ntotal * vs.index.d * 4
+        for doc in list(vs.docstore._dict.values()):
+            size += sys.getsizeof(doc.page_content)
+        return size
+
+    def metadata_positions(self, metadata: Dict) -> List[int]:
+        """
+        返回 metadata 匹配（按字符串比较）的文档在 faiss 索引中的位置，需在 acquire 内调用。
+        向量库增删文档后 index_to_docstore_id 会被替换或改变长度，此时倒排索引自动重建。
+        """
+        vs = self._obj
+        mapping = vs.index_to_docstore_id
+        if self._metadata_index_owner is not mapping or self._metadata_index_size != len(mapping):
+            self._metadata_index = {}
+            self._metadata_index_owner = mapping
+            self._metadata_index_size = len(mapping)
+
+        result = None
+        for k, v in metadata.items():
+            if (index := self._metadata_index.get(k)) is None:
+                index = {}
+                for i, _id in mapping.items():
+                    doc = vs.docstore._dict.get(_id)
+                    if doc is not None and k in doc.metadata:
+                        index.setdefault(str(doc.metadata[k]), []).append(i)
+                self._metadata_index[k] = index
+            positions = set(index.get(str(v), ()))
+            result = positions if result is None else result & positions
+            if not result:
+                return []
+        return sorted(result or [])
+
+    @property
+    def dirty(self) -> bool:
+        """是否有尚未保存到磁盘的修改"""
+        return bool(self._pending_adds or self._pending_deletes)
+
+    def add_embeddings(
+        self,
+        texts: List[str],
+        embeddings: List[List[float]],
+        metadatas: List[Dict],
+    ) -> List[str]:
+        """
+        添加已向量化的文档并记录为未保存的修改，需在 acquire 内调用
+        """
+        ids = self._obj.add_embeddings(
+            text_embeddings=zip(texts, embeddings), metadatas=metadatas
+        )
+        for id, text, embedding, metadata in zip(ids, texts, embeddings, metadatas):
+            self._pending_adds[id] = (text, embedding, metadata)
+        return ids
+
+    def delete(self, ids: List[str]):
+        """
+        删除文档并记录为未保存的修改，需在 acquire 内调用
+        """
+        ret = self._obj.delete(ids)
+        for id in ids:
+            if self._pending_adds.pop(id, None) is None:
+                self._pending_deletes.add(id)
+        return ret
+
+    def replay_pending(self):
+        """
+        从磁盘重新加载后，将未保存的修改应用到新加载的向量库上，需在 acquire 内调用
+        """
+        vs = self._obj
+        if deletes := [id for id in self._pending_deletes if id in vs.docstore._dict]:
+            vs.delete(deletes)
+        if adds := [(id, v) for id, v in self._pending_adds.items() if id not in vs.docstore._dict]:
+            vs.add_embeddings(
+                text_embeddings=[(text, embedding) for _, (text, embedding, _) in adds],
+                metadatas=[metadata for _, (_, _, metadata) in adds],
+                ids=[id for id, _ in adds],
+            )
+        logger.info(
+            f"向量库 {self.key} 已被其它进程修改，重新加载后合并了 {len(adds)} 个新增、{len(deletes)} 个删除的文档"
+        )
+
     def save(self, path: str, create_path: bool = True):
+        """
+        先写入临时目录再替换原文件，其它进程 mmap 的旧文件不受影响。
+        多进程模式下调用方需持有 vs_file_lock
+        """
         with self.acquire():
-            if not os.path.isdir(path) and create_path:
-                os.makedirs(path)
-            ret = self._obj.save_local(path)
+            save_faiss_to_disk(self._obj, path)
+            self.version = vs_version(path)
+            self._pending_adds.clear()
+            self._pending_deletes.clear()
             logger.info(f"已将向量库 {self.key} 保存到磁盘")
-        return ret
 
     def clear(self):
         ret = []
@@ -55,7 +256,7 @@ class _FaissPool(CachePool):
     def new_vector_store(
         self,
         kb_name: str,
-        embed_model: str = get_default_embedding(),
+        embed_model: str = None,
     ) -> FAISS:
         # create an empty vector store
         embeddings = get_Embeddings(embed_model=embed_model)
@@ -67,7 +268,7 @@ class _FaissPool(CachePool):
 
     def new_temp_vector_store(
         self,
-        embed_model: str = get_default_embedding(),
+        embed_model: str = None,
     ) -> FAISS:
         # create an empty vector store
         embeddings = get_Embeddings(embed_model=embed_model)
@@ -93,11 +294,18 @@ class KBFaissPool(_FaissPool):
         kb_name: str,
         vector_name: str = None,
         create: bool = True,
-        embed_model: str = get_default_embedding(),
+        embed_model: str = None,
+        writable: bool = False,
     ) -> ThreadSafeFaiss:
+        """
+        缓存的向量库在磁盘上被其它进程修改过时重新加载。
+        writable=True 表示调用方将修改向量库，此时调用方需持有 vs_file_lock，mmap 加载的只读索引会被重新加载
+        """
+        embed_model = embed_model or get_default_embedding()
         self.atomic.acquire()
         locked = True
         vector_name = vector_name or embed_model.replace(":", "_")
+        vs_path = get_vs_path(kb_name, vector_name)
         cache = self.get((kb_name, vector_name))  # 用元组比拼接字符串好一些
         try:
             if cache is None:
@@ -109,31 +317,18 @@ class KBFaissPool(_FaissPool):
                     logger.info(
                         f"loading vector store in '{kb_name}/vector_store/{vector_name}' from disk."
                     )
-                    vs_path = get_vs_path(kb_name, vector_name)
-
-                    if os.path.isfile(os.path.join(vs_path, "index.faiss")):
-                        embeddings = get_Embeddings(embed_model=embed_model)
-                        vector_store = FAISS.load_local(
-                            vs_path,
-                            embeddings,
-                            normalize_L2=True,
-                            allow_dangerous_deserialization=True,
-                        )
-                    elif create:
-                        # create an empty vector store
-                        if not os.path.exists(vs_path):
-                            os.makedirs(vs_path)
-                        vector_store = self.new_vector_store(
-                            kb_name=kb_name, embed_model=embed_model
-                        )
-                        vector_store.save_local(vs_path)
-                    else:
-                        raise RuntimeError(f"knowledge base {kb_name} not exist.")
-                    item.obj = vector_store
+                    self._load_from_disk(item, vs_path, embed_model, create, writable)
                     item.finish_loading()
             else:
                 self.atomic.release()
                 locked = False
+                if (cache.read_only and writable) or cache.version != vs_version(vs_path):
+                    with cache.acquire(msg="重新加载"):
+                        if (cache.read_only and writable) or cache.version != vs_version(vs_path):
+                            logger.info(
+                                f"reloading vector store in '{kb_name}/vector_store/{vector_name}' from disk."
+                            )
+                            self._load_from_disk(cache, vs_path, embed_model, create, writable)
         except Exception as e:
             if locked:  # we don't know exception raised before or after atomic.release
                 self.atomic.release()
@@ -141,17 +336,72 @@ class KBFaissPool(_FaissPool):
             raise RuntimeError(f"向量库 {kb_name} 加载失败。")
         return self.get((kb_name, vector_name))
 
+    def _load_from_disk(
+        self,
+        item: ThreadSafeFaiss,
+        vs_path: str,
+        embed_model: str,
+        create: bool,
+        writable: bool,
+    ):
+        kb_name = item.key[0]
+        exists = os.path.isfile(os.path.join(vs_path, "index.faiss"))
+        if not exists and not create:
+            raise RuntimeError(f"knowledge base {kb_name} not exist.")
+        # 有未保存的修改时需要可写的索引来合并
+        mmap = Settings.kb_settings.FAISS_MMAP and not writable and not item.dirty
+        if writable:  # 调用方已持有排它锁
+            lock = nullcontext()
+        elif exists:
+            lock = vs_file_lock(vs_path, shared=True)
+        else:  # 创建空向量库，其它进程可能同时在创建
+            lock = vs_file_lock(vs_path)
+
+        with lock:
+            if os.path.isfile(os.path.join(vs_path, "index.faiss")):
+                embeddings = get_Embeddings(embed_model=embed_model)
+                vector_store, read_only = load_faiss_from_disk(vs_path, embeddings, mmap)
+            elif create:
+                # create an empty vector store
+                vector_store = self.new_vector_store(
+                    kb_name=kb_name, embed_model=embed_model
+                )
+                save_faiss_to_disk(vector_store, vs_path)
+                read_only = False
+            else:
+                raise RuntimeError(f"knowledge base {kb_name} not exist.")
+            version = vs_version(vs_path)
+        item.obj = vector_store
+        item.read_only = read_only
+        item.version = version
+        if item.dirty:
+            item.replay_pending()
+
 
 class MemoFaissPool(_FaissPool):
     r"""
-    临时向量库的缓存池
+    临时向量库的缓存池。
+    向量库空闲超过 MEMO_VS_TTL 秒或总内存超过 MEMO_VS_MAX_MEMORY_MB 时被释放，同时删除对应的临时目录；
+    后台线程定期清理，并删除不属于任何临时向量库的过期临时目录（如进程重启前遗留的目录）
     """
 
+    def __init__(self, cache_num: int = -1):
+        super().__init__(cache_num=cache_num)
+        self._sweeper: Optional[threading.Thread] = None
+        self.metrics = {
+            "evicted_count": 0,
+            "evicted_ttl": 0,
+            "evicted_memory": 0,
+            "removed_dirs": 0,
+            "removed_bytes": 0,
+        }
+
     def load_vector_store(
         self,
         kb_name: str,
-        embed_model: str = get_default_embedding(),
+        embed_model: str = None,
     ) -> ThreadSafeFaiss:
+        self.start_sweeper()
         self.atomic.acquire()
         cache = self.get(kb_name)
         if cache is None:
@@ -168,6 +418,116 @@ class MemoFaissPool(_FaissPool):
             self.atomic.release()
         return self.get(kb_name)
 
+    def _check_count(self):
+        if isinstance(self._cache_num, int) and self._cache_num > 0:
+            while len(self._cache) > self._cache_num:
+                self.evict(next(iter(self._cache)), reason="count")
+
+    def evict(self, kb_name: str, reason: str = None) -> bool:
+        """
+        释放临时向量库并删除其临时目录。reason 为 count/ttl/memory，用于统计
+        """
+        with self.atomic:
+            item = self.pop(kb_name)
+        if item is None:
+            return False
+        if reason:
+            self.metrics[f"evicted_{reason}"] += 1
+        self._remove_temp_dir(os.path.join(Settings.basic_settings.BASE_TEMP_DIR, kb_name))
+        logger.info(f"已释放临时向量库 {kb_name}（{reason}）")
+        return True
+
+    def _remove_temp_dir(self, path: str):
+        if not os.path.isdir(path):
+            return
+        size = sum(
+            os.path.getsize(os.path.join(root, f))
+            for root, _, files in os.walk(path)
+            for f in files
+        )
+        shutil.rmtree(path, ignore_errors=True)
+        self.metrics["removed_dirs"] += 1
+        self.metrics["removed_bytes"] += size
+
+    def memory_size(self) -> int:
+        return sum(item.memory_size() for item in list(self._cache.values()))
+
+    def check_memory(self, keep: str = None):
+        """
+        总内存超过 MEMO_VS_MAX_MEMORY_MB 时按最近最少使用的顺序释放，keep 指定的向量库不释放
+        """
+        limit = Settings.kb_settings.MEMO_VS_MAX_MEMORY_MB * 1024 * 1024
+        if limit <= 0:
+            return
+        sizes = {k: v.memory_size() for k, v in list(self._cache.items())}
+        total = sum(sizes.values())
+        for kb_name, size in sizes.items():  # 按 LRU 顺序
+            if total <= limit:
+                break
+            if kb_name != keep and self.evict(kb_name, reason="memory"):
+                total -= size
+
+    def sweep(self):
+        """
+        释放过期的临时向量库，删除过期的孤立临时目录
+        """
+        ttl = Settings.kb_settings.MEMO_VS_TTL
+        now = time.time()
+        if ttl > 0:
+            for kb_name, item in list(self._cache.items()):
+                if now - item.last_access > ttl:
+                    self.evict(kb_name, reason="ttl")
+        self.check_memory()
+
+        if ttl <= 0:
+            return
+        # 多进程模式下其它进程的临时目录不在本进程的缓存池中，通过目录的修改时间判断是否仍在使用
+        temp_dir = Settings.basic_settings.BASE_TEMP_DIR
+        alive = set(self.keys())
+        for kb_name in alive:
+            path = os.path.join(temp_dir, kb_name)
+            if os.path.isdir(path):
+                os.utime(path)
+        expire = max(ttl, Settings.kb_settings.MEMO_SWEEP_INTERVAL * 2)
+        for entry in os.scandir(temp_dir):
+            # 只处理 get_temp_dir 创建的目录（uuid hex 名称）
+            if not entry.is_dir() or len(entry.name) != 32 or entry.name in alive:
+                continue
+            try:
+                int(entry.name, 16)
+            except ValueError:
+                continue
+            if now - entry.stat().st_mtime > expire:
+                self._remove_temp_dir(entry.path)
+                logger.info(f"已删除过期临时目录 {entry.path}")
+
+    def start_sweeper(self):
+        interval = Settings.kb_settings.MEMO_SWEEP_INTERVAL
+        if interval <= 0 or (self._sweeper is not None and self._sweeper.is_alive()):
+            return
+
+        def run():
+            while True:
+                try:
+                    self.sweep()
+                except Exception as e:
+                    logger.exception(e)
+                time.sleep(interval)
+
+        with self.atomic:
+            if self._sweeper is None or not self._sweeper.is_alive():
+                self._sweeper = threading.Thread(target=run, name="memo_vs_sweeper", daemon=True)
+                self._sweeper.start()
+
+    def stats(self) -> Dict:
+        return {
+            "count": len(self._cache),
+            "memory_bytes": self.memory_size(),
+            "memory_limit_bytes": Settings.kb_settings.MEMO_VS_MAX_MEMORY_MB * 1024 * 1024,
+            "ttl": Settings.kb_settings.MEMO_VS_TTL,
+            **self.metrics,
+        }
+
 
 kb_faiss_pool = KBFaissPool(cache_num=Settings.kb_settings.CACHED_VS_NUM)
 memo_faiss_pool = MemoFaissPool(cache_num=Settings.kb_settings.CACHED_MEMO_VS_NUM)
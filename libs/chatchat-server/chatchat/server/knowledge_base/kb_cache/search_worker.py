@@ -0,0 +1,176 @@
+"""
+FAISS 检索进程：在独立进程中加载向量库并提供检索，避免向量检索、BM25 打分等 CPU 密集操作与 API 进程争用 GIL。
+API 进程通过本地 socket（windows 下为命名管道）发送检索请求，同一个向量库总是发往同一个检索进程，
+每个向量库只在一个检索进程中加载。向量库修改后由检索进程根据磁盘上的版本号自动重新加载。
+"""
+import os
+import stat
+import sys
+import tempfile
+import threading
+import zlib
+from multiprocessing.connection import Client, Connection, Listener
+from typing import Any, Dict, List, Optional
+
+from langchain.docstore.document import Document
+
+from chatchat.settings import Settings
+from chatchat.utils import build_logger
+
+
+logger = build_logger()
+
+AUTHKEY_ENV = "CHATCHAT_SEARCH_AUTHKEY"
+
+
+def _socket_dir() -> str:
+    """
+    存放 socket 文件的私有目录（仅当前用户可访问）。
+    不放在 DATA_PATH 下是因为 unix socket 路径长度有限制（约 100 字节）
+    """
+    path = os.path.join(tempfile.gettempdir(), f"chatchat-{os.getuid()}")
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid():
+        raise RuntimeError(f"检索进程 socket 目录 {path} 不属于当前用户")
+    if stat.S_IMODE(st.st_mode) != 0o700:
+        os.chmod(path, 0o700)
+    return path
+
+
+def worker_address(index: int) -> str:
+    name = f"chatchat_search_{Settings.basic_settings.API_SERVER['port']}_{index}"
+    if sys.platform == "win32":
+        return rf"\\.\pipe\{name}"
+    return os.path.join(_socket_dir(), f"{name}.sock")
+
+
+def _authkey() -> Optional[bytes]:
+    if key := os.environ.get(AUTHKEY_ENV):
+        return key.encode()
+
+
+def _serve_connection(conn: Connection):
+    from chatchat.server.knowledge_base.kb_service.faiss_kb_service import (
+        search_vector_store,
+    )
+
+    methods = {
+        "search": search_vector_store,
+        "ping": os.getpid,
+    }
+    with conn:
+        while True:
+            try:
+                method, kwargs = conn.recv()
+            except (EOFError, OSError):
+                break
+            try:
+                result = methods[method](**kwargs)
+                conn.send(("ok", result))
+            except Exception as e:
+                logger.exception(e)
+                conn.send(("error", f"{type(e).__name__}: {e}"))
+
+
+def serve(address: str, started_event=None):
+    """
+    在 address 上监听检索请求，每个连接使用一个线程处理
+    """
+    if sys.platform != "win32" and os.path.exists(address):
+        os.remove(address)  # 上次异常退出遗留的 socket 文件
+    with Listener(address, authkey=_authkey()) as listener:
+        logger.info(f"search worker ({os.getpid()}) listening on {address}")
+        if started_event is not None:
+            started_event.set()
+        while True:
+            try:
+                conn = listener.accept()
+            except OSError as e:  # 认证失败等
+                logger.warning(f"search worker rejected a connection: {e}")
+                continue
+            threading.Thread(target=_serve_connection, args=(conn,), daemon=True).start()
+
+
+def run_search_worker(index: int, started_event=None):
+    from chatchat.server.utils import set_httpx_config
+
+    set_httpx_config()
+    serve(worker_address(index), started_event=started_event)
+
+
+class SearchWorkerClient:
+    """
+    检索进程客户端。每个线程持有到各检索进程的长连接，连接断开时重连一次
+    """
+
+    def __init__(self, num_workers: int, addresses: List[str] = None):
+        self.num_workers = num_workers
+        self.addresses = addresses or [worker_address(i) for i in range(num_workers)]
+        self._local = threading.local()
+
+    def worker_index(self, kb_name: str, vector_name: str) -> int:
+        return zlib.crc32(f"{kb_name}/{vector_name}".encode()) % self.num_workers
+
+    def _connections(self) -> Dict[int, Connection]:
+        if not hasattr(self._local, "conns"):
+            self._local.conns = {}
+        return self._local.conns
+
+    def call(self, index: int, method: str, **kwargs) -> Any:
+        conns = self._connections()
+        for retry in range(2):
+            try:
+                if (conn := conns.get(index)) is None:
+                    conn = conns[index] = Client(self.addresses[index], authkey=_authkey())
+                conn.send((method, kwargs))
+                status, result = conn.recv()
+                break
+            except (EOFError, OSError):
+                if conn := conns.pop(index, None):
+                    conn.close()
+                if retry:
+                    raise
+        if status == "error":
+            raise RuntimeError(f"search worker {index}: {result}")
+        return result
+
+    def search(
+        self,
+        kb_name: str,
+        vector_name: str,
+        embed_model: str,
+        query: str,
+        top_k: int,
+        score_threshold: float,
+        metadata: Dict = None,
+    ) -> List[Document]:
+        return self.call(
+            self.worker_index(kb_name, vector_name),
+            "search",
+            kb_name=kb_name,
+            vector_name=vector_name,
+            embed_model=embed_model,
+            query=query,
+            top_k=top_k,
+            score_threshold=score_threshold,
+            metadata=metadata,
+        )
+
+
+_client: Optional[SearchWorkerClient] = None
+
+
+def get_search_client() -> Optional[SearchWorkerClient]:
+    """
+    SEARCH_WORKERS 大于 0 时返回检索进程客户端，否则返回 None。
+    检索进程由 start_main_server 启动并设置认证密钥，没有密钥时（如直接运行 server_app）
+    不连接检索进程，避免连接到其它进程创建的 socket 并反序列化其返回的数据
+    """
+    global _client
+    num_workers = Settings.kb_settings.SEARCH_WORKERS
+    if num_workers <= 0 or _authkey() is None:
+        return None
+    if _client is None or _client.num_workers != num_workers:
+        _client = SearchWorkerClient(num_workers)
+    return _client
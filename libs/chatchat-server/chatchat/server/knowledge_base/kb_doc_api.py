@@ -1,7 +1,11 @@
 import asyncio
 import json
 import os
+import re
+import shutil
+import time
 import urllib
+import uuid
 from typing import Dict, List
 
 from fastapi import Body, File, Form, Query, UploadFile
@@ -13,28 +17,40 @@ from chatchat.settings import Settings
 from chatchat.server.db.repository.knowledge_file_repository import get_file_detail
 from chatchat.server.knowledge_base.kb_service.base import (
     KBServiceFactory,
-    get_kb_file_details,
+    get_kb_file_details_page,
+    iter_kb_file_details,
 )
 from chatchat.server.knowledge_base.model.kb_document_model import DocumentWithVSId
 from chatchat.server.knowledge_base.utils import (
+    UPLOAD_CHUNK_SIZE,
     KnowledgeFile,
+    file_hash,
     files2docs_in_thread,
     get_file_path,
     list_files_from_folder,
+    place_uploaded_file,
+    save_to_temp_file,
     validate_kb_name,
 )
-from chatchat.server.knowledge_base.kb_cache.faiss_cache import memo_faiss_pool
+from chatchat.server.knowledge_base.kb_cache.faiss_cache import memo_faiss_pool, vs_file_lock
 from chatchat.server.utils import (
     BaseResponse,
-    ListResponse,
+    PageResponse,
     check_embed_model,
+    iter_pages,
+    ndjson_response,
     run_in_thread_pool,
-    get_default_embedding,
 )
 from chatchat.utils import build_logger
 
 logger = build_logger()
 
+# 分块上传的临时文件超过该时间（秒）未更新时删除
+UPLOAD_PART_EXPIRE = 24 * 3600
+
+# 流式导出时每次从数据库读取的数量
+EXPORT_PAGE_SIZE = 1000
+
 
 def search_temp_docs(knowledge_id: str = Body(..., description="知识库 ID", examples=["example_id"]),
                      query: str = Body("", description="用户输入", examples=["你好"]),
@@ -70,7 +86,7 @@ def search_docs(
     data = []
     if kb is not None:
         if query:
-            docs = kb.search_docs(query, top_k, score_threshold)
+            docs = kb.search_docs(query, top_k, score_threshold, metadata=metadata)
             # data = [DocumentWithVSId(**x[0].dict(), score=x[1], id=x[0].metadata.get("id")) for x in docs]
             data = [DocumentWithVSId(**{"id": x.metadata.get("id"), **x.dict()}) for x in docs]
         elif file_name or metadata:
@@ -81,19 +97,96 @@ def search_docs(
     return [x.dict() for x in data]
 
 
-def list_files(knowledge_base_name: str) -> ListResponse:
+def list_files(
+        knowledge_base_name: str,
+        cursor: str = Query(None, description="上一页返回的 next_cursor"),
+        limit: int = Query(None, ge=1, description="每页数量，为空时返回全部"),
+) -> PageResponse:
     if not validate_kb_name(knowledge_base_name):
-        return ListResponse(code=403, msg="Don't attack me", data=[])
+        return PageResponse(code=403, msg="Don't attack me", data=[])
 
     knowledge_base_name = urllib.parse.unquote(knowledge_base_name)
     kb = KBServiceFactory.get_service_by_name(knowledge_base_name)
     if kb is None:
-        return ListResponse(
+        return PageResponse(
             code=404, msg=f"未找到知识库 {knowledge_base_name}", data=[]
         )
     else:
-        all_docs = get_kb_file_details(knowledge_base_name)
-        return ListResponse(data=all_docs)
+        all_docs, next_cursor = get_kb_file_details_page(
+            knowledge_base_name, cursor=cursor, limit=limit
+        )
+        return PageResponse(data=all_docs, next_cursor=next_cursor)
+
+
+def list_docs(
+        knowledge_base_name: str = Body(..., description="知识库名称", examples=["samples"]),
+        file_name: str = Body("", description="文件名称"),
+        metadata: dict = Body({}, description="根据 metadata 进行过滤，仅支持一级键"),
+        cursor: str = Body(None, description="上一页返回的 next_cursor"),
+        limit: int = Body(100, ge=1, description="每页数量"),
+) -> PageResponse:
+    """
+    分页列出知识库中的文档（不进行向量检索）
+    """
+    kb = KBServiceFactory.get_service_by_name(knowledge_base_name)
+    if kb is None:
+        return PageResponse(code=404, msg=f"未找到知识库 {knowledge_base_name}", data=[])
+
+    try:
+        cursor = None if cursor is None else int(cursor)
+    except ValueError:
+        return PageResponse(code=400, msg=f"无效的 cursor：{cursor}", data=[])
+    docs, next_cursor = kb.list_docs_page(
+        file_name=file_name, metadata=metadata, cursor=cursor, limit=limit
+    )
+    data = []
+    for d in docs:
+        d.metadata.pop("vector", None)
+        data.append(d.dict())
+    return PageResponse(
+        data=data, next_cursor=None if next_cursor is None else str(next_cursor)
+    )
+
+
+def export_files(
+        knowledge_base_name: str = Query(..., description="知识库名称", examples=["samples"]),
+):
+    """
+    以 NDJSON 格式流式导出知识库的全部文件信息
+    """
+    if not validate_kb_name(knowledge_base_name):
+        return BaseResponse(code=403, msg="Don't attack me")
+    if KBServiceFactory.get_service_by_name(knowledge_base_name) is None:
+        return BaseResponse(code=404, msg=f"未找到知识库 {knowledge_base_name}")
+
+    return ndjson_response(
+        iter_kb_file_details(knowledge_base_name, page_size=EXPORT_PAGE_SIZE)
+    )
+
+
+def export_docs(
+        knowledge_base_name: str = Body(..., description="知识库名称", examples=["samples"]),
+        file_name: str = Body("", description="文件名称"),
+        metadata: dict = Body({}, description="根据 metadata 进行过滤，仅支持一级键"),
+):
+    """
+    以 NDJSON 格式流式导出知识库中的文档
+    """
+    kb = KBServiceFactory.get_service_by_name(knowledge_base_name)
+    if kb is None:
+        return BaseResponse(code=404, msg=f"未找到知识库 {knowledge_base_name}")
+
+    def fetch_page(cursor):
+        docs, next_cursor = kb.list_docs_page(
+            file_name=file_name, metadata=metadata, cursor=cursor, limit=EXPORT_PAGE_SIZE
+        )
+        data = []
+        for d in docs:
+            d.metadata.pop("vector", None)
+            data.append(d.dict())
+        return data, next_cursor
+
+    return ndjson_response(iter_pages(fetch_page))
 
 
 def _save_files_in_thread(
@@ -115,20 +208,13 @@ def _save_files_in_thread(
             )
             data = {"knowledge_base_name": knowledge_base_name, "file_name": filename}
 
-            file_content = file.file.read()  # 读取上传文件的内容
-            if (
-                    os.path.isfile(file_path)
-                    and not override
-                    and os.path.getsize(file_path) == len(file_content)
-            ):
+            # 按块写入临时文件并计算哈希，不把整个文件读入内存
+            tmp_path, sha256, size = save_to_temp_file(file.file, file_path)
+            data["file_hash"] = sha256
+            if not place_uploaded_file(tmp_path, sha256, size, file_path, override):
                 file_status = f"文件 {filename} 已存在。"
                 logger.warn(file_status)
                 return dict(code=404, msg=file_status, data=data)
-
-            if not os.path.isdir(os.path.dirname(file_path)):
-                os.makedirs(os.path.dirname(file_path))
-            with open(file_path, "wb") as f:
-                f.write(file_content)
             return dict(code=200, msg=f"成功上传文件 {filename}", data=data)
         except Exception as e:
             msg = f"{filename} 文件上传失败，报错信息为: {e}"
@@ -215,6 +301,132 @@ def upload_docs(
     )
 
 
+def _upload_part_path(upload_id: str) -> str:
+    return os.path.join(Settings.basic_settings.BASE_TEMP_DIR, "uploads", f"{upload_id}.part")
+
+
+def _remove_expired_uploads():
+    upload_dir = os.path.join(Settings.basic_settings.BASE_TEMP_DIR, "uploads")
+    if not os.path.isdir(upload_dir):
+        return
+    now = time.time()
+    for entry in os.scandir(upload_dir):
+        if entry.name.endswith((".part", ".part.lock")) and now - entry.stat().st_mtime > UPLOAD_PART_EXPIRE:
+            os.remove(entry.path)
+            logger.info(f"已删除过期的分块上传文件 {entry.path}")
+
+
+def upload_chunk(
+        chunk: UploadFile = File(..., description="文件分块"),
+        upload_id: str = Form("", description="上传ID，为空时开始新的上传"),
+        offset: int = Form(0, description="分块在文件中的起始位置", ge=0),
+) -> BaseResponse:
+    """
+    分块上传大文件，分块按顺序追加到服务器的临时文件中。
+    offset 与服务器已接收的大小不一致时返回 409 及已接收的大小，客户端从该位置继续上传。
+    全部分块上传后调用 complete_upload 将文件保存到知识库。
+    """
+    if not upload_id:
+        _remove_expired_uploads()
+        upload_id = uuid.uuid4().hex
+        os.makedirs(os.path.dirname(_upload_part_path(upload_id)), exist_ok=True)
+        open(_upload_part_path(upload_id), "wb").close()
+    elif not re.fullmatch(r"[0-9a-f]{32}", upload_id):
+        return BaseResponse(code=403, msg="Don't attack me")
+
+    part_path = _upload_part_path(upload_id)
+    # 同一上传的分块可能被并发重发到不同的 worker，检查位置和写入须在同一把锁内完成
+    with vs_file_lock(part_path):
+        if not os.path.isfile(part_path):
+            return BaseResponse(code=404, msg=f"未找到上传 {upload_id}，请重新上传")
+        size = os.path.getsize(part_path)
+        data = {"upload_id": upload_id, "size": size}
+        if offset != size:
+            return BaseResponse(code=409, msg=f"分块位置 {offset} 与已接收的大小 {size} 不一致", data=data)
+
+        with open(part_path, "r+b") as f:
+            f.seek(offset)
+            shutil.copyfileobj(chunk.file, f, UPLOAD_CHUNK_SIZE)
+            f.truncate()
+            data["size"] = f.tell()
+    return BaseResponse(data=data)
+
+
+def upload_status(
+        upload_id: str = Query(..., description="上传ID"),
+) -> BaseResponse:
+    """
+    查询分块上传已接收的大小，用于断点续传
+    """
+    if not re.fullmatch(r"[0-9a-f]{32}", upload_id):
+        return BaseResponse(code=403, msg="Don't attack me")
+    part_path = _upload_part_path(upload_id)
+    if not os.path.isfile(part_path):
+        return BaseResponse(code=404, msg=f"未找到上传 {upload_id}，请重新上传")
+    return BaseResponse(data={"upload_id": upload_id, "size": os.path.getsize(part_path)})
+
+
+def complete_upload(
+        upload_id: str = Body(..., description="上传ID"),
+        knowledge_base_name: str = Body(..., description="知识库名称", examples=["samples"]),
+        file_name: str = Body(..., description="文件名称"),
+        sha256: str = Body("", description="文件的 sha256，不为空时校验上传的内容"),
+        override: bool = Body(False, description="覆盖已有文件"),
+        to_vector_store: bool = Body(True, description="上传文件后是否进行向量化"),
+        chunk_size: int = Body(Settings.kb_settings.CHUNK_SIZE, description="知识库中单段文本最大长度"),
+        chunk_overlap: int = Body(Settings.kb_settings.OVERLAP_SIZE, description="知识库中相邻文本重合长度"),
+        zh_title_enhance: bool = Body(Settings.kb_settings.ZH_TITLE_ENHANCE, description="是否开启中文标题加强"),
+        not_refresh_vs_cache: bool = Body(False, description="暂不保存向量库（用于FAISS）"),
+) -> BaseResponse:
+    """
+    完成分块上传：校验文件，保存到知识库，并/或向量化
+    """
+    if not validate_kb_name(knowledge_base_name) or not re.fullmatch(r"[0-9a-f]{32}", upload_id):
+        return BaseResponse(code=403, msg="Don't attack me")
+
+    kb = KBServiceFactory.get_service_by_name(knowledge_base_name)
+    if kb is None:
+        return BaseResponse(code=404, msg=f"未找到知识库 {knowledge_base_name}")
+
+    file_path = get_file_path(knowledge_base_name=knowledge_base_name, doc_name=file_name)
+    if file_path is None:
+        return BaseResponse(code=403, msg="Don't attack me")
+
+    part_path = _upload_part_path(upload_id)
+    with vs_file_lock(part_path):
+        if not os.path.isfile(part_path):
+            return BaseResponse(code=404, msg=f"未找到上传 {upload_id}，请重新上传")
+
+        digest = file_hash(part_path)
+        if sha256 and sha256.lower() != digest:
+            os.remove(part_path)
+            return BaseResponse(code=400, msg=f"文件 {file_name} 校验失败，请重新上传")
+
+        data = {"knowledge_base_name": knowledge_base_name, "file_name": file_name, "file_hash": digest}
+        placed = place_uploaded_file(part_path, digest, os.path.getsize(part_path), file_path, override)
+    if not placed:
+        return BaseResponse(code=404, msg=f"文件 {file_name} 已存在。", data=data)
+
+    failed_files = {}
+    if to_vector_store:
+        result = update_docs(
+            knowledge_base_name=knowledge_base_name,
+            file_names=[file_name],
+            override_custom_docs=True,
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            zh_title_enhance=zh_title_enhance,
+            docs="",
+            not_refresh_vs_cache=True,
+        )
+        failed_files.update(result.data["failed_files"])
+        if not not_refresh_vs_cache:
+            kb.save_vector_store()
+
+    data["failed_files"] = failed_files
+    return BaseResponse(code=200, msg="文件上传与向量化完成", data=data)
+
+
 def delete_docs(
         knowledge_base_name: str = Body(..., examples=["samples"]),
         file_names: List[str] = Body(..., examples=[["file_name.md", "test.txt"]]),
@@ -401,7 +613,7 @@ def recreate_vector_store(
         knowledge_base_name: str = Body(..., examples=["samples"]),
         allow_empty_kb: bool = Body(True),
         vs_type: str = Body(Settings.kb_settings.DEFAULT_VS_TYPE),
-        embed_model: str = Body(get_default_embedding()),
+        embed_model: str = Body(None, description="嵌入模型名称，为空时使用默认嵌入模型"),
         chunk_size: int = Body(Settings.kb_settings.CHUNK_SIZE, description="知识库中单段文本最大长度"),
         chunk_overlap: int = Body(Settings.kb_settings.OVERLAP_SIZE, description="知识库中相邻文本重合长度"),
         zh_title_enhance: bool = Body(Settings.kb_settings.ZH_TITLE_ENHANCE, description="是否开启中文标题加强"),
@@ -452,7 +664,12 @@ def recreate_vector_store(
                                 },
                                 ensure_ascii=False,
                             )
-                            kb.add_doc(kb_file, not_refresh_vs_cache=True)
+                            # 暂不保存时不会调用 save_vector_store，不推迟建立索引
+                            kb.add_doc(
+                                kb_file,
+                                not_refresh_vs_cache=True,
+                                bulk_load=not not_refresh_vs_cache,
+                            )
                         else:
                             kb_name, file_name, error = result
                             msg = f"添加文件‘{file_name}’到知识库‘{knowledge_base_name}’时出错：{error}。已跳过。"
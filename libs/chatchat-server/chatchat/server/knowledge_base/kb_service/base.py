@@ -1,8 +1,10 @@
+import bisect
 import operator
 import os
+import time
 from abc import ABC, abstractmethod
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple, Union
+from typing import Any, Dict, Generator, List, Optional, Tuple, Union
 
 from langchain.docstore.document import Document
 
@@ -23,8 +25,8 @@ from chatchat.server.db.repository.knowledge_file_repository import (
     delete_file_from_db,
     delete_files_from_db,
     file_exists_in_db,
-    get_file_detail,
-    list_docs_from_db,
+    list_docs_page_from_db,
+    list_file_details_from_db,
     list_files_from_db,
 )
 from chatchat.server.knowledge_base.model.kb_document_model import DocumentWithVSId
@@ -38,6 +40,7 @@ from chatchat.server.knowledge_base.utils import (
 from chatchat.server.utils import (
     check_embed_model as _check_embed_model,
     get_default_embedding,
+    invalidate_tools_cache,
 )
 
 
@@ -60,13 +63,13 @@ class KBService(ABC):
         self,
         knowledge_base_name: str,
         kb_info: str = None,
-        embed_model: str = get_default_embedding(),
+        embed_model: str = None,
     ):
         self.kb_name = knowledge_base_name
         self.kb_info = kb_info or Settings.kb_settings.KB_INFO.get(
             knowledge_base_name, f"关于{knowledge_base_name}的知识库"
         )
-        self.embed_model = embed_model
+        self.embed_model = embed_model or get_default_embedding()
         self.kb_path = get_kb_path(self.kb_name)
         self.doc_path = get_doc_path(self.kb_name)
         self.do_init()
@@ -96,6 +99,7 @@ class KBService(ABC):
 
         if status:
             self.do_create_kb()
+        invalidate_tools_cache()
         return status
 
     def clear_vs(self):
@@ -112,6 +116,7 @@ class KBService(ABC):
         """
         self.do_drop_kb()
         status = delete_kb_from_db(self.kb_name)
+        invalidate_tools_cache()
         return status
 
     def add_doc(self, kb_file: KnowledgeFile, docs: List[Document] = [], **kwargs):
@@ -146,7 +151,8 @@ class KBService(ABC):
             status = add_file_to_db(
                 kb_file,
                 custom_docs=custom_docs,
-                docs_count=len(docs),
+                # 部分文档写入向量库失败时（如 ES bulk），只记录写入成功的文档
+                docs_count=len(docs) if doc_infos is None else len(doc_infos),
                 doc_infos=doc_infos,
             )
         else:
@@ -173,6 +179,7 @@ class KBService(ABC):
         status = add_kb_to_db(
             self.kb_name, self.kb_info, self.vs_type(), self.embed_model
         )
+        invalidate_tools_cache()
         return status
 
     def update_doc(self, kb_file: KnowledgeFile, docs: List[Document] = [], **kwargs):
@@ -203,11 +210,16 @@ class KBService(ABC):
         query: str,
         top_k: int = Settings.kb_settings.VECTOR_SEARCH_TOP_K,
         score_threshold: float = Settings.kb_settings.SCORE_THRESHOLD,
+        metadata: Dict = None,
     ) -> List[Document]:
+        """
+        向量检索。metadata 不为空时只在 metadata 匹配（仅支持一级键，按字符串比较）的文档中检索，
+        过滤条件由各向量库在检索时完成，而不是多取结果后再过滤。
+        """
         if not self.check_embed_model()[0]:
             return []
 
-        docs = self.do_search(query, top_k, score_threshold)
+        docs = self.do_search(query, top_k, score_threshold, metadata=metadata or None)
         return docs
 
     def get_doc_by_ids(self, ids: List[str]) -> List[Document]:
@@ -241,8 +253,25 @@ class KBService(ABC):
         """
         通过file_name或metadata检索Document
         """
-        doc_infos = list_docs_from_db(
-            kb_name=self.kb_name, file_name=file_name, metadata=metadata
+        docs, _ = self.list_docs_page(file_name=file_name, metadata=metadata)
+        return docs
+
+    def list_docs_page(
+        self,
+        file_name: str = None,
+        metadata: Dict = {},
+        cursor: int = None,
+        limit: int = None,
+    ) -> Tuple[List[DocumentWithVSId], Optional[int]]:
+        """
+        分页检索Document，返回 (docs, 下一页的 cursor)
+        """
+        doc_infos, next_cursor = list_docs_page_from_db(
+            kb_name=self.kb_name,
+            file_name=file_name,
+            metadata=metadata,
+            cursor=cursor,
+            limit=limit,
         )
         docs = []
         for x in doc_infos:
@@ -255,7 +284,7 @@ class KBService(ABC):
                 # 处理空的情况
                 # 可以选择跳过当前循环迭代或执行其他操作
                 pass
-        return docs
+        return docs, next_cursor
 
     def get_relative_source_path(self, filepath: str):
         """
@@ -313,9 +342,10 @@ class KBService(ABC):
         query: str,
         top_k: int,
         score_threshold: float,
+        metadata: Dict = None,
     ) -> List[Tuple[Document, float]]:
         """
-        搜索知识库子类实自己逻辑
+        搜索知识库子类实自己逻辑，metadata 为 None 时不过滤
         """
         pass
 
@@ -350,9 +380,10 @@ class KBServiceFactory:
     def get_service(
         kb_name: str,
         vector_store_type: Union[str, SupportedVSType],
-        embed_model: str = get_default_embedding(),
+        embed_model: str = None,
         kb_info: str = None,
     ) -> KBService:
+        embed_model = embed_model or get_default_embedding()
         if isinstance(vector_store_type, str):
             vector_store_type = getattr(SupportedVSType, vector_store_type.upper())
         params = {
@@ -467,44 +498,160 @@ def get_kb_details() -> List[Dict]:
 
 
 def get_kb_file_details(kb_name: str) -> List[Dict]:
-    kb = KBServiceFactory.get_service_by_name(kb_name)
-    if kb is None:
-        return []
+    data, _ = get_kb_file_details_page(kb_name)
+    return data
 
-    files_in_folder = list_files_from_folder(kb_name)
-    files_in_db = kb.list_files()
-    result = {}
 
-    for doc in files_in_folder:
-        result[doc] = {
-            "kb_name": kb_name,
-            "file_name": doc,
-            "file_ext": os.path.splitext(doc)[-1],
-            "file_version": 0,
-            "document_loader": "",
-            "docs_count": 0,
-            "text_splitter": "",
-            "create_time": None,
-            "in_folder": True,
-            "in_db": False,
-        }
-    lower_names = {x.lower(): x for x in result}
-    for doc in files_in_db:
-        doc_detail = get_file_detail(kb_name, doc)
-        if doc_detail:
-            doc_detail["in_db"] = True
-            if doc.lower() in lower_names:
-                result[lower_names[doc.lower()]].update(doc_detail)
-            else:
-                doc_detail["in_folder"] = False
-                result[doc] = doc_detail
+# 分页列出文件时缓存知识库目录的排序结果：{知识库名称: (缓存时间, 小写文件名列表, 文件名列表)}。
+# 第一页重新遍历目录，之后的页在有效期内复用，避免每页都遍历整个目录
+FOLDER_LISTING_TTL = 60
+_folder_listing_cache: Dict[str, Tuple[float, List[str], List[str]]] = {}
+
+
+def _sorted_folder_files(kb_name: str, refresh: bool) -> Tuple[List[str], List[str]]:
+    cached = _folder_listing_cache.get(kb_name)
+    if refresh or cached is None or time.time() - cached[0] > FOLDER_LISTING_TTL:
+        files = sorted({x.lower(): x for x in list_files_from_folder(kb_name)}.items())
+        cached = (time.time(), [k for k, _ in files], [v for _, v in files])
+        _folder_listing_cache[kb_name] = cached
+    return cached[1], cached[2]
+
+
+def _parse_file_cursor(cursor: Optional[str]) -> Tuple[int, Optional[str]]:
+    """
+    cursor 格式为 "已返回数量:上一页最后一个文件的小写文件名"，返回 (已返回数量, 小写文件名)
+    """
+    if cursor is None:
+        return 0, None
+    offset, sep, key = cursor.partition(":")
+    if sep and offset.isdigit():
+        return int(offset), key
+    return 0, cursor
+
+
+def get_kb_file_details_page(
+    kb_name: str,
+    cursor: str = None,
+    limit: int = None,
+) -> Tuple[List[Dict], Optional[str]]:
+    """
+    合并知识库目录与数据库中的文件信息，按小写文件名排序分页，返回 (文件信息列表, 下一页的 cursor)。
+    数据库按 cursor 分页查询，知识库目录的排序结果在翻页期间缓存，每页只取 cursor 之后的 limit + 1 个文件
+    """
+    kb = KBServiceFactory.get_service_by_name(kb_name)
+    if kb is None:
+        return [], None
+
+    offset, key_cursor = _parse_file_cursor(cursor)
+    folder_keys, folder_names = _sorted_folder_files(kb_name, refresh=cursor is None)
+    start = 0 if key_cursor is None else bisect.bisect_right(folder_keys, key_cursor)
+    stop = len(folder_keys) if limit is None else start + limit + 1
+    files_in_folder = dict(zip(folder_keys[start:stop], folder_names[start:stop]))
+    # 数据库中多取一条，用于判断是否还有下一页
+    details_in_db = {
+        x["file_name"].lower(): x
+        for x in list_file_details_from_db(
+            kb_name, cursor=key_cursor, limit=None if limit is None else limit + 1
+        )
+    }
+    keys = sorted(set(files_in_folder) | set(details_in_db))
+    next_cursor = None
+    if limit is not None and len(keys) > limit:
+        keys = keys[:limit]
+        next_cursor = f"{offset + limit}:{keys[-1]}"
 
     data = []
-    for i, v in enumerate(result.values()):
-        v["No"] = i + 1
-        data.append(v)
-
-    return data
+    for i, key in enumerate(keys):
+        if key in details_in_db:
+            detail = details_in_db[key]
+            detail["in_db"] = True
+            detail["in_folder"] = key in files_in_folder
+        else:
+            detail = _folder_file_detail(kb_name, files_in_folder[key])
+        detail["No"] = offset + i + 1
+        data.append(detail)
+
+    return data, next_cursor
+
+
+def iter_kb_file_details(kb_name: str, page_size: int = 1000) -> Generator[Dict, None, None]:
+    """
+    按小写文件名顺序逐个返回知识库的文件信息，用于导出大量文件。
+    知识库目录只遍历一次，数据库按 cursor 分页读取，两者有序合并
+    """
+    files_in_folder = sorted({x.lower(): x for x in list_files_from_folder(kb_name)}.items())
+    i = 0
+    no = 0
+    cursor = None
+    while True:
+        page = list_file_details_from_db(kb_name, cursor=cursor, limit=page_size)
+        for detail in page:
+            key = detail["file_name"].lower()
+            while i < len(files_in_folder) and files_in_folder[i][0] < key:
+                no += 1
+                yield {**_folder_file_detail(kb_name, files_in_folder[i][1]), "No": no}
+                i += 1
+            in_folder = i < len(files_in_folder) and files_in_folder[i][0] == key
+            if in_folder:
+                i += 1
+            no += 1
+            yield {**detail, "in_db": True, "in_folder": in_folder, "No": no}
+        if len(page) < page_size:
+            break
+        cursor = page[-1]["file_name"].lower()
+
+    for _, file_name in files_in_folder[i:]:
+        no += 1
+        yield {**_folder_file_detail(kb_name, file_name), "No": no}
+
+
+def _folder_file_detail(kb_name: str, file_name: str) -> Dict:
+    """
+    只存在于知识库目录、尚未入库的文件信息
+    """
+    return {
+        "kb_name": kb_name,
+        "file_name": file_name,
+        "file_ext": os.path.splitext(file_name)[-1],
+        "file_version": 0,
+        "document_loader": "",
+        "docs_count": 0,
+        "text_splitter": "",
+        "create_time": None,
+        "in_folder": True,
+        "in_db": False,
+    }
+
+
+def metadata_match(doc_metadata: Dict, metadata: Dict) -> bool:
+    """
+    判断文档 metadata 是否满足过滤条件，与 list_docs_from_db 一致，按字符串比较
+    """
+    return all(k in doc_metadata and str(doc_metadata[k]) == str(v) for k, v in metadata.items())
+
+
+def metadata_value_candidates(value: Any) -> List[Union[str, int, float, bool]]:
+    """
+    返回转为字符串后与 str(value) 相同的所有取值，供按原始类型比较的向量库（chroma、ES 等）
+    实现按字符串比较的 metadata 过滤。如 "4" -> ["4", 4]，"True" -> ["True", True]
+    """
+    s = str(value)
+    candidates = [s]
+    if s in ("True", "False"):
+        candidates.append(s == "True")
+        return candidates
+    try:
+        if str(int(s)) == s:
+            candidates.append(int(s))
+            return candidates
+    except ValueError:
+        pass
+    try:
+        if str(float(s)) == s:
+            candidates.append(float(s))
+    except ValueError:
+        pass
+    return candidates
 
 
 def score_threshold_process(score_threshold, k, docs):
@@ -1,4 +1,5 @@
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, Dict, List, Tuple
 
 import chromadb
@@ -8,7 +9,11 @@ from langchain_chroma import Chroma
 
 from chatchat.settings import Settings
 from chatchat.server.file_rag.utils import get_Retriever
-from chatchat.server.knowledge_base.kb_service.base import KBService, SupportedVSType
+from chatchat.server.knowledge_base.kb_service.base import (
+    KBService,
+    SupportedVSType,
+    metadata_value_candidates,
+)
 from chatchat.server.knowledge_base.utils import KnowledgeFile, get_kb_path, get_vs_path
 from chatchat.server.utils import get_Embeddings
 
@@ -89,36 +94,74 @@ class ChromaKBService(KBService):
                 raise e
 
     def do_search(
-        self, query: str, top_k: int, score_threshold: float = Settings.kb_settings.SCORE_THRESHOLD
+        self,
+        query: str,
+        top_k: int,
+        score_threshold: float = Settings.kb_settings.SCORE_THRESHOLD,
+        metadata: Dict = None,
     ) -> List[Tuple[Document, float]]:
+        search_kwargs = {}
+        if metadata:
+            # chroma 的 where 条件按原始类型比较，用 $in 匹配字符串形式相同的各类型取值；多个条件需要用 $and 组合
+            where = [{k: {"$in": metadata_value_candidates(v)}} for k, v in metadata.items()]
+            search_kwargs["filter"] = where[0] if len(where) == 1 else {"$and": where}
         retriever = get_Retriever("vectorstore").from_vectorstore(
             self.chroma,
             top_k=top_k,
             score_threshold=score_threshold,
+            search_kwargs=search_kwargs,
         )
         docs = retriever.get_relevant_documents(query)
         return docs
 
+    @property
+    def batch_size(self) -> int:
+        """
+        每批写入/删除的文档数，不超过 chromadb 允许的最大批量
+        """
+        batch_size = Settings.kb_settings.kbs_config.get("chromadb", {}).get("batch_size", 256)
+        if max_batch_size := getattr(self.client, "max_batch_size", None):
+            batch_size = min(batch_size, max_batch_size)
+        return batch_size
+
     def do_add_doc(self, docs: List[Document], **kwargs) -> List[Dict]:
-        doc_infos = []
         embed_func = get_Embeddings(self.embed_model)
-        texts = [doc.page_content for doc in docs]
-        metadatas = [doc.metadata for doc in docs]
-        embeddings = embed_func.embed_documents(texts=texts)
-        ids = [str(uuid.uuid1()) for _ in range(len(texts))]
-        for _id, text, embedding, metadata in zip(ids, texts, embeddings, metadatas):
-            self.chroma._collection.add(
-                ids=_id, embeddings=embedding, metadatas=metadata, documents=text
-            )
-            doc_infos.append({"id": _id, "metadata": metadata})
-        return doc_infos
+        collection = self.chroma._collection
+        batch_size = self.batch_size
+        ids = [str(uuid.uuid1()) for _ in range(len(docs))]
+
+        # 按批写入；写入上一批的同时计算下一批的向量
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            pending = None
+            for start in range(0, len(docs), batch_size):
+                batch = docs[start: start + batch_size]
+                texts = [doc.page_content for doc in batch]
+                embeddings = embed_func.embed_documents(texts=texts)
+                if pending is not None:
+                    pending.result()
+                pending = pool.submit(
+                    collection.upsert,
+                    ids=ids[start: start + batch_size],
+                    embeddings=embeddings,
+                    metadatas=[doc.metadata for doc in batch],
+                    documents=texts,
+                )
+            if pending is not None:
+                pending.result()
+        return [{"id": _id, "metadata": doc.metadata} for _id, doc in zip(ids, docs)]
 
     def get_doc_by_ids(self, ids: List[str]) -> List[Document]:
-        get_result: GetResult = self.chroma._collection.get(ids=ids)
-        return _get_result_to_documents(get_result)
+        docs = []
+        batch_size = self.batch_size
+        for start in range(0, len(ids), batch_size):
+            get_result: GetResult = self.chroma._collection.get(ids=ids[start: start + batch_size])
+            docs.extend(_get_result_to_documents(get_result))
+        return docs
 
     def del_doc_by_ids(self, ids: List[str]) -> bool:
-        self.chroma._collection.delete(ids=ids)
+        batch_size = self.batch_size
+        for start in range(0, len(ids), batch_size):
+            self.chroma._collection.delete(ids=ids[start: start + batch_size])
         return True
 
     def do_clear_vs(self):
@@ -126,4 +169,7 @@ class ChromaKBService(KBService):
         self.do_drop_kb()
 
     def do_delete_doc(self, kb_file: KnowledgeFile, **kwargs):
-        return self.chroma._collection.delete(where={"source": kb_file.filepath})
+        # 入库时 metadata["source"] 已转为相对路径，按条件一次删除该文件的全部文档
+        return self.chroma._collection.delete(
+            where={"source": self.get_relative_source_path(kb_file.filepath)}
+        )
@@ -1,9 +1,11 @@
 import logging
 import os
 import shutil
-from typing import List
+import uuid
+from typing import Dict, List, Set, Tuple, Union
 
 from elasticsearch import BadRequestError, Elasticsearch
+from elasticsearch.helpers import bulk
 from langchain.schema import Document
 from langchain_community.vectorstores.elasticsearch import (
     ApproxRetrievalStrategy,
@@ -12,7 +14,11 @@ from langchain_community.vectorstores.elasticsearch import (
 
 from chatchat.settings import Settings
 from chatchat.server.file_rag.utils import get_Retriever
-from chatchat.server.knowledge_base.kb_service.base import KBService, SupportedVSType
+from chatchat.server.knowledge_base.kb_service.base import (
+    KBService,
+    SupportedVSType,
+    metadata_value_candidates,
+)
 from chatchat.server.knowledge_base.utils import KnowledgeFile
 from chatchat.server.utils import get_Embeddings
 from chatchat.utils import build_logger
@@ -20,6 +26,56 @@ from chatchat.utils import build_logger
 
 logger = build_logger()
 
+# 这些类型的 metadata 字段没有 keyword 子字段，需要用数值/布尔值匹配原字段
+TYPED_FIELD_TYPES = {
+    "long", "integer", "short", "byte", "unsigned_long",
+    "double", "float", "half_float", "scaled_float", "boolean",
+}
+
+
+class HybridRetrievalStrategy(ApproxRetrievalStrategy):
+    """
+    在一次请求中同时进行 BM25 全文检索与 kNN 向量检索。
+    - rrf=False：kNN 与 match 查询的得分按 knn_boost/text_boost 线性相加，基础版 ES 即可使用
+    - rrf=True 或 dict：使用 ES 的 RRF 融合排序（需要 8.8+ 及相应许可）
+    """
+
+    def __init__(
+        self,
+        rrf: Union[dict, bool] = False,
+        knn_boost: float = 1.0,
+        text_boost: float = 1.0,
+    ):
+        super().__init__(hybrid=True, rrf=rrf)
+        self.knn_boost = knn_boost
+        self.text_boost = text_boost
+
+    def query(
+        self,
+        query_vector: Union[List[float], None],
+        query: Union[str, None],
+        k: int,
+        fetch_k: int,
+        vector_query_field: str,
+        text_field: str,
+        filter: List[dict],
+        similarity,
+    ) -> Dict:
+        body = super().query(
+            query_vector=query_vector,
+            query=query,
+            k=k,
+            fetch_k=fetch_k,
+            vector_query_field=vector_query_field,
+            text_field=text_field,
+            filter=filter,
+            similarity=similarity,
+        )
+        if "rank" not in body:
+            body["knn"]["boost"] = self.knn_boost
+            body["query"]["bool"]["must"][0]["match"][text_field]["boost"] = self.text_boost
+        return body
+
 
 class ESKBService(KBService):
     def do_init(self):
@@ -31,17 +87,32 @@ class ESKBService(KBService):
         self.user = kb_config.get("user", "")
         self.password = kb_config.get("password", "")
         self.dims_length = kb_config.get("dims_length", None)
+        # 批量写入/删除的每批文档数、刷新策略（每次操作只刷新一次）及 429 等可重试错误的重试次数
+        self.bulk_chunk_size = kb_config.get("bulk_chunk_size", 500)
+        self.refresh = kb_config.get("refresh", "wait_for")
+        self.max_retries = kb_config.get("max_retries", 3)
+        # 混合检索配置：enable 开启后 BM25 与 kNN 在同一请求中完成；analyzer 为正文字段的分词器（如 ik_max_word），仅对新建索引生效
+        self.hybrid = kb_config.get("hybrid", {})
+        self._metadata_types = None
         self.embeddings_model = get_Embeddings(self.embed_model)
+        client_kwargs = dict(
+            retry_on_status=(429, 502, 503, 504),
+            retry_on_timeout=True,
+            max_retries=self.max_retries,
+        )
         try:
             # ES python客户端连接（仅连接）
             if self.user != "" and self.password != "":
                 self.es_client_python = Elasticsearch(
                     f"http://{self.IP}:{self.PORT}",
                     basic_auth=(self.user, self.password),
+                    **client_kwargs,
                 )
             else:
                 logger.warning("ES未配置用户名和密码")
-                self.es_client_python = Elasticsearch(f"http://{self.IP}:{self.PORT}")
+                self.es_client_python = Elasticsearch(
+                    f"http://{self.IP}:{self.PORT}", **client_kwargs
+                )
         except ConnectionError:
             logger.error("连接到 Elasticsearch 失败！")
             raise ConnectionError
@@ -59,6 +130,12 @@ class ESKBService(KBService):
                     }
                 }
             }
+            if analyzer := self.hybrid.get("analyzer"):
+                mappings["properties"]["context"] = {
+                    "type": "text",
+                    "analyzer": analyzer,
+                    "search_analyzer": self.hybrid.get("search_analyzer") or analyzer,
+                }
             self.es_client_python.indices.create(
                 index=self.index_name, mappings=mappings
             )
@@ -74,7 +151,7 @@ class ESKBService(KBService):
                 query_field="context",
                 vector_query_field="dense_vector",
                 embedding=self.embeddings_model,
-                strategy=ApproxRetrievalStrategy(),
+                strategy=self._retrieval_strategy(),
                 es_params={
                     "timeout": 60,
                 },
@@ -98,6 +175,15 @@ class ESKBService(KBService):
             logger.error(e)
             # raise e
 
+    def _retrieval_strategy(self) -> ApproxRetrievalStrategy:
+        if self.hybrid.get("enable"):
+            return HybridRetrievalStrategy(
+                rrf=self.hybrid.get("rrf", False),
+                knn_boost=self.hybrid.get("knn_boost", 1.0),
+                text_boost=self.hybrid.get("text_boost", 1.0),
+            )
+        return ApproxRetrievalStrategy()
+
     @staticmethod
     def get_kb_path(knowledge_base_name: str):
         return os.path.join(Settings.basic_settings.KB_ROOT_PATH, knowledge_base_name)
@@ -114,100 +200,183 @@ class ESKBService(KBService):
     def vs_type(self) -> str:
         return SupportedVSType.ES
 
-    def do_search(self, query: str, top_k: int, score_threshold: float):
-        # 文本相似性检索
+    def _metadata_field_types(self) -> Dict[str, str]:
+        """
+        读取索引中 metadata 各字段的映射类型，结果缓存在实例上，写入文档后重新读取。
+        嵌套字段的键为以 . 连接的路径
+        """
+        if self._metadata_types is None:
+            types = {}
+            try:
+                mapping = self.es_client_python.indices.get_mapping(index=self.index_name)
+                properties = (
+                    mapping[self.index_name]["mappings"]
+                    .get("properties", {})
+                    .get("metadata", {})
+                    .get("properties", {})
+                )
+            except Exception as e:
+                logger.warning(f"{self.index_name}: 读取 metadata 字段映射失败：{e}")
+                return types
+
+            def walk(props: Dict, prefix: str):
+                for name, field in props.items():
+                    if "properties" in field:
+                        walk(field["properties"], f"{prefix}{name}.")
+                    else:
+                        types[prefix + name] = field.get("type", "")
+
+            walk(properties, "")
+            self._metadata_types = types
+        return self._metadata_types
+
+    @staticmethod
+    def metadata_to_filter(metadata: Dict, field_types: Dict[str, str] = None) -> List[Dict]:
+        """
+        将 metadata 过滤条件转换为 ES bool filter 子句，与其它向量库一致按字符串比较。
+        字符串在动态映射下会生成 keyword 子字段，使用 term 精确匹配；
+        field_types 中映射为数值、布尔类型的字段没有 keyword 子字段，用字符串形式相同的数值/布尔值匹配原字段。
+        text 字段经过分词，不能直接匹配原字段，否则会匹配到包含该词的所有文档
+        """
+        field_types = field_types or {}
+        clauses = []
+        for k, v in metadata.items():
+            candidates = metadata_value_candidates(v)
+            should = [{"term": {f"metadata.{k}.keyword": candidates[0]}}]
+            if field_types.get(k) in TYPED_FIELD_TYPES and (typed := candidates[1:]):
+                should.append({"terms": {f"metadata.{k}": typed}})
+            clauses.append({"bool": {"should": should, "minimum_should_match": 1}})
+        return clauses
+
+    def do_search(self, query: str, top_k: int, score_threshold: float, metadata: Dict = None):
+        # 文本相似性检索，metadata 过滤条件作为 knn 的 filter 在检索时生效
+        search_kwargs = {}
+        if metadata:
+            search_kwargs["filter"] = self.metadata_to_filter(metadata, self._metadata_field_types())
+        if self.hybrid.get("enable"):
+            # 混合检索的得分是 BM25 与向量得分之和（或 RRF 排名分），不在 0-1 之间，不使用 score_threshold
+            docs = self.db.similarity_search_with_score(query, k=top_k, **search_kwargs)
+            return [doc for doc, _ in docs]
         retriever = get_Retriever("vectorstore").from_vectorstore(
             self.db,
             top_k=top_k,
             score_threshold=score_threshold,
+            search_kwargs=search_kwargs,
         )
         docs = retriever.get_relevant_documents(query)
         return docs
 
+    def _bulk(self, actions: List[Dict]) -> Tuple[int, Set[str]]:
+        """
+        分批执行 bulk 请求，单个文档返回 429 时由 helpers.bulk 退避重试。
+        只有最后一批请求带上 refresh 参数，每次操作只刷新一次，而不是每个文档刷新一次。
+        返回 (成功数量, 失败的文档 id)
+        """
+        success = 0
+        failed = set()
+        for i in range(0, len(actions), self.bulk_chunk_size):
+            last = i + self.bulk_chunk_size >= len(actions)
+            n, errors = bulk(
+                self.es_client_python,
+                actions[i: i + self.bulk_chunk_size],
+                chunk_size=self.bulk_chunk_size,
+                max_retries=self.max_retries,
+                refresh=self.refresh if last else False,
+                raise_on_error=False,
+            )
+            success += n
+            for error in errors:
+                if error.get("delete", {}).get("status") == 404:  # 要删除的文档不存在
+                    continue
+                logger.error(f"ES bulk error: {error}")
+                for item in error.values():
+                    if isinstance(item, dict) and "_id" in item:
+                        failed.add(item["_id"])
+        return success, failed
+
     def get_doc_by_ids(self, ids: List[str]) -> List[Document]:
         results = []
-        for doc_id in ids:
-            try:
-                response = self.es_client_python.get(index=self.index_name, id=doc_id)
-                source = response["_source"]
+        if not ids:
+            return results
+        try:
+            response = self.es_client_python.mget(index=self.index_name, ids=ids)
+            for doc in response["docs"]:
+                if not doc.get("found"):
+                    continue
+                source = doc["_source"]
                 # Assuming your document has "text" and "metadata" fields
                 text = source.get("context", "")
                 metadata = source.get("metadata", {})
                 results.append(Document(page_content=text, metadata=metadata))
-            except Exception as e:
-                logger.error(f"Error retrieving document from Elasticsearch! {e}")
+        except Exception as e:
+            logger.error(f"Error retrieving document from Elasticsearch! {e}")
         return results
 
     def del_doc_by_ids(self, ids: List[str]) -> bool:
-        for doc_id in ids:
+        actions = [
+            {"_op_type": "delete", "_index": self.index_name, "_id": doc_id}
+            for doc_id in ids
+        ]
+        try:
+            self._bulk(actions)
+        except Exception as e:
+            logger.error(f"ES Docs Delete Error! {e}")
+            return False
+        return True
+
+    def do_delete_doc(self, kb_file, **kwargs):
+        if self.es_client_python.indices.exists(index=self.index_name):
+            # 从向量数据库中删除索引(文档名称是Keyword)，由 ES 在服务端按条件删除，不再逐条查询删除
             try:
-                self.es_client_python.delete(
-                    index=self.index_name, id=doc_id, refresh=True
+                self.es_client_python.delete_by_query(
+                    index=self.index_name,
+                    query={
+                        "term": {
+                            "metadata.source.keyword": self.get_relative_source_path(
+                                kb_file.filepath
+                            )
+                        }
+                    },
+                    conflicts="proceed",
+                    # delete_by_query 不支持 wait_for，按需在删除完成后刷新一次
+                    refresh=bool(self.refresh),
                 )
             except Exception as e:
                 logger.error(f"ES Docs Delete Error! {e}")
 
-    def do_delete_doc(self, kb_file, **kwargs):
-        if self.es_client_python.indices.exists(index=self.index_name):
-            # 从向量数据库中删除索引(文档名称是Keyword)
-            query = {
-                "query": {
-                    "term": {
-                        "metadata.source.keyword": self.get_relative_source_path(
-                            kb_file.filepath
-                        )
-                    }
-                },
-                "track_total_hits": True,
-            }
-            # 注意设置size，默认返回10个，es检索设置track_total_hits为True返回数据库中真实的size。
-            size = self.es_client_python.search(body=query)["hits"]["total"]["value"]
-            search_results = self.es_client_python.search(body=query, size=size)
-            delete_list = [hit["_id"] for hit in search_results["hits"]["hits"]]
-            if len(delete_list) == 0:
-                return None
-            else:
-                for doc_id in delete_list:
-                    try:
-                        self.es_client_python.delete(
-                            index=self.index_name, id=doc_id, refresh=True
-                        )
-                    except Exception as e:
-                        logger.error(f"ES Docs Delete Error! {e}")
-
-            # self.db.delete(ids=delete_list)
-            # self.es_client_python.indices.refresh(index=self.index_name)
-
     def do_add_doc(self, docs: List[Document], **kwargs):
         """向知识库添加文件"""
-
-        print(
-            f"server.knowledge_base.kb_service.es_kb_service.do_add_doc 输入的docs参数长度为:{len(docs)}"
-        )
-        print("*" * 100)
-
-        self.db.add_documents(documents=docs)
-        # 获取 id 和 source , 格式：[{"id": str, "metadata": dict}, ...]
-        print("写入数据成功.")
-        print("*" * 100)
-
-        if self.es_client_python.indices.exists(index=self.index_name):
-            file_path = docs[0].metadata.get("source")
-            query = {
-                "query": {
-                    "term": {"metadata.source.keyword": file_path},
-                    "term": {"_index": self.index_name},
-                }
+        if not docs:
+            return []
+        texts = [doc.page_content for doc in docs]
+        embeddings = self.embeddings_model.embed_documents(texts)
+        ids = [str(uuid.uuid4()) for _ in docs]
+        # 与 ElasticsearchStore 写入的文档结构保持一致
+        actions = [
+            {
+                "_op_type": "index",
+                "_index": self.index_name,
+                "_id": _id,
+                self.db.query_field: doc.page_content,
+                self.db.vector_query_field: embedding,
+                "metadata": doc.metadata,
             }
-            # 注意设置size，默认返回10个。
-            search_results = self.es_client_python.search(body=query, size=50)
-            if len(search_results["hits"]["hits"]) == 0:
-                raise ValueError("召回元素个数为0")
-            info_docs = [
-                {"id": hit["_id"], "metadata": hit["_source"]["metadata"]}
-                for hit in search_results["hits"]["hits"]
-            ]
-            return info_docs
+            for _id, doc, embedding in zip(ids, docs, embeddings)
+        ]
+        success, failed = self._bulk(actions)
+        # 新写入的 metadata 可能产生新的字段映射
+        self._metadata_types = None
+        logger.info(f"{self.index_name}: 写入 {success}/{len(docs)} 个文档")
+        if success + len(failed) < len(docs):
+            raise RuntimeError(f"{self.index_name}: {len(docs) - success} 个文档写入失败")
+        if failed:
+            logger.error(f"{self.index_name}: {len(failed)} 个文档写入失败，不记录到数据库")
+        # 只返回写入成功的文档，格式：[{"id": str, "metadata": dict}, ...]
+        return [
+            {"id": _id, "metadata": doc.metadata}
+            for _id, doc in zip(ids, docs)
+            if _id not in failed
+        ]
 
     def do_clear_vs(self):
         """从知识库删除全部向量"""
@@ -9,9 +9,50 @@ from chatchat.server.file_rag.utils import get_Retriever
 from chatchat.server.knowledge_base.kb_cache.faiss_cache import (
     ThreadSafeFaiss,
     kb_faiss_pool,
+    vs_file_lock,
 )
+from chatchat.server.knowledge_base.kb_cache.search_worker import get_search_client
 from chatchat.server.knowledge_base.kb_service.base import KBService, SupportedVSType
 from chatchat.server.knowledge_base.utils import KnowledgeFile, get_kb_path, get_vs_path
+from chatchat.utils import build_logger
+
+
+logger = build_logger()
+
+
+def search_vector_store(
+    kb_name: str,
+    vector_name: str,
+    embed_model: str,
+    query: str,
+    top_k: int,
+    score_threshold: float,
+    metadata: Dict = None,
+) -> List[Document]:
+    """
+    在本进程中检索 FAISS 向量库，检索进程也调用此函数
+    """
+    faiss_vs = kb_faiss_pool.load_vector_store(
+        kb_name=kb_name,
+        vector_name=vector_name,
+        embed_model=embed_model,
+    )
+    with faiss_vs.acquire() as vs:
+        search_kwargs = {}
+        if metadata:
+            # 先按 metadata 倒排索引选出候选位置，再只在这些向量中检索
+            positions = faiss_vs.metadata_positions(metadata)
+            if not positions:
+                return []
+            search_kwargs["positions"] = positions
+        retriever = get_Retriever("ensemble").from_vectorstore(
+            vs,
+            top_k=top_k,
+            score_threshold=score_threshold,
+            search_kwargs=search_kwargs,
+        )
+        docs = retriever.get_relevant_documents(query)
+    return docs
 
 
 class FaissKBService(KBService):
@@ -28,23 +69,30 @@ class FaissKBService(KBService):
     def get_kb_path(self):
         return get_kb_path(self.kb_name)
 
-    def load_vector_store(self) -> ThreadSafeFaiss:
+    def load_vector_store(self, writable: bool = False) -> ThreadSafeFaiss:
+        """
+        writable=True 时需在 vs_file_lock 内调用
+        """
         return kb_faiss_pool.load_vector_store(
             kb_name=self.kb_name,
             vector_name=self.vector_name,
             embed_model=self.embed_model,
+            writable=writable,
         )
 
     def save_vector_store(self):
-        self.load_vector_store().save(self.vs_path)
+        with vs_file_lock(self.vs_path):
+            self.load_vector_store(writable=True).save(self.vs_path)
 
     def get_doc_by_ids(self, ids: List[str]) -> List[Document]:
         with self.load_vector_store().acquire() as vs:
             return [vs.docstore._dict.get(id) for id in ids]
 
     def del_doc_by_ids(self, ids: List[str]) -> bool:
-        with self.load_vector_store().acquire() as vs:
-            vs.delete(ids)
+        with vs_file_lock(self.vs_path):
+            faiss_vs = self.load_vector_store(writable=True)
+            with faiss_vs.acquire():
+                faiss_vs.delete(ids)
 
     def do_init(self):
         self.vector_name = self.vector_name or self.embed_model.replace(":", "_")
@@ -68,15 +116,23 @@ class FaissKBService(KBService):
         query: str,
         top_k: int,
         score_threshold: float = Settings.kb_settings.SCORE_THRESHOLD,
+        metadata: Dict = None,
     ) -> List[Tuple[Document, float]]:
-        with self.load_vector_store().acquire() as vs:
-            retriever = get_Retriever("ensemble").from_vectorstore(
-                vs,
-                top_k=top_k,
-                score_threshold=score_threshold,
-            )
-            docs = retriever.get_relevant_documents(query)
-        return docs
+        kwargs = dict(
+            kb_name=self.kb_name,
+            vector_name=self.vector_name,
+            embed_model=self.embed_model,
+            query=query,
+            top_k=top_k,
+            score_threshold=score_threshold,
+            metadata=metadata,
+        )
+        if client := get_search_client():
+            try:
+                return client.search(**kwargs)
+            except (EOFError, OSError) as e:
+                logger.warning(f"检索进程不可用，在本进程中检索知识库 {self.kb_name}：{e}")
+        return search_vector_store(**kwargs)
 
     def do_add_doc(
         self,
@@ -85,37 +141,43 @@ class FaissKBService(KBService):
     ) -> List[Dict]:
         texts = [x.page_content for x in docs]
         metadatas = [x.metadata for x in docs]
+        # 向量化不需要持有文件锁
         with self.load_vector_store().acquire() as vs:
             embeddings = vs.embeddings.embed_documents(texts)
-            ids = vs.add_embeddings(
-                text_embeddings=zip(texts, embeddings), metadatas=metadatas
-            )
-            if not kwargs.get("not_refresh_vs_cache"):
-                vs.save_local(self.vs_path)
+        # 暂不保存时修改记录在缓存中，其它进程先保存了该向量库时，重新加载后会合并这些修改
+        with vs_file_lock(self.vs_path):
+            faiss_vs = self.load_vector_store(writable=True)
+            with faiss_vs.acquire():
+                ids = faiss_vs.add_embeddings(texts, embeddings, metadatas)
+                if not kwargs.get("not_refresh_vs_cache"):
+                    faiss_vs.save(self.vs_path)
         doc_infos = [{"id": id, "metadata": doc.metadata} for id, doc in zip(ids, docs)]
         return doc_infos
 
     def do_delete_doc(self, kb_file: KnowledgeFile, **kwargs):
-        with self.load_vector_store().acquire() as vs:
-            ids = [
-                k
-                for k, v in vs.docstore._dict.items()
-                if v.metadata.get("source").lower() == kb_file.filename.lower()
-            ]
-            if len(ids) > 0:
-                vs.delete(ids)
-            if not kwargs.get("not_refresh_vs_cache"):
-                vs.save_local(self.vs_path)
+        with vs_file_lock(self.vs_path):
+            faiss_vs = self.load_vector_store(writable=True)
+            with faiss_vs.acquire() as vs:
+                ids = [
+                    k
+                    for k, v in vs.docstore._dict.items()
+                    if v.metadata.get("source").lower() == kb_file.filename.lower()
+                ]
+                if len(ids) > 0:
+                    faiss_vs.delete(ids)
+                if not kwargs.get("not_refresh_vs_cache"):
+                    faiss_vs.save(self.vs_path)
         return ids
 
     def do_clear_vs(self):
-        with kb_faiss_pool.atomic:
-            kb_faiss_pool.pop((self.kb_name, self.vector_name))
-        try:
-            shutil.rmtree(self.vs_path)
-        except Exception:
-            ...
-        os.makedirs(self.vs_path, exist_ok=True)
+        with vs_file_lock(self.vs_path):
+            with kb_faiss_pool.atomic:
+                kb_faiss_pool.pop((self.kb_name, self.vector_name))
+            try:
+                shutil.rmtree(self.vs_path)
+            except Exception:
+                ...
+            os.makedirs(self.vs_path, exist_ok=True)
 
     def exist_doc(self, file_name: str):
         if super().exist_doc(file_name):
@@ -1,3 +1,4 @@
+import json
 import os
 from typing import Dict, List, Optional
 
@@ -14,10 +15,26 @@ from chatchat.server.knowledge_base.kb_service.base import (
     score_threshold_process,
 )
 from chatchat.server.knowledge_base.utils import KnowledgeFile
+from chatchat.utils import build_logger
+
+
+logger = build_logger()
+
+
+def metadata_to_expr(metadata: Dict, fields: List[str]) -> Optional[str]:
+    """
+    将 metadata 过滤条件转换为 milvus 布尔表达式。入库时 metadata 均已转为字符串，这里同样按字符串比较。
+    过滤键不是集合字段时返回 None，表示没有文档能够匹配。
+    """
+    if any(k not in fields for k in metadata):
+        return None
+    return " and ".join(f"{k} == {json.dumps(str(v), ensure_ascii=False)}" for k, v in metadata.items())
 
 
 class MilvusKBService(KBService):
     milvus: Milvus
+    # 已建立 metadata 标量索引的集合
+    _indexed_collections = set()
 
     @staticmethod
     def get_collection(milvus_name):
@@ -57,38 +74,96 @@ class MilvusKBService(KBService):
     def vs_type(self) -> str:
         return SupportedVSType.MILVUS
 
+    @property
+    def milvus_kwargs(self) -> Dict:
+        return Settings.kb_settings.kbs_config.get("milvus_kwargs", {})
+
     def _load_milvus(self):
         self.milvus = Milvus(
             embedding_function=get_Embeddings(self.embed_model),
             collection_name=self.kb_name,
             connection_args=Settings.kb_settings.kbs_config.get("milvus"),
-            index_params=Settings.kb_settings.kbs_config.get("milvus_kwargs")["index_params"],
-            search_params=Settings.kb_settings.kbs_config.get("milvus_kwargs")["search_params"],
+            index_params=self.milvus_kwargs["index_params"],
+            search_params=self.milvus_kwargs["search_params"],
+            partition_key_field=self.milvus_kwargs.get("partition_key_field") or None,
             auto_id=True,
             )
 
+    def _partition_key(self) -> Optional[str]:
+        """
+        返回集合的 partition key 字段。只有按 partition_key_field 配置新建的集合才有，旧集合返回 None
+        """
+        if self.milvus.col is None:
+            return None
+        for field in self.milvus.col.schema.fields:
+            if getattr(field, "is_partition_key", False):
+                return field.name
+        return None
+
+    def _create_metadata_index(self):
+        """
+        为 METADATA_INDEX_KEYS 中的字段建立标量索引，加速带 metadata 过滤的检索。每个集合只检查一次
+        """
+        col = self.milvus.col
+        if col is None or self.kb_name in MilvusKBService._indexed_collections:
+            return
+        try:
+            for key in Settings.kb_settings.METADATA_INDEX_KEYS:
+                index_name = f"idx_{key}"
+                if key in self.milvus.fields and not col.has_index(index_name=index_name):
+                    col.create_index(field_name=key, index_name=index_name)
+            MilvusKBService._indexed_collections.add(self.kb_name)
+        except Exception as e:
+            logger.warning(f"failed to create metadata index for milvus collection {self.kb_name}: {e}")
+
     def do_init(self):
         self._load_milvus()
+        self._create_metadata_index()
 
     def do_drop_kb(self):
         if self.milvus.col:
             self.milvus.col.release()
             self.milvus.col.drop()
+        MilvusKBService._indexed_collections.discard(self.kb_name)
 
-    def do_search(self, query: str, top_k: int, score_threshold: float):
+    def do_search(self, query: str, top_k: int, score_threshold: float, metadata: Dict = None):
         self._load_milvus()
         # embed_func = get_Embeddings(self.embed_model)
         # embeddings = embed_func.embed_query(query)
         # docs = self.milvus.similarity_search_with_score_by_vector(embeddings, top_k)
+        search_kwargs = {}
+        if metadata:
+            if (expr := metadata_to_expr(metadata, self.milvus.fields)) is None:
+                return []
+            search_kwargs["expr"] = expr
         retriever = get_Retriever("milvusvectorstore").from_vectorstore(
             self.milvus,
             top_k=top_k,
             score_threshold=score_threshold,
+            search_kwargs=search_kwargs,
         )
         docs = retriever.get_relevant_documents(query)
         return docs
 
+    def save_vector_store(self):
+        """
+        批量重建向量库结束后调用：flush 一次，向量索引在批量写入期间被推迟时一次性建立并加载集合。
+        根据集合本身的索引判断，调用方不必是写入数据的同一个 KBService 实例
+        """
+        col = self.milvus.col
+        if col is None:
+            return
+        col.flush()
+        if not any(index.field_name == self.milvus._vector_field for index in col.indexes):
+            self.milvus._create_index()
+            self.milvus._create_search_params()
+            col.load()
+
     def do_add_doc(self, docs: List[Document], **kwargs) -> List[Dict]:
+        # bulk_load 表示重建向量库等批量写入，结束后一定会调用 save_vector_store，此时推迟到那时再建立索引。
+        # 普通上传的 not_refresh_vs_cache 不保证之后会调用 save_vector_store，不能推迟
+        bulk = kwargs.get("bulk_load", False)
+        new_collection = self.milvus.col is None
         for doc in docs:
             for k, v in doc.metadata.items():
                 doc.metadata[k] = str(v)
@@ -97,16 +172,29 @@ class MilvusKBService(KBService):
             doc.metadata.pop(self.milvus._text_field, None)
             doc.metadata.pop(self.milvus._vector_field, None)
 
-        ids = self.milvus.add_documents(docs)
+        ids = self.milvus.add_documents(
+            docs, batch_size=self.milvus_kwargs.get("insert_batch_size", 1000)
+        )
+        if bulk and new_collection and self.milvus.col is not None:
+            # langchain 新建集合时会立即建索引并加载，批量写入期间先删除索引，避免边写入边为小分段建索引
+            self.milvus.col.release()
+            self.milvus.col.drop_index()
+        self._create_metadata_index()
         doc_infos = [{"id": id, "metadata": doc.metadata} for id, doc in zip(ids, docs)]
         return doc_infos
 
     def do_delete_doc(self, kb_file: KnowledgeFile, **kwargs):
+        if not self.milvus.col:
+            return
+        if self._partition_key() == "source":
+            # 按 partition key 删除只会涉及该文件所在的分区，不需要先从数据库查询 id
+            source = self.get_relative_source_path(kb_file.filepath)
+            self.milvus.col.delete(expr=f"source == {json.dumps(source, ensure_ascii=False)}")
+            return
         id_list = list_file_num_docs_id_by_kb_name_and_file_name(
             kb_file.kb_name, kb_file.filename
         )
-        if self.milvus.col:
-            self.milvus.col.delete(expr=f"pk in {id_list}")
+        self.milvus.col.delete(expr=f"pk in {id_list}")
 
         # Issue 2846, for windows
         # if self.milvus.col:
@@ -1,5 +1,9 @@
+import csv
+import io
 import json
+import re
 import shutil
+import uuid
 from typing import Dict, List, Optional
 
 import sqlalchemy
@@ -18,12 +22,134 @@ from chatchat.server.knowledge_base.kb_service.base import (
 )
 from chatchat.server.knowledge_base.utils import KnowledgeFile
 from chatchat.server.utils import get_Embeddings
+from chatchat.utils import build_logger
+
+
+logger = build_logger()
 
 
 class PGKBService(KBService):
     engine: Engine = sqlalchemy.create_engine(
         Settings.kb_settings.kbs_config.get("pg").get("connection_uri"), pool_size=10
     )
+    _metadata_index_created: bool = False
+
+    @classmethod
+    def _create_metadata_index(cls):
+        """
+        为 METADATA_INDEX_KEYS 建立 (cmetadata->>'key') 表达式索引，使带 metadata 过滤的检索可以走索引。每个进程只执行一次
+        """
+        if cls._metadata_index_created:
+            return
+        try:
+            with Session(cls.engine) as session:
+                for key in Settings.kb_settings.METADATA_INDEX_KEYS:
+                    if not re.fullmatch(r"\w+", key):
+                        logger.warning(f"skip invalid metadata index key: {key}")
+                        continue
+                    session.execute(text(
+                        f"CREATE INDEX IF NOT EXISTS ix_langchain_pg_embedding_meta_{key} "
+                        f"ON langchain_pg_embedding ((cmetadata->>'{key}'));"
+                    ))
+                session.commit()
+            cls._metadata_index_created = True
+        except Exception as e:
+            logger.warning(f"failed to create metadata index for pg vector store: {e}")
+
+    @property
+    def index_config(self) -> Dict:
+        """
+        向量索引配置：type 为 hnsw/ivfflat，为空时不建立索引；
+        m/ef_construction/ef_search 用于 hnsw，lists/probes 用于 ivfflat
+        """
+        return Settings.kb_settings.kbs_config.get("pg", {}).get("index", {})
+
+    def _collection_id(self, session: Session) -> Optional[str]:
+        row = session.execute(
+            text("SELECT uuid FROM langchain_pg_collection WHERE name = :name;"),
+            {"name": self.kb_name},
+        ).fetchone()
+        return None if row is None else str(row[0])
+
+    @staticmethod
+    def _vector_index_name(collection_id: str) -> str:
+        return f"ix_langchain_pg_embedding_vec_{collection_id.replace('-', '')}"
+
+    def create_vector_index(self):
+        """
+        为当前知识库建立向量索引。langchain_pg_embedding 的 embedding 列没有维度，
+        这里对 embedding::vector(dims) 建立表达式索引，并限定为当前 collection 的部分索引
+        """
+        index_type = self.index_config.get("type")
+        if index_type not in ("hnsw", "ivfflat"):
+            return
+        with Session(PGKBService.engine) as session:
+            collection_id = self._collection_id(session)
+            if collection_id is None:
+                return
+            row = session.execute(
+                text("SELECT vector_dims(embedding) FROM langchain_pg_embedding "
+                     "WHERE collection_id = :collection_id LIMIT 1;"),
+                {"collection_id": collection_id},
+            ).fetchone()
+            if row is None:  # 还没有数据，无法确定维度
+                return
+            if index_type == "hnsw":
+                options = (f"m = {int(self.index_config.get('m', 16))}, "
+                           f"ef_construction = {int(self.index_config.get('ef_construction', 64))}")
+            else:
+                options = f"lists = {int(self.index_config.get('lists', 100))}"
+            session.execute(text(
+                f"CREATE INDEX IF NOT EXISTS {self._vector_index_name(collection_id)} "
+                f"ON langchain_pg_embedding USING {index_type} "
+                f"((embedding::vector({int(row[0])})) vector_l2_ops) WITH ({options}) "
+                f"WHERE collection_id = '{collection_id}';"
+            ))
+            session.commit()
+
+    def drop_vector_index(self):
+        with Session(PGKBService.engine) as session:
+            if (collection_id := self._collection_id(session)) is not None:
+                session.execute(text(f"DROP INDEX IF EXISTS {self._vector_index_name(collection_id)};"))
+                session.commit()
+
+    def index_stats(self) -> Dict:
+        """
+        返回当前知识库向量索引的状态：是否存在、是否有效、大小、扫描次数及文档数
+        """
+        with Session(PGKBService.engine) as session:
+            collection_id = self._collection_id(session)
+            if collection_id is None:
+                return {"kb_name": self.kb_name, "collection": None}
+            index_name = self._vector_index_name(collection_id)
+            docs_count = session.execute(
+                text("SELECT count(*) FROM langchain_pg_embedding WHERE collection_id = :collection_id;"),
+                {"collection_id": collection_id},
+            ).scalar()
+            row = session.execute(text("""
+                SELECT am.amname, i.indisvalid, i.indisready,
+                       pg_relation_size(c.oid), s.idx_scan
+                FROM pg_class c
+                JOIN pg_index i ON i.indexrelid = c.oid
+                JOIN pg_am am ON am.oid = c.relam
+                LEFT JOIN pg_stat_user_indexes s ON s.indexrelid = c.oid
+                WHERE c.relname = :index_name;
+            """), {"index_name": index_name}).fetchone()
+        stats = {
+            "kb_name": self.kb_name,
+            "collection": collection_id,
+            "docs_count": docs_count,
+            "index_name": index_name,
+            "exists": row is not None,
+        }
+        if row is not None:
+            stats.update(
+                index_type=row[0],
+                valid=bool(row[1] and row[2]),
+                size_bytes=row[3],
+                idx_scan=row[4],
+            )
+        return stats
 
     def _load_pg_vector(self):
         self.pg_vector = PGVector(
@@ -50,6 +176,8 @@ class PGKBService(KBService):
 
     def do_init(self):
         self._load_pg_vector()
+        self._create_metadata_index()
+        self._index_deferred = False
 
     def do_create_kb(self):
         pass
@@ -58,6 +186,7 @@ class PGKBService(KBService):
         return SupportedVSType.PG
 
     def do_drop_kb(self):
+        self.drop_vector_index()
         with Session(PGKBService.engine) as session:
             session.execute(
                 text(
@@ -75,17 +204,125 @@ class PGKBService(KBService):
             session.commit()
             shutil.rmtree(self.kb_path)
 
-    def do_search(self, query: str, top_k: int, score_threshold: float):
+    def do_search(self, query: str, top_k: int, score_threshold: float, metadata: Dict = None):
+        if self.index_config.get("type") in ("hnsw", "ivfflat"):
+            return self._search_by_index(query, top_k, score_threshold, metadata)
+
+        search_kwargs = {}
+        if metadata:
+            # PGVector 按 cmetadata->>'key' = 'value' 在 SQL 中过滤
+            search_kwargs["filter"] = {k: str(v) for k, v in metadata.items()}
         retriever = get_Retriever("vectorstore").from_vectorstore(
             self.pg_vector,
             top_k=top_k,
             score_threshold=score_threshold,
+            search_kwargs=search_kwargs,
         )
         docs = retriever.get_relevant_documents(query)
         return docs
 
+    def _search_by_index(
+        self, query: str, top_k: int, score_threshold: float, metadata: Dict = None
+    ) -> List[Document]:
+        """
+        使用与 create_vector_index 相同的表达式排序，使查询能够命中向量索引，并按配置设置 ef_search/probes。
+        得分与 langchain 一致：转换为相关度后与 score_threshold 比较
+        """
+        embedding = self.pg_vector.embedding_function.embed_query(query)
+        dims = len(embedding)
+        params = {"k": top_k, "query_vector": "[" + ",".join(map(str, embedding)) + "]"}
+        with Session(PGKBService.engine) as session:
+            collection_id = self._collection_id(session)
+            if collection_id is None:
+                return []
+            params["collection_id"] = collection_id
+            conditions = ["collection_id = :collection_id"]
+            for i, (k, v) in enumerate((metadata or {}).items()):
+                conditions.append(f"cmetadata->>:key_{i} = :value_{i}")
+                params.update({f"key_{i}": k, f"value_{i}": str(v)})
+
+            if self.index_config.get("type") == "hnsw":
+                session.execute(text(f"SET LOCAL hnsw.ef_search = {int(self.index_config.get('ef_search', 40))};"))
+            else:
+                session.execute(text(f"SET LOCAL ivfflat.probes = {int(self.index_config.get('probes', 10))};"))
+            distance = f"embedding::vector({dims}) <-> CAST(:query_vector AS vector({dims}))"
+            rows = session.execute(text(f"""
+                SELECT document, cmetadata, {distance} AS distance
+                FROM langchain_pg_embedding
+                WHERE {" AND ".join(conditions)}
+                ORDER BY {distance}
+                LIMIT :k;
+            """), params).fetchall()
+
+        relevance_score_fn = self.pg_vector._select_relevance_score_fn()
+        return [
+            Document(page_content=row[0], metadata=row[1] or {})
+            for row in rows
+            if score_threshold is None or relevance_score_fn(row[2]) >= score_threshold
+        ]
+
+    def _copy_embeddings(
+        self, texts: List[str], embeddings: List[List[float]], metadatas: List[Dict]
+    ) -> List[str]:
+        """
+        使用 COPY 批量写入向量，比逐行 INSERT 快得多。驱动不支持 copy_expert 时退回 PGVector.add_embeddings
+        """
+        ids = [str(uuid.uuid1()) for _ in texts]
+        with Session(PGKBService.engine) as session:
+            collection_id = self._collection_id(session)
+
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        for _id, text_, embedding, metadata in zip(ids, texts, embeddings, metadatas):
+            writer.writerow([
+                str(uuid.uuid4()),
+                collection_id,
+                "[" + ",".join(map(str, embedding)) + "]",
+                text_,
+                json.dumps(metadata, ensure_ascii=False),
+                _id,
+            ])
+        buf.seek(0)
+
+        conn = PGKBService.engine.raw_connection()
+        try:
+            cursor = conn.cursor()
+            if not hasattr(cursor, "copy_expert"):
+                cursor.close()
+                return self.pg_vector.add_embeddings(
+                    texts=texts, embeddings=embeddings, metadatas=metadatas, ids=ids
+                )
+            cursor.copy_expert(
+                "COPY langchain_pg_embedding (uuid, collection_id, embedding, document, cmetadata, custom_id) "
+                "FROM STDIN WITH (FORMAT csv)",
+                buf,
+            )
+            cursor.close()
+            conn.commit()
+        finally:
+            conn.close()
+        return ids
+
+    def save_vector_store(self):
+        """
+        批量写入结束后一次性建立向量索引
+        """
+        self.create_vector_index()
+        self._index_deferred = False
+
     def do_add_doc(self, docs: List[Document], **kwargs) -> List[Dict]:
-        ids = self.pg_vector.add_documents(docs)
+        texts = [doc.page_content for doc in docs]
+        metadatas = [doc.metadata for doc in docs]
+        embeddings = self.pg_vector.embedding_function.embed_documents(texts)
+        # bulk_load 表示重建向量库等批量写入，先删除索引，写完后由 save_vector_store 统一建立。
+        # 普通上传的 not_refresh_vs_cache 不保证之后会调用 save_vector_store，不能删除索引
+        bulk = kwargs.get("bulk_load")
+        if bulk and not self._index_deferred:
+            self.drop_vector_index()
+            self._index_deferred = True
+        ids = self._copy_embeddings(texts, embeddings, metadatas)
+        if not bulk:
+            self.create_vector_index()
         doc_infos = [{"id": id, "metadata": doc.metadata} for id, doc in zip(ids, docs)]
         return doc_infos
 
@@ -108,6 +345,7 @@ class PGKBService(KBService):
             session.commit()
 
     def do_clear_vs(self):
+        self.drop_vector_index()
         self.pg_vector.delete_collection()
         self.pg_vector.create_collection()
 
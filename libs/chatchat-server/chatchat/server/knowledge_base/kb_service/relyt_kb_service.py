@@ -90,8 +90,8 @@ class RelytKBService(KBService):
             with conn.begin():
                 conn.execute(drop_statement)
 
-    def do_search(self, query: str, top_k: int, score_threshold: float):
-        docs = self.relyt.similarity_search_with_score(query, top_k)
+    def do_search(self, query: str, top_k: int, score_threshold: float, metadata: Dict = None):
+        docs = self.relyt.similarity_search_with_score(query, top_k, filter=metadata)
         return score_threshold_process(score_threshold, top_k, docs)
 
     def do_add_doc(self, docs: List[Document], **kwargs) -> List[Dict]:
@@ -10,6 +10,7 @@ from chatchat.server.knowledge_base.kb_service.base import (
     SupportedVSType,
     score_threshold_process,
 )
+from chatchat.server.knowledge_base.kb_service.milvus_kb_service import metadata_to_expr
 from chatchat.server.knowledge_base.utils import KnowledgeFile
 from chatchat.server.utils import get_Embeddings
 
@@ -53,8 +54,22 @@ class ZillizKBService(KBService):
     def vs_type(self) -> str:
         return SupportedVSType.ZILLIZ
 
+    @property
+    def insert_batch_size(self) -> int:
+        kbs_config = Settings.kb_settings.kbs_config
+        # 兼容写在 zilliz 连接参数中的配置
+        return (
+            kbs_config.get("zilliz_kwargs", {}).get("insert_batch_size")
+            or kbs_config.get("zilliz", {}).get("insert_batch_size")
+            or 1000
+        )
+
     def _load_zilliz(self):
-        zilliz_args = Settings.kb_settings.kbs_config.get("zilliz")
+        zilliz_args = {
+            k: v
+            for k, v in Settings.kb_settings.kbs_config.get("zilliz", {}).items()
+            if k != "insert_batch_size"
+        }
         self.zilliz = Zilliz(
             embedding_function=get_Embeddings(self.embed_model),
             collection_name=self.kb_name,
@@ -69,12 +84,18 @@ class ZillizKBService(KBService):
             self.zilliz.col.release()
             self.zilliz.col.drop()
 
-    def do_search(self, query: str, top_k: int, score_threshold: float):
+    def do_search(self, query: str, top_k: int, score_threshold: float, metadata: Dict = None):
         self._load_zilliz()
+        search_kwargs = {}
+        if metadata:
+            if (expr := metadata_to_expr(metadata, self.zilliz.fields)) is None:
+                return []
+            search_kwargs["expr"] = expr
         retriever = get_Retriever("vectorstore").from_vectorstore(
             self.zilliz,
             top_k=top_k,
             score_threshold=score_threshold,
+            search_kwargs=search_kwargs,
         )
         docs = retriever.get_relevant_documents(query)
         return docs
@@ -88,7 +109,10 @@ class ZillizKBService(KBService):
             doc.metadata.pop(self.zilliz._text_field, None)
             doc.metadata.pop(self.zilliz._vector_field, None)
 
-        ids = self.zilliz.add_documents(docs)
+        ids = self.zilliz.add_documents(
+            docs,
+            batch_size=self.insert_batch_size,
+        )
         doc_infos = [{"id": id, "metadata": doc.metadata} for id, doc in zip(ids, docs)]
         return doc_infos
 
@@ -14,6 +14,7 @@ from chatchat.server.db.repository.knowledge_metadata_repository import (
 from chatchat.server.knowledge_base.kb_cache.faiss_cache import (
     ThreadSafeFaiss,
     kb_faiss_pool,
+    vs_file_lock,
 )
 
 
@@ -24,10 +25,10 @@ class KBSummaryService(ABC):
     kb_path: str
 
     def __init__(
-        self, knowledge_base_name: str, embed_model: str = get_default_embedding()
+        self, knowledge_base_name: str, embed_model: str = None
     ):
         self.kb_name = knowledge_base_name
-        self.embed_model = embed_model
+        self.embed_model = embed_model or get_default_embedding()
 
         self.kb_path = self.get_kb_path()
         self.vs_path = self.get_vs_path()
@@ -41,18 +42,21 @@ class KBSummaryService(ABC):
     def get_kb_path(self):
         return os.path.join(Settings.basic_settings.KB_ROOT_PATH, self.kb_name)
 
-    def load_vector_store(self) -> ThreadSafeFaiss:
+    def load_vector_store(self, writable: bool = False) -> ThreadSafeFaiss:
         return kb_faiss_pool.load_vector_store(
             kb_name=self.kb_name,
             vector_name="summary_vector_store",
             embed_model=self.embed_model,
             create=True,
+            writable=writable,
         )
 
     def add_kb_summary(self, summary_combine_docs: List[Document]):
-        with self.load_vector_store().acquire() as vs:
-            ids = vs.add_documents(documents=summary_combine_docs)
-            vs.save_local(self.vs_path)
+        with vs_file_lock(self.vs_path):
+            faiss_vs = self.load_vector_store(writable=True)
+            with faiss_vs.acquire() as vs:
+                ids = vs.add_documents(documents=summary_combine_docs)
+                faiss_vs.save(self.vs_path)
 
         summary_infos = [
             {
@@ -29,7 +29,6 @@ from chatchat.server.knowledge_base.utils import (
     list_kbs_from_folder,
 )
 from chatchat.utils import build_logger
-from chatchat.server.utils import get_default_embedding
 
 
 logger = build_logger()
@@ -37,6 +36,73 @@ logger = build_logger()
 
 def create_tables():
     Base.metadata.create_all(bind=engine)
+    migrate_tables()
+
+
+# 旧版本数据库中缺少的列：{表名: {列名: (列类型, 回填来源列)}}。
+# 回填来源列不为空时，新增的列回填为来源列的小写形式，为 None 时保持为空
+_ADDED_COLUMNS = {
+    "knowledge_base": {"kb_name_key": ("VARCHAR(50)", "kb_name")},
+    "knowledge_file": {
+        "kb_name_key": ("VARCHAR(50)", "kb_name"),
+        "file_name_key": ("VARCHAR(255)", "file_name"),
+        "file_hash": ("VARCHAR(64)", None),
+    },
+    "file_doc": {
+        "kb_name_key": ("VARCHAR(50)", "kb_name"),
+        "file_name_key": ("VARCHAR(255)", "file_name"),
+    },
+    "message": {
+        "query_tokens": ("INTEGER", None),
+        "response_tokens": ("INTEGER", None),
+    },
+}
+
+
+def migrate_tables():
+    """
+    升级旧版本创建的数据表：添加新增的列并回填数据，创建对应的索引。
+    可重复执行，只在添加列时回填数据，已经升级过的表不做任何修改。
+    """
+    from sqlalchemy import inspect, text
+
+    inspector = inspect(engine)
+    tables = inspector.get_table_names()
+    for table_name, added_columns in _ADDED_COLUMNS.items():
+        if table_name not in tables:
+            continue
+        columns = {c["name"] for c in inspector.get_columns(table_name)}
+        with engine.begin() as conn:
+            for column, (column_type, backfill) in added_columns.items():
+                if column in columns:
+                    continue
+                logger.info(f"adding column {column} to table {table_name}")
+                conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {column} {column_type}"))
+                if backfill:
+                    _backfill_lower_key(conn, table_name, column, backfill)
+
+        for index in Base.metadata.tables[table_name].indexes:
+            try:
+                index.create(bind=engine, checkfirst=True)
+            except Exception as e:
+                # 旧数据中存在重复的 doc_id 时无法创建唯一索引，不影响查询
+                logger.warning(f"failed to create index {index.name} on {table_name}: {e}")
+
+
+def _backfill_lower_key(conn, table_name: str, column: str, source: str, batch_size: int = 1000):
+    """
+    将 column 回填为 source 列的小写形式。
+    在 Python 中计算，与新写入的数据和查询条件一致（sqlite 的 lower() 只转换 ASCII 字符）
+    """
+    from sqlalchemy import text
+
+    rows = conn.execute(text(f"SELECT id, {source} FROM {table_name}")).fetchall()
+    update = text(f"UPDATE {table_name} SET {column} = :value WHERE id = :id")
+    for i in range(0, len(rows), batch_size):
+        conn.execute(update, [
+            {"id": id, "value": None if value is None else value.lower()}
+            for id, value in rows[i: i + batch_size]
+        ])
 
 
 def reset_tables():
@@ -104,7 +170,7 @@ def folder2db(
     kb_names: List[str],
     mode: Literal["recreate_vs", "update_in_db", "increment"],
     vs_type: Literal["faiss", "milvus", "pg", "chromadb"] = Settings.kb_settings.DEFAULT_VS_TYPE,
-    embed_model: str = get_default_embedding(),
+    embed_model: str = None,
     chunk_size: int = Settings.kb_settings.CHUNK_SIZE,
     chunk_overlap: int = Settings.kb_settings.OVERLAP_SIZE,
     zh_title_enhance: bool = Settings.kb_settings.ZH_TITLE_ENHANCE,
@@ -133,7 +199,8 @@ def folder2db(
                 )
                 kb_file = KnowledgeFile(filename=filename, knowledge_base_name=kb_name)
                 kb_file.splited_docs = docs
-                kb.add_doc(kb_file=kb_file, not_refresh_vs_cache=True)
+                # 各模式写入后都会调用 save_vector_store
+                kb.add_doc(kb_file=kb_file, not_refresh_vs_cache=True, bulk_load=True)
                 result.append({"kb_name": kb_name, "file": filename, "docs": docs})
             else:
                 print(res)
@@ -236,3 +303,23 @@ def prune_folder_files(kb_names: List[str]):
             for file in files:
                 os.remove(get_file_path(kb_name, file))
                 print(f"success to delete file: {kb_name}/{file}")
+
+
+def pg_index_stats(kb_names: List[str]):
+    """
+    print vector index health and size of pg knowledge bases.
+    """
+    kb_names = kb_names or list_kbs_from_folder()
+    for kb_name in kb_names:
+        kb = KBServiceFactory.get_service_by_name(kb_name)
+        if kb is None or kb.vs_type() != SupportedVSType.PG:
+            continue
+        stats = kb.index_stats()
+        if not stats.get("exists"):
+            print(f"{kb_name}: no vector index, {stats.get('docs_count', 0)} docs")
+            continue
+        print(
+            f"{kb_name}: {stats['index_type']} index {stats['index_name']}, "
+            f"valid={stats['valid']}, size={stats['size_bytes'] / 1024 / 1024:.2f}MB, "
+            f"docs={stats['docs_count']}, scans={stats['idx_scan']}"
+        )
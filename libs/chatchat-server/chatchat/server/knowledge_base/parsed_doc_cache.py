@@ -0,0 +1,176 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+import uuid
+from typing import Dict, List, Optional
+
+from langchain.docstore.document import Document
+
+from chatchat.settings import Settings
+from chatchat.utils import build_logger
+
+
+logger = build_logger()
+
+# 缓存格式版本，修改存储格式或加载器输出时递增，使旧缓存失效
+CACHE_VERSION = 1
+
+CACHE_SUFFIX = ".jsonl.gz"
+
+# 解析很快的加载器，读缓存并不比重新解析快，不缓存
+UNCACHED_LOADERS = {"TextLoader", "CSVLoader", "FilteredCSVLoader", "JSONLoader"}
+
+
+class ParsedDocCache:
+    """
+    文档加载器解析结果的磁盘缓存。
+    以（文件内容 sha256，加载器名称，加载器参数）为键，每个文件的解析结果保存为一个 gzip 压缩的 JSONL 文件：
+    第一行记录解析时的文件路径，之后每行一个 Document。
+    读取时更新缓存文件的修改时间，总大小超出 PARSED_DOCS_CACHE_MB 时按修改时间删除最久未使用的缓存。
+    """
+
+    def __init__(self, cache_dir: str = None, max_size_mb: int = None):
+        self._cache_dir = cache_dir
+        self._max_size_mb = max_size_mb
+        self._lock = threading.Lock()
+
+    @property
+    def cache_dir(self) -> str:
+        return str(self._cache_dir or Settings.basic_settings.PARSED_DOCS_CACHE_DIR)
+
+    @property
+    def max_size(self) -> int:
+        if self._max_size_mb is None:
+            return Settings.kb_settings.PARSED_DOCS_CACHE_MB * 1024 * 1024
+        return self._max_size_mb * 1024 * 1024
+
+    def enabled(self, loader_name: str) -> bool:
+        return self.max_size > 0 and loader_name not in UNCACHED_LOADERS
+
+    @staticmethod
+    def make_key(content_hash: str, loader_name: str, loader_kwargs: Dict = None) -> str:
+        key = {
+            "version": CACHE_VERSION,
+            "hash": content_hash,
+            "loader": loader_name,
+            "loader_kwargs": loader_kwargs or {},
+            # PDF 等加载器根据该配置决定是否对图片进行 OCR
+            "ocr_threshold": list(Settings.kb_settings.PDF_OCR_THRESHOLD),
+        }
+        data = json.dumps(key, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + CACHE_SUFFIX)
+
+    def get(self, key: str, file_path: str) -> Optional[List[Document]]:
+        """
+        读取缓存的解析结果，没有缓存时返回 None。
+        metadata 中的文件路径替换为 file_path（内容相同的文件可能位于不同知识库）
+        """
+        path = self._path(key)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                source = json.loads(f.readline())["source"]
+                docs = []
+                for line in f:
+                    d = json.loads(line)
+                    metadata = {
+                        k: (file_path if v == source else v)
+                        for k, v in d["metadata"].items()
+                    }
+                    docs.append(Document(page_content=d["page_content"], metadata=metadata))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"读取文档解析缓存 {path} 出错，将重新解析：{e}")
+            self._remove(path)
+            return None
+
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return docs
+
+    def put(self, key: str, file_path: str, docs: List[Document]) -> bool:
+        """
+        保存解析结果。metadata 无法用 JSON 表示时不缓存，返回 False
+        """
+        try:
+            lines = [json.dumps({"source": file_path}, ensure_ascii=False)]
+            for doc in docs:
+                lines.append(
+                    json.dumps(
+                        {"page_content": doc.page_content, "metadata": doc.metadata},
+                        ensure_ascii=False,
+                    )
+                )
+        except (TypeError, ValueError) as e:
+            logger.info(f"{file_path} 的解析结果无法序列化，不缓存：{e}")
+            return False
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(key)
+        tmp = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+        try:
+            with gzip.open(tmp, "wt", encoding="utf-8", compresslevel=6) as f:
+                for line in lines:
+                    f.write(line)
+                    f.write("\n")
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning(f"保存文档解析缓存 {path} 出错：{e}")
+            self._remove(tmp)
+            return False
+
+        self.evict()
+        return True
+
+    def evict(self) -> int:
+        """
+        总大小超出上限时，按修改时间删除最久未使用的缓存，直到总大小不超过上限的 90%。返回删除的数量
+        """
+        with self._lock:
+            entries = []
+            total = 0
+            try:
+                with os.scandir(self.cache_dir) as it:
+                    for entry in it:
+                        if not entry.name.endswith(CACHE_SUFFIX):
+                            continue
+                        try:
+                            stat = entry.stat()
+                        except OSError:
+                            continue
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+                        total += stat.st_size
+            except FileNotFoundError:
+                return 0
+
+            max_size = self.max_size
+            if total <= max_size:
+                return 0
+
+            removed = 0
+            target = max_size * 0.9
+            for _, size, path in sorted(entries):
+                if total <= target:
+                    break
+                self._remove(path)
+                total -= size
+                removed += 1
+            logger.info(f"文档解析缓存超出 {max_size} 字节，已删除 {removed} 个缓存")
+            return removed
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+parsed_doc_cache = ParsedDocCache()
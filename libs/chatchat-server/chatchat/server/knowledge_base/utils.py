@@ -1,10 +1,15 @@
+import hashlib
 import importlib
 import json
 import os
+import shutil
+import threading
+import uuid
+from collections import OrderedDict
 from functools import lru_cache
 from pathlib import Path
 from urllib.parse import urlencode
-from typing import Dict, Generator, List, Tuple, Union
+from typing import BinaryIO, Dict, Generator, List, Tuple, Union
 
 import chardet
 import langchain_community.document_loaders
@@ -16,6 +21,7 @@ from chatchat.settings import Settings
 from chatchat.server.file_rag.text_splitter import (
     zh_title_enhance as func_zh_title_enhance,
 )
+from chatchat.server.knowledge_base.parsed_doc_cache import parsed_doc_cache
 from chatchat.server.utils import run_in_process_pool, run_in_thread_pool
 from chatchat.utils import build_logger
 
@@ -49,6 +55,104 @@ def get_file_path(knowledge_base_name: str, doc_name: str):
         return str(file_path)
 
 
+# 上传文件及计算文件哈希时每次读写的块大小
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+def file_hash(file_path: str, chunk_size: int = UPLOAD_CHUNK_SIZE) -> str:
+    """
+    按块读取文件计算 sha256，不把整个文件读入内存
+    """
+    h = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+# 已计算过的文件哈希：{文件路径: (修改时间, 文件大小, sha256)}，文件修改后自动失效。
+# 上传时边写边计算的哈希也记录在这里，入库和解析缓存不再重新读取整个文件
+_FILE_HASH_CACHE_SIZE = 4096
+_file_hash_cache: "OrderedDict[str, Tuple[int, int, str]]" = OrderedDict()
+_file_hash_lock = threading.Lock()
+
+
+def remember_file_hash(file_path: str, sha256: str):
+    """
+    记录文件当前内容的 sha256
+    """
+    st = os.stat(file_path)
+    with _file_hash_lock:
+        _file_hash_cache[os.path.abspath(file_path)] = (st.st_mtime_ns, st.st_size, sha256)
+        _file_hash_cache.move_to_end(os.path.abspath(file_path))
+        while len(_file_hash_cache) > _FILE_HASH_CACHE_SIZE:
+            _file_hash_cache.popitem(last=False)
+
+
+def cached_file_hash(file_path: str) -> str:
+    """
+    与 file_hash 相同，文件未修改时（修改时间和大小不变）直接返回记录的哈希
+    """
+    st = os.stat(file_path)
+    with _file_hash_lock:
+        cached = _file_hash_cache.get(os.path.abspath(file_path))
+    if cached is not None and cached[:2] == (st.st_mtime_ns, st.st_size):
+        return cached[2]
+    sha256 = file_hash(file_path)
+    remember_file_hash(file_path, sha256)
+    return sha256
+
+
+def save_to_temp_file(
+    src: BinaryIO, file_path: str, chunk_size: int = UPLOAD_CHUNK_SIZE
+) -> Tuple[str, str, int]:
+    """
+    将上传的文件流按块写入 file_path 同目录下的临时文件，同时计算 sha256。
+    返回 (临时文件路径, sha256, 文件大小)，由调用方用 os.replace 移动到 file_path 或删除。
+    临时文件以 . 开头，不会被 list_files_from_folder 列出
+    """
+    dir_name, base_name = os.path.split(file_path)
+    os.makedirs(dir_name, exist_ok=True)
+    tmp_path = os.path.join(dir_name, f".{base_name}.{uuid.uuid4().hex[:8]}.uploading")
+    h = hashlib.sha256()
+    size = 0
+    try:
+        with open(tmp_path, "wb") as f:
+            while chunk := src.read(chunk_size):
+                h.update(chunk)
+                f.write(chunk)
+                size += len(chunk)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return tmp_path, h.hexdigest(), size
+
+
+def place_uploaded_file(
+    tmp_path: str, sha256: str, size: int, file_path: str, override: bool
+) -> bool:
+    """
+    将上传的临时文件移动到 file_path。override=False 且已存在内容相同的文件时删除临时文件并返回 False
+    """
+    if (
+        os.path.isfile(file_path)
+        and not override
+        and os.path.getsize(file_path) == size
+        and cached_file_hash(file_path) == sha256
+    ):
+        os.remove(tmp_path)
+        return False
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    # 临时文件可能在其它文件系统上（如分块上传），此时 move 会复制后删除
+    if os.path.dirname(tmp_path) == os.path.dirname(file_path):
+        os.replace(tmp_path, file_path)
+    else:
+        shutil.move(tmp_path, file_path)
+    remember_file_hash(file_path, sha256)
+    return True
+
+
 def list_kbs_from_folder():
     return [
         f
@@ -333,6 +437,19 @@ class KnowledgeFile:
 
     def file2docs(self, refresh: bool = False):
         if self.docs is None or refresh:
+            # 解析结果按文件内容缓存，文件修改后内容哈希改变，不会读到旧的结果。
+            # 文件对话的临时文件会被定期清理，不缓存其解析结果
+            cache_key = None
+            if self.kb_name != "temp" and parsed_doc_cache.enabled(self.document_loader_name):
+                cache_key = parsed_doc_cache.make_key(
+                    self.get_hash(), self.document_loader_name, self.loader_kwargs
+                )
+                docs = parsed_doc_cache.get(cache_key, self.filepath)
+                if docs is not None:
+                    logger.info(f"parsed docs of {self.filepath} loaded from cache")
+                    self.docs = docs
+                    return self.docs
+
             logger.info(f"{self.document_loader_name} used for {self.filepath}")
             loader = get_loader(
                 loader_name=self.document_loader_name,
@@ -344,6 +461,8 @@ class KnowledgeFile:
                 self.docs = loader.load()
             else:
                 self.docs = loader.load()
+            if cache_key is not None:
+                parsed_doc_cache.put(cache_key, self.filepath, self.docs)
         return self.docs
 
     def docs2texts(
@@ -408,6 +527,9 @@ class KnowledgeFile:
     def get_size(self):
         return os.path.getsize(self.filepath)
 
+    def get_hash(self):
+        return cached_file_hash(self.filepath)
+
 
 def files2docs_in_thread_file2docs(
     *, file: KnowledgeFile, **kwargs
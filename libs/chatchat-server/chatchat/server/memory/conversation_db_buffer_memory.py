@@ -1,12 +1,17 @@
-import logging
 from typing import Any, Dict, List
 
 from langchain.memory.chat_memory import BaseChatMemory
 from langchain.schema import AIMessage, BaseMessage, HumanMessage, get_buffer_string
 from langchain.schema.language_model import BaseLanguageModel
 
-from chatchat.server.db.models.message_model import MessageModel
-from chatchat.server.db.repository.message_repository import filter_message
+from chatchat.server.db.repository.message_repository import (
+    filter_message,
+    update_message_tokens,
+)
+from chatchat.utils import build_logger
+
+
+logger = build_logger()
 
 
 class ConversationBufferDBMemory(BaseChatMemory):
@@ -28,25 +33,44 @@ class ConversationBufferDBMemory(BaseChatMemory):
         )
         # 返回的记录按时间倒序，转为正序
         messages = list(reversed(messages))
+        if not messages:
+            return []
+
         chat_messages: List[BaseMessage] = []
+        num_tokens: List[int] = []
+        new_token_counts = {}
         for message in messages:
-            chat_messages.append(HumanMessage(content=message["query"]))
-            chat_messages.append(AIMessage(content=message["response"]))
+            human_message = HumanMessage(content=message["query"])
+            ai_message = AIMessage(content=message["response"])
+            query_tokens = message.get("query_tokens")
+            response_tokens = message.get("response_tokens")
+            # token 数只计算一次，保存到数据库中
+            if query_tokens is None or response_tokens is None:
+                query_tokens = self.llm.get_num_tokens(get_buffer_string([human_message]))
+                response_tokens = self.llm.get_num_tokens(get_buffer_string([ai_message]))
+                new_token_counts[message["id"]] = (query_tokens, response_tokens)
+            chat_messages += [human_message, ai_message]
+            num_tokens += [query_tokens, response_tokens]
 
-        if not chat_messages:
-            return []
+        if new_token_counts:
+            try:
+                update_message_tokens(
+                    conversation_id=self.conversation_id, token_counts=new_token_counts
+                )
+            except Exception as e:
+                logger.warning(f"failed to save token counts of messages: {e}")
 
         # prune the chat message if it exceeds the max token limit
-        curr_buffer_length = self.llm.get_num_tokens(get_buffer_string(chat_messages))
-        if curr_buffer_length > self.max_token_limit:
-            pruned_memory = []
-            while curr_buffer_length > self.max_token_limit and chat_messages:
-                pruned_memory.append(chat_messages.pop(0))
-                curr_buffer_length = self.llm.get_num_tokens(
-                    get_buffer_string(chat_messages)
-                )
+        # 从最新的消息开始累加 token 数（每条消息之间的换行计 1 个 token），保留不超过限制的部分
+        start = len(chat_messages)
+        curr_buffer_length = 0
+        for i in range(len(chat_messages) - 1, -1, -1):
+            curr_buffer_length += num_tokens[i] + (1 if i < len(chat_messages) - 1 else 0)
+            if curr_buffer_length > self.max_token_limit:
+                break
+            start = i
 
-        return chat_messages
+        return chat_messages[start:]
 
     @property
     def memory_variables(self) -> List[str]:
@@ -0,0 +1,252 @@
+import threading
+import time
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional, Tuple
+
+from chatchat.settings import Settings
+from chatchat.utils import build_logger
+
+
+logger = build_logger()
+
+
+MODEL_TYPES = (
+    "llm_models",
+    "embed_models",
+    "text2image_models",
+    "image2image_models",
+    "image2text_models",
+    "rerank_models",
+    "speech2text_models",
+    "text2speech_models",
+)
+
+
+class ModelCatalogSnapshot:
+    """
+    模型目录快照，构建后不再修改，可在多线程间安全共享。
+    - platforms: {platform_name: platform_config_dict}
+    - by_name: {model_name: (model_info, ...)}，同名模型在不同平台/类型中的所有配置，按配置顺序排列
+    - by_type: {model_type: {model_name: model_info}}，与原 get_config_models 的覆盖规则一致
+    """
+
+    __slots__ = ("source", "platforms", "entries", "by_name", "by_type", "all_models", "created")
+
+    def __init__(
+        self,
+        source: object,
+        platforms: Dict[str, Dict],
+        entries: List[Dict],
+    ):
+        self.source = source
+        self.platforms: Mapping[str, Mapping] = MappingProxyType(
+            {k: MappingProxyType(v) for k, v in platforms.items()}
+        )
+        self.entries: Tuple[Mapping, ...] = tuple(MappingProxyType(x) for x in entries)
+
+        by_name: Dict[str, List[Mapping]] = {}
+        by_type: Dict[str, Dict[str, Mapping]] = {}
+        all_models: Dict[str, Mapping] = {}
+        for x in self.entries:
+            by_name.setdefault(x["model_name"], []).append(x)
+            by_type.setdefault(x["model_type"], {})[x["model_name"]] = x
+            all_models[x["model_name"]] = x
+        self.by_name = MappingProxyType({k: tuple(v) for k, v in by_name.items()})
+        self.by_type = MappingProxyType({k: MappingProxyType(v) for k, v in by_type.items()})
+        self.all_models = MappingProxyType(all_models)
+        self.created = time.time()
+
+    def find(
+        self,
+        model_name: str = None,
+        model_type: str = None,
+        platform_name: str = None,
+    ) -> Dict[str, Dict]:
+        """
+        按条件查找模型，返回 {model_name: model_info}。同名模型以最后配置的为准。
+        返回值是副本，调用者可以随意修改。
+        """
+        if model_name is not None:
+            candidates = self.by_name.get(model_name, ())
+        elif platform_name is None:
+            if model_type is None:
+                return {k: dict(v) for k, v in self.all_models.items()}
+            return {k: dict(v) for k, v in self.by_type.get(model_type, {}).items()}
+        else:
+            candidates = self.entries
+
+        result = {}
+        for x in candidates:
+            if model_type is not None and x["model_type"] != model_type:
+                continue
+            if platform_name is not None and x["platform_name"] != platform_name:
+                continue
+            result[x["model_name"]] = dict(x)
+        return result
+
+    @classmethod
+    def build(
+        cls,
+        platform_configs: List,
+        detected: Dict[str, Dict[str, List[str]]],
+    ) -> "ModelCatalogSnapshot":
+        """
+        根据 MODEL_PLATFORMS 配置与已检测到的 xinference 模型列表构建快照。
+        detected: {xf_base_url: {model_type: [model_name, ...]}}
+        """
+        from chatchat.server.utils import get_base_url
+
+        platforms = {}
+        for config in platform_configs:
+            m = config.model_dump()
+            platforms[m["platform_name"]] = m
+
+        entries = []
+        for m in platforms.values():
+            m = dict(m)
+            if m.get("auto_detect_model"):
+                if not m.get("platform_type") == "xinference":  # TODO：当前仅支持 xf 自动检测模型
+                    logger.warning(f"auto_detect_model not supported for {m.get('platform_type')} yet")
+                    continue
+                xf_models = detected.get(get_base_url(m.get("api_base_url")), {})
+                for m_type in MODEL_TYPES:
+                    m[m_type] = xf_models.get(m_type, [])
+
+            for m_type in MODEL_TYPES:
+                models = m.get(m_type, [])
+                if models == "auto":
+                    logger.warning("you should not set `auto` without auto_detect_model=True")
+                    continue
+                for m_name in models or []:
+                    entries.append({
+                        "platform_name": m.get("platform_name"),
+                        "platform_type": m.get("platform_type"),
+                        "model_type": m_type.split("_")[0],
+                        "model_name": m_name,
+                        "api_base_url": m.get("api_base_url"),
+                        "api_key": m.get("api_key"),
+                        "api_proxy": m.get("api_proxy"),
+                    })
+        return cls(source=platform_configs, platforms=platforms, entries=entries)
+
+
+class ModelCatalog:
+    """
+    模型目录服务。
+    请求路径上只读取当前快照（字典查找），自动检测模型（xinference）在后台线程中定时刷新，
+    刷新完成后整体替换快照，不会阻塞请求。
+    仅在首次遇到某个自动检测平台时同步检测一次，以保证脚本等一次性任务也能拿到模型列表。
+    """
+
+    def __init__(self, refresh_interval: Optional[float] = None):
+        self._refresh_interval = refresh_interval
+        self._snapshot: Optional[ModelCatalogSnapshot] = None
+        self._detected: Dict[str, Dict[str, List[str]]] = {}
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def refresh_interval(self) -> float:
+        if self._refresh_interval is not None:
+            return self._refresh_interval
+        return Settings.model_settings.AUTO_DETECT_MODEL_INTERVAL
+
+    @property
+    def snapshot(self) -> ModelCatalogSnapshot:
+        snapshot = self._snapshot
+        platform_configs = Settings.model_settings.MODEL_PLATFORMS
+        if snapshot is None or snapshot.source is not platform_configs:
+            # 配置文件变化后只重建索引，已检测到的模型列表继续沿用
+            snapshot = self._rebuild(platform_configs)
+        return snapshot
+
+    def _auto_detect_urls(self, platform_configs: List) -> List[str]:
+        from chatchat.server.utils import get_base_url
+
+        return [
+            get_base_url(p.api_base_url)
+            for p in platform_configs
+            if p.auto_detect_model and p.platform_type == "xinference"
+        ]
+
+    def _rebuild(self, platform_configs: List) -> ModelCatalogSnapshot:
+        from chatchat.server.utils import list_xf_models
+
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is not None and snapshot.source is platform_configs:
+                return snapshot
+
+            xf_urls = self._auto_detect_urls(platform_configs)
+            for xf_url in xf_urls:
+                if xf_url not in self._detected:
+                    self._detected[xf_url] = list_xf_models(xf_url)
+            snapshot = ModelCatalogSnapshot.build(platform_configs, self._detected)
+            self._snapshot = snapshot
+            if xf_urls:
+                self.start()
+            return snapshot
+
+    def refresh(self) -> ModelCatalogSnapshot:
+        """
+        重新检测所有自动检测平台的模型并替换快照。检测失败时保留上次的结果。
+        """
+        from chatchat.server.utils import list_xf_models
+
+        platform_configs = Settings.model_settings.MODEL_PLATFORMS
+        detected = {}
+        for xf_url in self._auto_detect_urls(platform_configs):
+            if models := list_xf_models(xf_url):
+                detected[xf_url] = models
+            elif xf_url in self._detected:
+                detected[xf_url] = self._detected[xf_url]
+            else:
+                detected[xf_url] = {}
+
+        snapshot = ModelCatalogSnapshot.build(platform_configs, detected)
+        with self._lock:
+            self._detected = detected
+            self._snapshot = snapshot
+        return snapshot
+
+    def _run(self):
+        while not self._stop.wait(self.refresh_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning(f"failed to refresh model catalog: {e}")
+
+    def start(self):
+        """启动后台刷新线程（幂等）"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="ModelCatalogRefresher", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    def find(
+        self,
+        model_name: str = None,
+        model_type: str = None,
+        platform_name: str = None,
+    ) -> Dict[str, Dict]:
+        return self.snapshot.find(
+            model_name=model_name, model_type=model_type, platform_name=platform_name
+        )
+
+    def get_platforms(self, model_name: str) -> List[Dict]:
+        """返回提供该模型的所有平台配置的模型信息"""
+        return [dict(x) for x in self.snapshot.by_name.get(model_name, ())]
+
+
+model_catalog = ModelCatalog()
@@ -1,10 +1,14 @@
 import asyncio
+import copy
+import json
 import multiprocessing as mp
 import os
 import requests
 import socket
 import sys
+import threading
 from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from functools import lru_cache
 from pathlib import Path
 from urllib.parse import urlparse
 from typing import (
@@ -13,6 +17,7 @@ from typing import (
     Callable,
     Dict,
     Generator,
+    Iterable,
     List,
     Literal,
     Optional,
@@ -59,17 +64,14 @@ def get_config_platforms() -> Dict[str, Dict]:
     """
     获取配置的模型平台，会将 pydantic model 转换为字典。
     """
-    platforms = [m.model_dump() for m in Settings.model_settings.MODEL_PLATFORMS]
-    return {m["platform_name"]: m for m in platforms}
+    from chatchat.server.model_catalog import model_catalog
 
+    return {k: copy.deepcopy(dict(v)) for k, v in model_catalog.snapshot.platforms.items()}
 
-@cached(max_size=10, ttl=60, algorithm=CachingAlgorithmFlag.LRU)
-def detect_xf_models(xf_url: str) -> Dict[str, List[str]]:
+
+def list_xf_models(xf_url: str) -> Dict[str, List[str]]:
     '''
-    use cache for xinference model detecting to avoid:
-    - too many requests in short intervals
-    - multiple requests to one platform for every model
-    the cache will be invalidated after one minute
+    从 xinference 服务器获取模型列表（不使用缓存），连接失败时返回空字典。
     '''
     xf_model_type_maps = {
         "llm_models": lambda xf_models: [k for k, v in xf_models.items()
@@ -110,6 +112,17 @@ def detect_xf_models(xf_url: str) -> Dict[str, List[str]]:
     return models
 
 
+@cached(max_size=10, ttl=60, algorithm=CachingAlgorithmFlag.LRU)
+def detect_xf_models(xf_url: str) -> Dict[str, List[str]]:
+    '''
+    use cache for xinference model detecting to avoid:
+    - too many requests in short intervals
+    - multiple requests to one platform for every model
+    the cache will be invalidated after one minute
+    '''
+    return list_xf_models(xf_url)
+
+
 def get_config_models(
         model_name: str = None,
         model_type: Optional[Literal[
@@ -128,56 +141,11 @@ def get_config_models(
         "api_key": xx,
         "api_proxy": xx,
     }}
+    查询基于后台刷新的模型目录快照（见 model_catalog），不会在请求中访问 xinference 服务器。
     """
-    result = {}
-    if model_type is None:
-        model_types = [
-            "llm_models",
-            "embed_models",
-            "text2image_models",
-            "image2image_models",
-            "image2text_models",
-            "rerank_models",
-            "speech2text_models",
-            "text2speech_models",
-        ]
-    else:
-        model_types = [f"{model_type}_models"]
-
-    for m in list(get_config_platforms().values()):
-        if platform_name is not None and platform_name != m.get("platform_name"):
-            continue
-
-        if m.get("auto_detect_model"):
-            if not m.get("platform_type") == "xinference":  # TODO：当前仅支持 xf 自动检测模型
-                logger.warning(f"auto_detect_model not supported for {m.get('platform_type')} yet")
-                continue
-            xf_url = get_base_url(m.get("api_base_url"))
-            xf_models = detect_xf_models(xf_url)
-            for m_type in model_types:
-                # if m.get(m_type) != "auto":
-                #     continue
-                m[m_type] = xf_models.get(m_type, [])
-
-        for m_type in model_types:
-            models = m.get(m_type, [])
-            if models == "auto":
-                logger.warning("you should not set `auto` without auto_detect_model=True")
-                continue
-            elif not models:
-                continue
-            for m_name in models:
-                if model_name is None or model_name == m_name:
-                    result[m_name] = {
-                        "platform_name": m.get("platform_name"),
-                        "platform_type": m.get("platform_type"),
-                        "model_type": m_type.split("_")[0],
-                        "model_name": m_name,
-                        "api_base_url": m.get("api_base_url"),
-                        "api_key": m.get("api_key"),
-                        "api_proxy": m.get("api_proxy"),
-                    }
-    return result
+    from chatchat.server.model_catalog import model_catalog
+
+    return model_catalog.find(model_name=model_name, model_type=model_type, platform_name=platform_name)
 
 
 def get_model_info(
@@ -216,8 +184,16 @@ def get_default_embedding():
         return available_embeddings[0]
 
 
+@lru_cache(maxsize=64)
+def _cached_ChatOpenAI(**params: Any) -> ChatOpenAI:
+    """
+    按参数缓存的 ChatOpenAI 实例（不含 callbacks），同一模型的请求共用 openai 客户端及其连接池
+    """
+    return ChatOpenAI(**params)
+
+
 def get_ChatOpenAI(
-        model_name: str = get_default_llm(),
+        model_name: str = None,
         temperature: float = Settings.model_settings.TEMPERATURE,
         max_tokens: int = Settings.model_settings.MAX_TOKENS,
         streaming: bool = True,
@@ -226,11 +202,13 @@ def get_ChatOpenAI(
         local_wrap: bool = False,  # use local wrapped api
         **kwargs: Any,
 ) -> ChatOpenAI:
-    model_info = get_model_info(model_name)
+    """
+    返回的实例是缓存实例的浅拷贝，调用方可以修改 callbacks、streaming 等属性而不影响其它请求
+    """
+    model_name = model_name or get_default_llm()
     params = dict(
         streaming=streaming,
         verbose=verbose,
-        callbacks=callbacks,
         model_name=model_name,
         temperature=temperature,
         max_tokens=max_tokens,
@@ -248,12 +226,20 @@ def get_ChatOpenAI(
                 openai_api_key="EMPTY",
             )
         else:
+            model_info = get_model_info(model_name)
             params.update(
                 openai_api_base=model_info.get("api_base_url"),
                 openai_api_key=model_info.get("api_key"),
                 openai_proxy=model_info.get("api_proxy"),
             )
-        model = ChatOpenAI(**params)
+        try:
+            model = _cached_ChatOpenAI(**params)
+        except TypeError:  # 参数不可哈希，不使用缓存
+            model = ChatOpenAI(**params)
+        # 不经过校验直接复制字段，client/async_client 与缓存实例共用
+        model = ChatOpenAI.construct(
+            _fields_set=model.__fields_set__, **{**model.__dict__, "callbacks": callbacks}
+        )
     except Exception as e:
         logger.exception(f"failed to create ChatOpenAI for model: {model_name}.")
         model = None
@@ -430,6 +416,47 @@ class ListResponse(BaseResponse):
         }
 
 
+class PageResponse(ListResponse):
+    next_cursor: Optional[str] = Field(None, description="下一页的游标，为空表示没有更多数据")
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "code": 200,
+                "msg": "success",
+                "data": ["doc1.docx", "doc2.pdf", "doc3.txt"],
+                "next_cursor": "doc3.txt",
+            }
+        }
+
+
+def iter_pages(
+    fetch_page: Callable[[Optional[Any]], Tuple[List, Optional[Any]]],
+) -> Generator:
+    """
+    依次获取所有分页数据。fetch_page(cursor) 返回 (当前页数据, 下一页 cursor)。
+    """
+    cursor = None
+    while True:
+        items, cursor = fetch_page(cursor)
+        yield from items
+        if cursor is None:
+            break
+
+
+def ndjson_response(items: Iterable):
+    """
+    将可迭代对象以 NDJSON（每行一个 JSON）格式流式输出，用于批量导出。
+    """
+    from fastapi.responses import StreamingResponse
+
+    def gen():
+        for item in items:
+            yield json.dumps(item, ensure_ascii=False, default=str) + "\n"
+
+    return StreamingResponse(gen(), media_type="application/x-ndjson")
+
+
 class ChatMessage(BaseModel):
     question: str = Field(..., description="Question text")
     response: str = Field(..., description="Response text")
@@ -652,7 +679,7 @@ def get_prompt_template(type: str, name: str) -> Optional[str]:
 
     from chatchat.settings import Settings
 
-    return Settings.prompt_settings.model_dump().get(type, {}).get(name)
+    return getattr(Settings.prompt_settings, type, {}).get(name)
 
 
 def set_httpx_config(
@@ -880,16 +907,77 @@ def update_search_local_knowledgebase_tool():
         ]
 
 
-def get_tool(name: str = None) -> Union[BaseTool, Dict[str, BaseTool]]:
+# invalidate_tools_cache 每次调用递增 _tools_generation；缓存记录生成时的代数，
+# 生成期间发生的失效不会被覆盖，下次 get_tool 时会再次刷新。
+# 多进程模式下其它 worker 的失效通过 DATA_PATH 下的版本文件传递
+_tools_generation = 0
+_tools_cache_generation = None
+_tools_cache_settings = None
+_tools_cache_lock = threading.Lock()
+
+
+def _tools_stamp_path() -> Path:
+    return Settings.basic_settings.DATA_PATH / "tools_cache.stamp"
+
+
+def _current_tools_generation() -> Tuple[int, Optional[str]]:
+    if Settings.basic_settings.API_WORKERS <= 1:
+        return _tools_generation, None
+    try:
+        stamp = _tools_stamp_path().read_text()
+    except OSError:
+        stamp = ""
+    return _tools_generation, stamp
+
+
+def invalidate_tools_cache():
+    """
+    标记工具缓存失效，下次 get_tool 时重新生成本地知识库工具的描述。
+    在新增、删除知识库或修改知识库介绍后调用。
+    """
+    global _tools_generation
+    _tools_generation += 1
+    if Settings.basic_settings.API_WORKERS > 1:
+        import uuid
+
+        path = _tools_stamp_path()
+        tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex[:8]}")
+        try:
+            tmp.write_text(uuid.uuid4().hex)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning(f"failed to update tools cache stamp {path}: {e}")
+
+
+def reload_tools(reimport: bool = False) -> Dict[str, BaseTool]:
+    """
+    刷新工具注册表。reimport=True 时重新导入 tools_factory。
+    """
+    global _tools_cache_generation, _tools_cache_settings
     import importlib
 
     from chatchat.server.agent import tools_factory
+    from chatchat.server.agent.tools_factory import tools_registry
 
-    importlib.reload(tools_factory)
+    with _tools_cache_lock:
+        if reimport:
+            importlib.reload(tools_factory)
+        generation = _current_tools_generation()
+        tool_settings = Settings.tool_settings
+        update_search_local_knowledgebase_tool()
+        _tools_cache_settings = tool_settings
+        _tools_cache_generation = generation
+    return tools_registry._TOOLS_REGISTRY
 
+
+def get_tool(name: str = None) -> Union[BaseTool, Dict[str, BaseTool]]:
     from chatchat.server.agent.tools_factory import tools_registry
 
-    update_search_local_knowledgebase_tool()
+    if (
+        _tools_cache_generation != _current_tools_generation()
+        or _tools_cache_settings is not Settings.tool_settings
+    ):
+        reload_tools()
     if name is None:
         return tools_registry._TOOLS_REGISTRY
     else:
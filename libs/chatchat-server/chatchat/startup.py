@@ -67,7 +67,20 @@ def run_api_server(
         1024 * 1024 * 1024 * 3,
     )
     logging.config.dictConfig(logging_conf)  # type: ignore
-    uvicorn.run(app, host=host, port=port)
+    workers = Settings.basic_settings.API_WORKERS
+    if workers > 1:
+        # 多进程模式下 uvicorn 需要以导入字符串的方式在各子进程中创建 app
+        logger.info(f"Api server running with {workers} workers")
+        if started_event is not None:
+            started_event.set()
+        uvicorn.run(
+            "chatchat.server.api_server.server_app:app",
+            host=host,
+            port=port,
+            workers=workers,
+        )
+    else:
+        uvicorn.run(app, host=host, port=port)
 
 
 def run_webui(
@@ -207,6 +220,7 @@ def dump_server_info(after_start=False, args=None):
 
 
 async def start_main_server(args):
+    import secrets
     import signal
     import time
 
@@ -262,6 +276,26 @@ async def start_main_server(args):
     def process_count():
         return len(processes)
 
+    search_started = []
+    if args.api and Settings.kb_settings.SEARCH_WORKERS > 0:
+        from chatchat.server.knowledge_base.kb_cache.search_worker import (
+            AUTHKEY_ENV,
+            run_search_worker,
+        )
+
+        # 子进程继承环境变量，API 进程用它连接检索进程
+        os.environ.setdefault(AUTHKEY_ENV, secrets.token_hex(16))
+        for i in range(Settings.kb_settings.SEARCH_WORKERS):
+            started = manager.Event()
+            process = Process(
+                target=run_search_worker,
+                name=f"Search Worker {i}",
+                kwargs=dict(index=i, started_event=started),
+                daemon=True,
+            )
+            processes[f"search_worker_{i}"] = process
+            search_started.append(started)
+
     api_started = manager.Event()
     if args.api:
         process = Process(
@@ -289,6 +323,12 @@ async def start_main_server(args):
         processes["webui"] = process
 
     try:
+        for i, started in enumerate(search_started):
+            p = processes[f"search_worker_{i}"]
+            p.start()
+            p.name = f"{p.name} ({p.pid})"
+            started.wait()  # 等待检索进程启动完成
+
         if p := processes.get("api"):
             p.start()
             p.name = f"{p.name} ({p.pid})"
@@ -0,0 +1,101 @@
+"""
+数据库写入竞争基准：一个线程持续批量写入 file_doc（模拟知识库入库），
+同时多个线程写入聊天记录，统计聊天记录写入的延迟与失败次数。
+
+    python tests/benchmarks/bench_db_contention.py               # 对比 SQLite 默认设置与 SQLITE_PRAGMAS
+    python tests/benchmarks/bench_db_contention.py --uri mysql+pymysql://...
+"""
+import argparse
+import statistics
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from chatchat.server.db.base import Base, get_engine_options, set_sqlite_pragmas
+from chatchat.server.db.models.knowledge_file_model import FileDocModel
+from chatchat.server.db.models.message_model import MessageModel
+
+
+def run(uri: str, use_profile: bool, seconds: float, chat_threads: int, batch_size: int) -> dict:
+    if use_profile:
+        engine = create_engine(uri, **get_engine_options(uri))
+        set_sqlite_pragmas(engine)
+    else:
+        engine = create_engine(uri)
+    Base.metadata.create_all(bind=engine, tables=[FileDocModel.__table__, MessageModel.__table__])
+    Session = sessionmaker(bind=engine)
+    stop = threading.Event()
+    latencies, errors, written_docs = [], [0], [0]
+    lock = threading.Lock()
+
+    def ingest():
+        while not stop.is_set():
+            rows = [
+                {"kb_name": "bench", "file_name": "bench.txt", "kb_name_key": "bench",
+                 "file_name_key": "bench.txt", "doc_id": uuid.uuid4().hex, "meta_data": {}}
+                for _ in range(batch_size)
+            ]
+            try:
+                with Session() as session:
+                    session.execute(insert(FileDocModel), rows)
+                    session.commit()
+                written_docs[0] += batch_size
+            except Exception:
+                with lock:
+                    errors[0] += 1
+
+    def chat():
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                with Session() as session:
+                    session.add(MessageModel(id=uuid.uuid4().hex, conversation_id="bench",
+                                             chat_type="llm_chat", query="q", response="r"))
+                    session.commit()
+                with lock:
+                    latencies.append(time.perf_counter() - start)
+            except Exception:
+                with lock:
+                    errors[0] += 1
+
+    threads = [threading.Thread(target=ingest)] + [threading.Thread(target=chat) for _ in range(chat_threads)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    engine.dispose()
+
+    latencies.sort()
+    return {
+        "messages": len(latencies),
+        "docs": written_docs[0],
+        "errors": errors[0],
+        "p50_ms": round(statistics.median(latencies) * 1000, 2) if latencies else None,
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 2) if latencies else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--uri", default="", help="数据库 URI，默认使用临时 SQLite 文件")
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--chat-threads", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for use_profile in [False, True]:
+            uri = args.uri or f"sqlite:///{Path(tmp) / f'bench_{use_profile}.db'}"
+            result = run(uri, use_profile, args.seconds, args.chat_threads, args.batch_size)
+            print(f"{'profile' if use_profile else 'default'}: {result}")
+
+
+if __name__ == "__main__":
+    main()
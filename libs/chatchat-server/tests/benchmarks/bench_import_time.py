@@ -0,0 +1,126 @@
+"""
+API 服务启动导入耗时基准：在子进程中以 python -X importtime 导入服务入口，
+统计总耗时及耗时最多的包，导入了应延迟加载的模块时返回非 0。
+耗时与机器相关，默认只报告不检查；指定 --budget 或 --baseline 时才检查耗时：
+
+    python tests/benchmarks/bench_import_time.py                     # 默认导入 server_app，只检查延迟加载
+    python tests/benchmarks/bench_import_time.py --save-baseline import_time.json   # 在本机记录基准耗时
+    python tests/benchmarks/bench_import_time.py --baseline import_time.json        # 比基准慢 20% 以上时失败
+    python tests/benchmarks/bench_import_time.py --budget 3000 --top 30
+    python tests/benchmarks/bench_import_time.py -m chatchat.server.api_server.chat_routes
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+# 启动时不应导入的模块，它们只在对应功能第一次使用时才需要
+LAZY_MODULES = [
+    "langchain.agents",
+    "langchain_experimental",
+    "jieba",
+    "nltk",
+    "cv2",
+    "rapidocr_onnxruntime",
+    "rapidocr_paddle",
+    "unstructured",
+    "chatchat.server.agent.tools_factory",
+    "chatchat.server.agent.agent_factory",
+]
+
+
+def import_profile(module: str) -> List[Tuple[str, int, int]]:
+    """
+    返回 [(模块名, 自身耗时us, 累计耗时us)]
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"failed to import {module}:\n{proc.stderr[-2000:]}")
+
+    result = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, self_us, cumulative, name = [x.strip() for x in line.replace("import time:", "|").split("|")]
+        result.append((name, int(self_us), int(cumulative)))
+    return result
+
+
+def summarize(profile: List[Tuple[str, int, int]], module: str) -> Dict:
+    total = next(c for name, _, c in profile if name == module)
+    by_package = defaultdict(int)
+    for name, self_us, _ in profile:
+        by_package[name.split(".")[0]] += self_us
+    imported = {name for name, _, _ in profile}
+    lazy_imported = [
+        m for m in LAZY_MODULES if any(n == m or n.startswith(m + ".") for n in imported)
+    ]
+    return {
+        "total_ms": total / 1000,
+        "packages": sorted(by_package.items(), key=lambda x: -x[1]),
+        "lazy_imported": lazy_imported,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-m", "--module", default="chatchat.server.api_server.server_app")
+    parser.add_argument("--budget", type=float, default=None, help="导入总耗时预算（毫秒），不指定时不检查")
+    parser.add_argument("--baseline", default=None, help="基准耗时文件，耗时超出基准的 tolerance 比例时失败")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="相对基准允许增加的比例")
+    parser.add_argument("--save-baseline", default=None, help="将本次耗时保存为基准文件")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3, help="重复次数，取最小值以减少磁盘缓存的影响")
+    args = parser.parse_args()
+
+    results = [summarize(import_profile(args.module), args.module) for _ in range(args.repeat)]
+    result = min(results, key=lambda x: x["total_ms"])
+
+    budget = args.budget
+    if args.baseline and os.path.isfile(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f).get(args.module)
+        if baseline is not None:
+            relative = baseline * (1 + args.tolerance)
+            budget = relative if budget is None else min(budget, relative)
+            print(f"baseline {baseline:.0f}ms, tolerance {args.tolerance:.0%}")
+        else:
+            print(f"no baseline for {args.module} in {args.baseline}")
+
+    if budget is None:
+        print(f"import {args.module}: {result['total_ms']:.0f}ms")
+    else:
+        print(f"import {args.module}: {result['total_ms']:.0f}ms (budget {budget:.0f}ms)")
+    print(f"{'package':<40}{'self ms':>10}")
+    for name, self_us in result["packages"][: args.top]:
+        print(f"{name:<40}{self_us / 1000:>10.1f}")
+
+    if args.save_baseline:
+        data = {}
+        if os.path.isfile(args.save_baseline):
+            with open(args.save_baseline, encoding="utf-8") as f:
+                data = json.load(f)
+        data[args.module] = round(result["total_ms"])
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        print(f"baseline saved to {args.save_baseline}")
+
+    failed = False
+    if budget is not None and result["total_ms"] > budget:
+        print(f"FAIL: import time exceeds budget by {result['total_ms'] - budget:.0f}ms")
+        failed = True
+    if result["lazy_imported"]:
+        print(f"FAIL: modules should be imported lazily: {', '.join(result['lazy_imported'])}")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import asyncio
+from uuid import uuid4
+
+from chatchat.server.callback_handler.agent_callback_handler import (
+    AgentExecutorAsyncIteratorCallbackHandler,
+    AgentStatus,
+    StopSequenceMatcher,
+)
+
+
+def test_stop_sequence_matcher():
+    matcher = StopSequenceMatcher(["\nAction:", "<|observation|>"])
+    assert matcher.feed("hello") == "hello"
+    # 可能是停止序列开头的部分先暂存
+    assert matcher.feed(" world\n") == " world"
+    assert matcher.feed("Act") == ""
+    assert matcher.feed("ion: search") == ""
+    assert matcher.stopped
+    assert matcher.feed("more") is None
+
+    matcher.reset()
+    assert matcher.feed("a\nAc") == "a"
+    assert matcher.feed("e b") == "\nAce b"
+    assert matcher.feed("<|obs") == ""
+    assert matcher.flush() == "<|obs"
+
+
+def test_handler_events_with_backpressure():
+    async def run():
+        handler = AgentExecutorAsyncIteratorCallbackHandler(maxsize=2)
+
+        async def produce():
+            await handler.on_llm_start({}, [])
+            for token in ["Thought", " done", "\nAct", "ion: x", "ignored"]:
+                await handler.on_llm_new_token(token)
+            handler.done.set()
+
+        task = asyncio.create_task(produce())
+        await asyncio.sleep(0.01)
+        # 队列已满，生产者在等待消费
+        assert handler.queue.full() and not task.done()
+
+        events = [e async for e in handler.aiter()]
+        await task
+        return events
+
+    events = asyncio.run(run())
+    assert [e.status for e in events] == [AgentStatus.llm_start] + [AgentStatus.llm_new_token] * 3
+    assert "".join(e.text for e in events) == "Thought done\n"
+
+
+def test_nested_chain_end_does_not_stop_iteration():
+    async def run():
+        handler = AgentExecutorAsyncIteratorCallbackHandler(maxsize=2)
+
+        async def produce():
+            for i in range(5):
+                await handler.on_llm_start({}, [])
+                await handler.on_chain_end({}, run_id=uuid4())
+            handler.done.set()
+
+        task = asyncio.create_task(produce())
+        events = [e async for e in handler.aiter()]
+        await asyncio.wait_for(task, 1)
+        return events
+
+    assert len(asyncio.run(run())) == 5
@@ -0,0 +1,98 @@
+import os
+
+from langchain.docstore.document import Document
+from langchain.vectorstores.faiss import FAISS
+from langchain_community.embeddings import FakeEmbeddings
+
+from chatchat.settings import Settings
+from chatchat.server.knowledge_base.kb_cache import faiss_cache
+from chatchat.server.knowledge_base.kb_cache.faiss_cache import (
+    KBFaissPool,
+    vs_file_lock,
+    vs_version,
+)
+
+
+def _setup(tmp_path, monkeypatch):
+    embeddings = FakeEmbeddings(size=16)
+    monkeypatch.setattr(faiss_cache, "get_Embeddings", lambda embed_model=None: embeddings)
+    monkeypatch.setattr(
+        faiss_cache, "get_vs_path", lambda kb_name, vector_name: str(tmp_path / kb_name / vector_name)
+    )
+    vs_path = str(tmp_path / "kb" / "vs")
+    docs = [Document(page_content=f"text {i}") for i in range(3)]
+    FAISS.from_documents(docs, embeddings, normalize_L2=True).save_local(vs_path)
+    return vs_path
+
+
+def test_reload_after_save_by_other_pool(tmp_path, monkeypatch):
+    vs_path = _setup(tmp_path, monkeypatch)
+    # 两个缓存池模拟两个 API 进程
+    pool_a, pool_b = KBFaissPool(), KBFaissPool()
+    assert pool_b.load_vector_store("kb", "vs", embed_model="fake").docs_count() == 3
+
+    with vs_file_lock(vs_path):
+        item = pool_a.load_vector_store("kb", "vs", embed_model="fake", writable=True)
+        with item.acquire() as vs:
+            vs.add_documents([Document(page_content="new")])
+        item.save(vs_path)
+    assert item.version == vs_version(vs_path)
+    # 保存时不留下临时目录
+    assert sorted(os.listdir(vs_path)) == ["index.faiss", "index.pkl"]
+
+    assert pool_b.load_vector_store("kb", "vs", embed_model="fake").docs_count() == 4
+    # 本进程保存后不需要重新加载
+    assert pool_a.load_vector_store("kb", "vs", embed_model="fake") is item
+    assert item.obj is pool_a.get(("kb", "vs")).obj
+
+
+def test_mmap_reload_for_write(tmp_path, monkeypatch):
+    import faiss
+
+    vs_path = _setup(tmp_path, monkeypatch)
+    monkeypatch.setattr(Settings.kb_settings, "FAISS_MMAP", True)
+    pool = KBFaissPool()
+    item = pool.load_vector_store("kb", "vs", embed_model="fake")
+    assert item.read_only == hasattr(faiss, "IO_FLAG_MMAP_IFC")
+    with item.acquire() as vs:
+        assert len(vs.similarity_search("text 1", k=2)) == 2
+
+    with vs_file_lock(vs_path):
+        item = pool.load_vector_store("kb", "vs", embed_model="fake", writable=True)
+        assert not item.read_only
+        with item.acquire() as vs:
+            vs.add_documents([Document(page_content="new")])
+        item.save(vs_path)
+    assert item.docs_count() == 4
+
+
+def test_merge_unsaved_changes_on_reload(tmp_path, monkeypatch):
+    vs_path = _setup(tmp_path, monkeypatch)
+    pool_a, pool_b = KBFaissPool(), KBFaissPool()
+
+    # 进程 A 批量写入，暂不保存
+    with vs_file_lock(vs_path):
+        item_a = pool_a.load_vector_store("kb", "vs", embed_model="fake", writable=True)
+        with item_a.acquire() as vs:
+            removed = list(vs.docstore._dict)[0]
+            item_a.delete([removed])
+            added = item_a.add_embeddings(["a"], vs.embeddings.embed_documents(["a"]), [{}])
+    assert item_a.dirty
+
+    # 进程 B 在此期间保存了同一向量库
+    with vs_file_lock(vs_path):
+        item_b = pool_b.load_vector_store("kb", "vs", embed_model="fake", writable=True)
+        with item_b.acquire():
+            item_b.add_embeddings(["b"], [[0.1] * 16], [{}])
+        item_b.save(vs_path)
+
+    # A 重新加载时合并未保存的修改，保存后两者的修改都在磁盘上
+    with vs_file_lock(vs_path):
+        item_a = pool_a.load_vector_store("kb", "vs", embed_model="fake", writable=True)
+        with item_a.acquire() as vs:
+            texts = sorted(d.page_content for d in vs.docstore._dict.values())
+            assert removed not in vs.docstore._dict and added[0] in vs.docstore._dict
+        item_a.save(vs_path)
+    assert len(texts) == 4 and texts[:2] == ["a", "b"]
+    assert not item_a.dirty
+    assert pool_b.load_vector_store("kb", "vs", embed_model="fake").docs_count() == 4
@@ -0,0 +1,56 @@
+from chatchat.server.knowledge_base.kb_service import base
+from chatchat.server.knowledge_base.kb_service.base import (
+    get_kb_file_details_page,
+    iter_kb_file_details,
+)
+
+in_db = ["B.txt", "c.txt", "É.txt", "中文.md"]
+in_folder = ["a.txt", "c.txt", "d.txt", "中文.md", "😀.txt"]
+
+
+def _setup(monkeypatch):
+    walks = []
+
+    def list_files_from_folder(kb_name):
+        walks.append(kb_name)
+        return in_folder
+
+    def list_file_details_from_db(kb_name, cursor=None, limit=None):
+        keys = sorted(x for x in in_db if cursor is None or x.lower() > cursor)
+        return [{"file_name": x} for x in keys[:limit]]
+
+    monkeypatch.setattr(base, "list_files_from_folder", list_files_from_folder)
+    monkeypatch.setattr(base, "list_file_details_from_db", list_file_details_from_db)
+    monkeypatch.setattr(base.KBServiceFactory, "get_service_by_name", lambda kb_name: object())
+    return walks
+
+
+def test_iter_kb_file_details_merges_folder_and_db(monkeypatch):
+    walks = _setup(monkeypatch)
+
+    details = list(iter_kb_file_details("kb", page_size=2))
+    assert [d["file_name"] for d in details] == [
+        "a.txt", "B.txt", "c.txt", "d.txt", "É.txt", "中文.md", "😀.txt"
+    ]
+    assert [(d["in_db"], d["in_folder"]) for d in details] == [
+        (False, True), (True, False), (True, True), (False, True),
+        (True, False), (True, True), (False, True),
+    ]
+    assert [d["No"] for d in details] == list(range(1, 8))
+    # 知识库目录只遍历一次
+    assert walks == ["kb"]
+
+
+def test_kb_file_details_pages(monkeypatch):
+    walks = _setup(monkeypatch)
+    details, cursor = [], None
+    while True:
+        page, cursor = get_kb_file_details_page("kb", cursor=cursor, limit=3)
+        details.extend(page)
+        if cursor is None:
+            break
+
+    assert [d["file_name"] for d in details] == [d["file_name"] for d in iter_kb_file_details("kb")]
+    assert [d["No"] for d in details] == list(range(1, 8))
+    # 翻页时复用第一页遍历的目录（iter_kb_file_details 另外遍历一次）
+    assert walks == ["kb", "kb"]
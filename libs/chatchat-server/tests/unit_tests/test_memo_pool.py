@@ -0,0 +1,64 @@
+import os
+import time
+
+from langchain.docstore.document import Document
+from langchain_community.embeddings import FakeEmbeddings
+
+from chatchat.settings import Settings
+from chatchat.server.knowledge_base.kb_cache import faiss_cache
+from chatchat.server.knowledge_base.kb_cache.faiss_cache import MemoFaissPool
+
+
+def _setup(tmp_path, monkeypatch, **settings):
+    embeddings = FakeEmbeddings(size=16)
+    monkeypatch.setattr(faiss_cache, "get_Embeddings", lambda embed_model=None: embeddings)
+    # BASE_TEMP_DIR 是 cached_property，结果保存在实例的 __dict__ 中
+    monkeypatch.setitem(Settings.basic_settings.__dict__, "BASE_TEMP_DIR", tmp_path)
+    monkeypatch.setattr(Settings.kb_settings, "MEMO_SWEEP_INTERVAL", 0)
+    for k, v in settings.items():
+        monkeypatch.setattr(Settings.kb_settings, k, v)
+
+
+def _upload(pool: MemoFaissPool, tmp_path, kb_name: str, n: int = 3):
+    os.makedirs(tmp_path / kb_name)
+    (tmp_path / kb_name / "a.txt").write_text("x" * 100)
+    with pool.load_vector_store(kb_name).acquire() as vs:
+        vs.add_documents([Document(page_content=f"{kb_name} {i}" * 100) for i in range(n)])
+
+
+def test_memo_pool_ttl_and_orphans(tmp_path, monkeypatch):
+    _setup(tmp_path, monkeypatch, MEMO_VS_TTL=60, MEMO_VS_MAX_MEMORY_MB=0)
+    pool = MemoFaissPool(cache_num=2)
+    old, new, orphan = "a" * 32, "b" * 32, "c" * 32
+    _upload(pool, tmp_path, old)
+    _upload(pool, tmp_path, new)
+    os.makedirs(tmp_path / orphan)
+    os.makedirs(tmp_path / "openai_files")
+    past = time.time() - 3600
+    os.utime(tmp_path / orphan, (past, past))
+    pool.get(old).last_access = past
+
+    pool.sweep()
+    assert pool.keys() == [new]
+    assert sorted(os.listdir(tmp_path)) == [new, "openai_files"]
+    assert pool.metrics["evicted_ttl"] == 1 and pool.metrics["removed_dirs"] == 2
+
+    # 超出数量时释放的向量库也删除临时目录
+    _upload(pool, tmp_path, "d" * 32)
+    _upload(pool, tmp_path, "e" * 32)
+    assert pool.keys() == ["d" * 32, "e" * 32]
+    assert not os.path.exists(tmp_path / new)
+    assert pool.stats()["evicted_count"] == 1
+
+
+def test_memo_pool_memory_limit(tmp_path, monkeypatch):
+    _setup(tmp_path, monkeypatch, MEMO_VS_TTL=0, MEMO_VS_MAX_MEMORY_MB=1)
+    pool = MemoFaissPool()
+    names = [f"{i:032x}" for i in range(3)]
+    for name in names:
+        _upload(pool, tmp_path, name, n=200)  # 每个约 0.75MB
+        pool.check_memory(keep=name)
+
+    assert pool.keys() == names[-1:]
+    assert pool.memory_size() <= 1024 * 1024
+    assert pool.metrics["evicted_memory"] == 2
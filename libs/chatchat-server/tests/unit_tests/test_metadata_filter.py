@@ -0,0 +1,48 @@
+from langchain.docstore.document import Document
+from langchain.vectorstores.faiss import FAISS
+from langchain_community.embeddings import FakeEmbeddings
+
+from chatchat.server.file_rag.retrievers.ensemble import FaissSelectorRetriever
+from chatchat.server.knowledge_base.kb_cache.faiss_cache import ThreadSafeFaiss
+from chatchat.server.knowledge_base.kb_service.base import metadata_value_candidates
+
+
+def _faiss():
+    docs = [
+        Document(page_content=f"text {i}", metadata={"source": f"f{i % 3}.txt", "page": i})
+        for i in range(30)
+    ]
+    return FAISS.from_documents(docs, FakeEmbeddings(size=16), normalize_L2=True)
+
+
+def test_faiss_metadata_positions():
+    vs = _faiss()
+    faiss_vs = ThreadSafeFaiss("test", vs)
+
+    assert faiss_vs.metadata_positions({"source": "f1.txt"}) == list(range(1, 30, 3))
+    assert faiss_vs.metadata_positions({"source": "f1.txt", "page": "4"}) == [4]
+    assert faiss_vs.metadata_positions({"source": "missing"}) == []
+
+    # 删除文档后位置会重排，倒排索引需要重建
+    vs.delete([vs.index_to_docstore_id[0]])
+    assert faiss_vs.metadata_positions({"source": "f1.txt"}) == list(range(0, 29, 3))
+
+
+def test_faiss_selector_retriever():
+    vs = _faiss()
+    positions = ThreadSafeFaiss("test", vs).metadata_positions({"source": "f2.txt"})
+    retriever = FaissSelectorRetriever(vectorstore=vs, positions=positions, k=5)
+
+    docs = retriever.get_relevant_documents("text 1")
+    assert len(docs) == 5
+    assert all(d.metadata["source"] == "f2.txt" for d in docs)
+
+
+def test_metadata_value_candidates():
+    assert metadata_value_candidates("4") == ["4", 4]
+    assert metadata_value_candidates(4) == ["4", 4]
+    assert metadata_value_candidates("4.5") == ["4.5", 4.5]
+    assert metadata_value_candidates("True") == ["True", True]
+    # 字符串形式不同的数值不算匹配
+    assert metadata_value_candidates("04") == ["04"]
+    assert metadata_value_candidates("f1.txt") == ["f1.txt"]
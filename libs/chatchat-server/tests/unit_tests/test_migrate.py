@@ -0,0 +1,22 @@
+from sqlalchemy import create_engine, text
+
+from chatchat.server.knowledge_base import migrate
+
+
+def test_migrate_backfills_lower_keys_once(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'info.db'}")
+    monkeypatch.setattr(migrate, "engine", engine)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE knowledge_base (id INTEGER PRIMARY KEY, kb_name VARCHAR(50))"))
+        conn.execute(text("INSERT INTO knowledge_base (kb_name) VALUES ('Samples'), ('ÄBC知识库')"))
+
+    migrate.migrate_tables()
+    with engine.begin() as conn:
+        keys = [r[0] for r in conn.execute(text("SELECT kb_name_key FROM knowledge_base ORDER BY id"))]
+        assert keys == ["samples", "äbc知识库"]
+        # 已添加列后不再回填
+        conn.execute(text("INSERT INTO knowledge_base (kb_name) VALUES ('New')"))
+
+    migrate.migrate_tables()
+    with engine.begin() as conn:
+        assert conn.execute(text("SELECT kb_name_key FROM knowledge_base WHERE id = 3")).scalar() is None
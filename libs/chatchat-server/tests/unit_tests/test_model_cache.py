@@ -0,0 +1,14 @@
+from chatchat.server.utils import get_ChatOpenAI
+
+
+def test_chat_openai_shares_client():
+    a = get_ChatOpenAI("test-model", temperature=0.5, max_tokens=100, callbacks=["cb"], local_wrap=True)
+    b = get_ChatOpenAI("test-model", temperature=0.5, max_tokens=100, callbacks=[], local_wrap=True)
+
+    assert a is not b
+    assert a.async_client is b.async_client
+    assert a.callbacks == ["cb"] and b.callbacks == []
+    # 修改返回的实例不影响其它请求
+    a.streaming = False
+    assert b.streaming
+
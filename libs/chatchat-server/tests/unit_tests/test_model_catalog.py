@@ -0,0 +1,29 @@
+from chatchat.server.model_catalog import ModelCatalogSnapshot
+from chatchat.settings import PlatformConfig
+
+
+def _platforms():
+    return [
+        PlatformConfig(platform_name="a", platform_type="openai",
+                       llm_models=["m1", "m2"], embed_models=["e1"]),
+        PlatformConfig(platform_name="b", platform_type="openai",
+                       llm_models=["m2"]),
+        PlatformConfig(platform_name="xf", platform_type="xinference",
+                       api_base_url="http://127.0.0.1:9997/v1", auto_detect_model=True),
+    ]
+
+
+def test_model_catalog_snapshot():
+    detected = {"http://127.0.0.1:9997": {"llm_models": ["x1"], "rerank_models": ["r1"]}}
+    snap = ModelCatalogSnapshot.build(_platforms(), detected)
+
+    assert list(snap.find(model_type="llm")) == ["m1", "m2", "x1"]
+    assert snap.find(model_name="m2")["m2"]["platform_name"] == "b"
+    assert snap.find(model_name="m2", platform_name="a")["m2"]["platform_name"] == "a"
+    assert list(snap.find(platform_name="xf")) == ["x1", "r1"]
+    assert [x["platform_name"] for x in snap.by_name["m2"]] == ["a", "b"]
+    assert snap.find(model_name="missing") == {}
+
+    info = snap.find(model_name="e1")["e1"]
+    info["api_key"] = "changed"
+    assert snap.find(model_name="e1")["e1"]["api_key"] != "changed"
@@ -0,0 +1,41 @@
+import random
+import threading
+import time
+
+import pytest
+
+# document_loaders 包导入时需要 cv2
+pytest.importorskip("cv2")
+
+from chatchat.server.file_rag.document_loaders.ocr import OCRPool, join_ocr_parts
+
+
+class FakeOCR:
+    created = 0
+
+    def __init__(self):
+        FakeOCR.created += 1
+        self.busy = threading.Lock()
+
+    def __call__(self, img):
+        # 同一个引擎不会被多个线程同时使用
+        assert self.busy.acquire(blocking=False)
+        time.sleep(random.random() / 100)
+        self.busy.release()
+        return [[None, f"ocr {img}", 1.0]], None
+
+
+def test_ocr_pool_reuses_engines_and_keeps_order():
+    FakeOCR.created = 0
+    pool = OCRPool(size=3, engine_factory=FakeOCR)
+
+    parts = []
+    for i in range(20):
+        parts.append(f"page {i}\n")
+        parts.append(pool.submit(lambda x: x * 2, i))
+    text = join_ocr_parts(parts)
+
+    assert text == "".join(f"page {i}\nocr {i * 2}" for i in range(20))
+    assert FakeOCR.created <= 3
+    assert pool(5) == "ocr 5"
+    assert FakeOCR.created <= 3
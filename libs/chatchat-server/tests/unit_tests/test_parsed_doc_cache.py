@@ -0,0 +1,80 @@
+import os
+import time
+
+from langchain.docstore.document import Document
+
+from chatchat.settings import Settings
+from chatchat.server.knowledge_base import utils
+from chatchat.server.knowledge_base.parsed_doc_cache import ParsedDocCache
+from chatchat.server.knowledge_base.utils import KnowledgeFile
+
+
+class FakeLoader:
+    loaded = 0
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+
+    def load(self):
+        FakeLoader.loaded += 1
+        text = open(self.file_path, encoding="utf-8").read()
+        return [Document(page_content=text, metadata={"source": self.file_path, "page": 1})]
+
+
+def test_file2docs_uses_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(Settings.basic_settings, "KB_ROOT_PATH", str(tmp_path / "kb"))
+    monkeypatch.setitem(Settings.basic_settings.__dict__, "PARSED_DOCS_CACHE_DIR", tmp_path / "cache")
+    monkeypatch.setattr(Settings.kb_settings, "PARSED_DOCS_CACHE_MB", 10)
+    monkeypatch.setattr(utils, "get_loader", lambda loader_name, file_path, loader_kwargs: FakeLoader(file_path))
+    FakeLoader.loaded = 0
+    for kb in ["kb1", "kb2"]:
+        os.makedirs(tmp_path / "kb" / kb / "content")
+        (tmp_path / "kb" / kb / "content" / "a.pdf").write_text("内容", encoding="utf-8")
+
+    docs = KnowledgeFile("a.pdf", "kb1").file2docs()
+    assert FakeLoader.loaded == 1
+    assert len(os.listdir(tmp_path / "cache")) == 1
+
+    # 内容相同的文件直接读取缓存，文件路径替换为当前文件
+    kb_file = KnowledgeFile("a.pdf", "kb2")
+    cached = kb_file.file2docs(refresh=True)
+    assert FakeLoader.loaded == 1
+    assert cached[0].page_content == docs[0].page_content == "内容"
+    assert cached[0].metadata == {"source": kb_file.filepath, "page": 1}
+
+    # 内容改变后重新解析
+    with open(kb_file.filepath, "w", encoding="utf-8") as f:
+        f.write("新内容")
+    assert kb_file.file2docs(refresh=True)[0].page_content == "新内容"
+    assert FakeLoader.loaded == 2
+
+
+def test_cache_eviction(tmp_path):
+    cache = ParsedDocCache(cache_dir=str(tmp_path), max_size_mb=1)
+    text = os.urandom(256 * 1024).hex()  # 压缩后约 290KB
+    keys = [cache.make_key(f"{i}", "PDFLoader") for i in range(5)]
+    for i, key in enumerate(keys):
+        assert cache.put(key, "a.pdf", [Document(page_content=text + str(i))])
+        past = time.time() - 100 + i
+        os.utime(cache._path(key), (past, past))
+        if i == 2:
+            # 读取过的缓存最后删除
+            assert cache.get(keys[0], "a.pdf")[0].page_content == text + "0"
+
+    assert cache.get(keys[1], "a.pdf") is None and cache.get(keys[2], "a.pdf") is None
+    assert cache.get(keys[4], "a.pdf") is not None
+    assert sum(f.stat().st_size for f in tmp_path.iterdir()) <= 1024 * 1024
+
+    # 无法序列化的 metadata 不缓存
+    assert not cache.put("x", "a.pdf", [Document(page_content="", metadata={"o": object()})])
+
+
+def test_temp_files_not_cached(tmp_path, monkeypatch):
+    monkeypatch.setattr(Settings.basic_settings, "KB_ROOT_PATH", str(tmp_path / "kb"))
+    monkeypatch.setitem(Settings.basic_settings.__dict__, "PARSED_DOCS_CACHE_DIR", tmp_path / "cache")
+    monkeypatch.setattr(utils, "get_loader", lambda loader_name, file_path, loader_kwargs: FakeLoader(file_path))
+    os.makedirs(tmp_path / "kb" / "temp" / "content")
+    (tmp_path / "kb" / "temp" / "content" / "a.pdf").write_text("内容", encoding="utf-8")
+
+    KnowledgeFile("a.pdf", "temp").file2docs()
+    assert not os.path.exists(tmp_path / "cache")
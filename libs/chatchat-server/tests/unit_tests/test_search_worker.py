@@ -0,0 +1,66 @@
+import os
+import stat
+import threading
+
+import pytest
+from langchain.docstore.document import Document
+from langchain.vectorstores.faiss import FAISS
+from langchain_community.embeddings import FakeEmbeddings
+
+from chatchat.server.knowledge_base.kb_cache import faiss_cache
+from chatchat.settings import Settings
+from chatchat.server.knowledge_base.kb_cache.search_worker import (
+    AUTHKEY_ENV,
+    SearchWorkerClient,
+    get_search_client,
+    serve,
+    worker_address,
+)
+
+
+@pytest.mark.skipif(os.name == "nt", reason="使用 unix socket")
+def test_search_through_worker(tmp_path, monkeypatch):
+    embeddings = FakeEmbeddings(size=16)
+    monkeypatch.setattr(faiss_cache, "get_Embeddings", lambda embed_model=None: embeddings)
+    monkeypatch.setattr(
+        faiss_cache, "get_vs_path", lambda kb_name, vector_name: str(tmp_path / kb_name / vector_name)
+    )
+    docs = [Document(page_content=f"text {i}", metadata={"source": f"f{i % 2}.txt"}) for i in range(6)]
+    FAISS.from_documents(docs, embeddings, normalize_L2=True).save_local(str(tmp_path / "worker_kb" / "vs"))
+
+    address = str(tmp_path / "search.sock")
+    started = threading.Event()
+    threading.Thread(target=serve, args=(address, started), daemon=True).start()
+    assert started.wait(5)
+
+    client = SearchWorkerClient(1, addresses=[address])
+    assert client.call(0, "ping") == os.getpid()
+    result = client.search(
+        "worker_kb", "vs", "fake", "text 1", top_k=2, score_threshold=2.0, metadata={"source": "f1.txt"}
+    )
+    assert result and all(d.metadata["source"] == "f1.txt" for d in result)
+
+    # 检索进程中的异常传回调用方，连接仍可继续使用
+    with pytest.raises(RuntimeError):
+        client.call(0, "unknown")
+    assert client.call(0, "ping") == os.getpid()
+
+    # 同一个向量库总是发往同一个检索进程
+    client = SearchWorkerClient(4, addresses=[address] * 4)
+    assert len({client.worker_index("kb", "vs") for _ in range(10)}) == 1
+
+
+def test_no_client_without_authkey(monkeypatch):
+    monkeypatch.setattr(Settings.kb_settings, "SEARCH_WORKERS", 2)
+    monkeypatch.delenv(AUTHKEY_ENV, raising=False)
+    assert get_search_client() is None
+
+    monkeypatch.setenv(AUTHKEY_ENV, "secret")
+    assert get_search_client().num_workers == 2
+
+
+@pytest.mark.skipif(os.name == "nt", reason="使用 unix socket")
+def test_worker_address_is_private():
+    path = os.path.dirname(worker_address(0))
+    st = os.stat(path)
+    assert st.st_uid == os.getuid() and stat.S_IMODE(st.st_mode) == 0o700
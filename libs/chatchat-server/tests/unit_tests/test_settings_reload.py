@@ -0,0 +1,27 @@
+from chatchat.pydantic_settings_file import BaseFileSettings, SettingsConfigDict, settings_property, settings_watcher
+
+
+def test_settings_reload(tmp_path):
+    yaml_file = tmp_path / "demo_settings.yaml"
+
+    class DemoSettings(BaseFileSettings):
+        model_config = SettingsConfigDict(yaml_file=yaml_file)
+        NAME: str = "default"
+
+    class Container:
+        demo: DemoSettings = settings_property(DemoSettings())
+
+    c = Container()
+    old = c.demo
+    assert old.NAME == "default"
+    assert c.demo is old
+
+    yaml_file.write_text("NAME: changed\n", encoding="utf-8")
+    settings_watcher.check()
+    assert c.demo.NAME == "changed"
+    assert old.NAME == "default"
+
+    c.demo.auto_reload = False
+    yaml_file.write_text("NAME: ignored\n", encoding="utf-8")
+    settings_watcher.check()
+    assert c.demo.NAME == "changed"
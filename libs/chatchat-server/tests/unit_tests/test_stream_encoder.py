@@ -0,0 +1,63 @@
+import asyncio
+import json
+
+from chatchat.server.api_server.api_schemas import OpenAIChatOutput
+from chatchat.server.chat.stream_encoder import ChatStreamEncoder, coalesce
+
+
+def test_token_frame_matches_output():
+    encoder = ChatStreamEncoder(model="glm4-chat", message_id="m1")
+    for text in ["你好", 'a "quoted"\n line', ""]:
+        frame = json.loads(encoder.token(text, status=2))
+        expected = OpenAIChatOutput(
+            id=encoder.id,
+            created=encoder.created,
+            object="chat.completion.chunk",
+            content=text,
+            role="assistant",
+            model="glm4-chat",
+            message_id="m1",
+            status=2,
+        ).model_dump()
+        assert frame == expected
+
+    # 同一次响应的所有帧使用同一个 id
+    assert json.loads(encoder.encode(docs=["d"]))["id"] == encoder.id
+
+
+async def _tokens(items, delay=0):
+    for x in items:
+        if delay:
+            await asyncio.sleep(delay)
+        yield x
+
+
+async def _collect(agen):
+    return [x async for x in agen]
+
+
+def test_coalesce():
+    tokens = list("abcdefg")
+    assert asyncio.run(_collect(coalesce(_tokens(tokens), 0, 0))) == tokens
+    assert asyncio.run(_collect(coalesce(_tokens(tokens), 0, 3))) == ["abc", "def", "g"]
+    # 时间窗口足够长时全部合并为一帧
+    assert asyncio.run(_collect(coalesce(_tokens(tokens, 0.001), 1000, 0))) == ["abcdefg"]
+
+    # 不可合并的元素打断合并并原样输出
+    result = asyncio.run(
+        _collect(coalesce(_tokens(["a", "b", 1, "c"]), 0, 10, can_merge=lambda x: isinstance(x, str)))
+    )
+    assert result == ["ab", 1, "c"]
+
+
+def test_coalesce_flushes_on_stall():
+    async def run():
+        async def slow():
+            yield "a"
+            yield "b"
+            await asyncio.sleep(0.2)
+            yield "c"
+
+        return await _collect(coalesce(slow(), 20, 0))
+
+    assert asyncio.run(run()) == ["ab", "c"]
@@ -0,0 +1,20 @@
+from chatchat.settings import Settings
+from chatchat.server import utils
+
+
+def test_tools_cache_invalidated_by_other_worker(tmp_path, monkeypatch):
+    monkeypatch.setitem(Settings.basic_settings.__dict__, "DATA_PATH", tmp_path)
+    monkeypatch.setattr(Settings.basic_settings, "API_WORKERS", 2)
+
+    generation = utils._current_tools_generation()
+    utils.invalidate_tools_cache()
+    assert (tmp_path / "tools_cache.stamp").exists()
+    after = utils._current_tools_generation()
+    assert after != generation
+
+    # 其它 worker 使缓存失效时只修改了版本文件
+    (tmp_path / "tools_cache.stamp").write_text("other worker")
+    assert utils._current_tools_generation() not in (generation, after)
+
+    monkeypatch.setattr(Settings.basic_settings, "API_WORKERS", 1)
+    assert utils._current_tools_generation()[1] is None
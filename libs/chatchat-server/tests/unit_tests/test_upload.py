@@ -0,0 +1,94 @@
+import hashlib
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import UploadFile
+
+from chatchat.settings import Settings
+from chatchat.server.knowledge_base import utils
+from chatchat.server.knowledge_base.kb_doc_api import upload_chunk, upload_status
+from chatchat.server.knowledge_base.utils import (
+    cached_file_hash,
+    file_hash,
+    place_uploaded_file,
+    save_to_temp_file,
+)
+
+
+def test_save_and_place_file(tmp_path):
+    content = os.urandom(3 * 1024 + 5)
+    file_path = str(tmp_path / "content" / "a.bin")
+    tmp, sha256, size = save_to_temp_file(io.BytesIO(content), file_path, chunk_size=1024)
+    assert os.path.basename(tmp).startswith(".")
+    assert (sha256, size) == (hashlib.sha256(content).hexdigest(), len(content))
+
+    assert place_uploaded_file(tmp, sha256, size, file_path, override=False)
+    assert file_hash(file_path) == sha256 and not os.path.exists(tmp)
+
+    # 内容相同的文件不重复保存
+    tmp, sha256, size = save_to_temp_file(io.BytesIO(content), file_path)
+    assert not place_uploaded_file(tmp, sha256, size, file_path, override=False)
+    assert os.listdir(tmp_path / "content") == ["a.bin"]
+
+    # 内容不同时替换
+    tmp, sha256, size = save_to_temp_file(io.BytesIO(b"changed"), file_path)
+    assert place_uploaded_file(tmp, sha256, size, file_path, override=False)
+    assert open(file_path, "rb").read() == b"changed"
+
+
+def _chunk(data: bytes) -> UploadFile:
+    return UploadFile(file=io.BytesIO(data), filename="a")
+
+
+def test_resumable_upload(tmp_path, monkeypatch):
+    monkeypatch.setitem(Settings.basic_settings.__dict__, "BASE_TEMP_DIR", tmp_path)
+    content = os.urandom(10000)
+
+    r = upload_chunk(chunk=_chunk(content[:4000]), upload_id="", offset=0)
+    upload_id = r.data["upload_id"]
+    assert r.data["size"] == 4000
+
+    # 重发已接收的分块时返回 409 及已接收的大小
+    r = upload_chunk(chunk=_chunk(content[:4000]), upload_id=upload_id, offset=0)
+    assert r.code == 409 and r.data["size"] == 4000
+
+    offset = upload_status(upload_id=upload_id).data["size"]
+    r = upload_chunk(chunk=_chunk(content[offset:]), upload_id=upload_id, offset=offset)
+    assert r.data["size"] == len(content)
+    assert file_hash(str(tmp_path / "uploads" / f"{upload_id}.part")) == hashlib.sha256(content).hexdigest()
+
+    assert upload_status(upload_id="../x").code == 403
+
+
+def test_concurrent_chunks(tmp_path, monkeypatch):
+    monkeypatch.setitem(Settings.basic_settings.__dict__, "BASE_TEMP_DIR", tmp_path)
+    content = os.urandom(3000)
+    upload_id = upload_chunk(chunk=_chunk(content[:1000]), upload_id="", offset=0).data["upload_id"]
+
+    # 同一分块被并发重发时只追加一次
+    with ThreadPoolExecutor(4) as pool:
+        results = list(pool.map(
+            lambda _: upload_chunk(chunk=_chunk(content[1000:]), upload_id=upload_id, offset=1000),
+            range(4),
+        ))
+    assert sorted(r.code for r in results) == [200, 409, 409, 409]
+    assert upload_status(upload_id=upload_id).data["size"] == len(content)
+
+
+def test_uploaded_file_hash_is_reused(tmp_path, monkeypatch):
+    file_path = str(tmp_path / "a.bin")
+    tmp, sha256, size = save_to_temp_file(io.BytesIO(b"content"), file_path)
+    assert place_uploaded_file(tmp, sha256, size, file_path, override=True)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("file should not be hashed again")
+
+    monkeypatch.setattr(utils, "file_hash", fail)
+    assert cached_file_hash(file_path) == sha256
+
+    # 文件修改后重新计算
+    monkeypatch.undo()
+    with open(file_path, "wb") as f:
+        f.write(b"changed!")
+    assert cached_file_hash(file_path) == hashlib.sha256(b"changed!").hexdigest()
@@ -4,6 +4,7 @@ from open_chatcaht._constants import EMBEDDING_MODEL, VS_TYPE, VECTOR_SEARCH_TOP
     OVERLAP_SIZE, ZH_TITLE_ENHANCE, LLM_MODEL
 from open_chatcaht.api_client import ApiClient, post
 from open_chatcaht.types.knowledge_base.create_knowledge_base_param import CreateKnowledgeBaseParam
+import hashlib
 import json
 import os
 from io import BytesIO
@@ -33,9 +34,15 @@ API_URI_KB_UPDATE_INFO = "/knowledge_base/update_info"
 API_URI_LIST_KB = "/knowledge_base/list_knowledge_bases"
 
 API_URI_URI_LIST_KB_FILE = "/knowledge_base/list_files"
+API_URI_LIST_KB_DOCS = "/knowledge_base/list_docs"
+API_URI_EXPORT_KB_FILES = "/knowledge_base/export_files"
+API_URI_EXPORT_KB_DOCS = "/knowledge_base/export_docs"
 API_URI_SEARCH_KB_DOCS = "/knowledge_base/search_docs"
 
 API_URI_KB_UPLOAD_DOCS = "/knowledge_base/upload_docs"
+API_URI_KB_UPLOAD_CHUNK = "/knowledge_base/upload_chunk"
+API_URI_KB_UPLOAD_STATUS = "/knowledge_base/upload_status"
+API_URI_KB_COMPLETE_UPLOAD = "/knowledge_base/complete_upload"
 API_URI_KB_DOWNLOAD_DOC = "/knowledge_base/download_doc"
 API_URI_DELETE_KB_DOCS = "/knowledge_base/delete_docs"
 API_URI_KB_RECREATE_VECTOR_STORE = "/knowledge_base/recreate_vector_store"
@@ -83,18 +90,121 @@ class KbClient(ApiClient):
         response = self._post(API_URI_DELETE_KB, json=knowledge_base_name)
         return self._get_response_value(response, as_json=True)
 
-    def list_kb(self):
-        response = self._get(API_URI_LIST_KB)
+    def list_kb(self, cursor: str = None, limit: int = None):
+        """
+        列出知识库。指定 limit 时分页返回，下一页的 cursor 可通过 list_kb_page 获取
+        """
+        params = {k: v for k, v in {"cursor": cursor, "limit": limit}.items() if v is not None}
+        response = self._get(API_URI_LIST_KB, params=params)
         return self._get_response_value(response, as_json=True, value_func=lambda r: r.get("data", []))
 
+    def list_kb_page(self, cursor: str = None, limit: int = 100) -> Tuple[List, Optional[str]]:
+        """
+        分页列出知识库，返回 (data, next_cursor)，next_cursor 为 None 表示没有更多数据
+        """
+        params = {"limit": limit}
+        if cursor is not None:
+            params["cursor"] = cursor
+        response = self._get(API_URI_LIST_KB, params=params)
+        return self._get_response_value(response, as_json=True,
+                                        value_func=lambda r: (r.get("data", []), r.get("next_cursor")))
+
     def list_kb_docs_file(
             self,
             knowledge_base_name: str,
+            cursor: str = None,
+            limit: int = None,
     ):
         params = DeleteKnowledgeBaseParam(knowledge_base_name=knowledge_base_name).dict()
+        params.update({k: v for k, v in {"cursor": cursor, "limit": limit}.items() if v is not None})
         response = self._get(API_URI_URI_LIST_KB_FILE, params=params)
         return self._get_response_value(response, as_json=True, value_func=lambda r: r.get("data", []))
 
+    def list_kb_docs_file_page(
+            self,
+            knowledge_base_name: str,
+            cursor: str = None,
+            limit: int = 100,
+    ) -> Tuple[List, Optional[str]]:
+        """
+        分页列出知识库中的文件，返回 (data, next_cursor)
+        """
+        params = {"knowledge_base_name": knowledge_base_name, "limit": limit}
+        if cursor is not None:
+            params["cursor"] = cursor
+        response = self._get(API_URI_URI_LIST_KB_FILE, params=params)
+        return self._get_response_value(response, as_json=True,
+                                        value_func=lambda r: (r.get("data", []), r.get("next_cursor")))
+
+    def list_kb_docs(
+            self,
+            knowledge_base_name: str,
+            file_name: str = "",
+            metadata: dict = {},
+            cursor: str = None,
+            limit: int = 100,
+    ) -> Tuple[List, Optional[str]]:
+        """
+        分页列出知识库中的文档（不进行向量检索），返回 (data, next_cursor)
+        """
+        data = {
+            "knowledge_base_name": knowledge_base_name,
+            "file_name": file_name,
+            "metadata": metadata,
+            "cursor": cursor,
+            "limit": limit,
+        }
+        response = self._post(API_URI_LIST_KB_DOCS, json=data)
+        return self._get_response_value(response, as_json=True,
+                                        value_func=lambda r: (r.get("data", []), r.get("next_cursor")))
+
+    def iter_kb_docs(
+            self,
+            knowledge_base_name: str,
+            file_name: str = "",
+            metadata: dict = {},
+            page_size: int = 100,
+    ) -> Iterator[Dict]:
+        """
+        逐页遍历知识库中的全部文档
+        """
+        cursor = None
+        while True:
+            data, cursor = self.list_kb_docs(knowledge_base_name, file_name=file_name,
+                                             metadata=metadata, cursor=cursor, limit=page_size)
+            yield from data
+            if cursor is None:
+                break
+
+    def _iter_ndjson(self, response) -> Iterator[Dict]:
+        with response as r:
+            r.raise_for_status()
+            for line in r.iter_lines():
+                if line:
+                    yield json.loads(line)
+
+    def export_kb_files(self, knowledge_base_name: str) -> Iterator[Dict]:
+        """
+        以流的方式导出知识库的全部文件信息，服务端返回 NDJSON，逐行解析
+        """
+        response = self._get(API_URI_EXPORT_KB_FILES,
+                             params={"knowledge_base_name": knowledge_base_name},
+                             stream=True, timeout=None)
+        return self._iter_ndjson(response)
+
+    def export_kb_docs(
+            self,
+            knowledge_base_name: str,
+            file_name: str = "",
+            metadata: dict = {},
+    ) -> Iterator[Dict]:
+        """
+        以流的方式导出知识库中的全部文档
+        """
+        data = {"knowledge_base_name": knowledge_base_name, "file_name": file_name, "metadata": metadata}
+        response = self._post(API_URI_EXPORT_KB_DOCS, json=data, stream=True, timeout=None)
+        return self._iter_ndjson(response)
+
     def search_kb_docs(
             self,
             knowledge_base_name: str,
@@ -142,6 +252,88 @@ class KbClient(ApiClient):
                               files=[("files", (filename, file)) for filename, file in files])
         return self._get_response_value(response, as_json=True)
 
+    def upload_kb_doc_resumable(
+            self,
+            file: Union[str, Path],
+            knowledge_base_name: str,
+            file_name: str = None,
+            upload_id: str = None,
+            part_size: int = 8 * 1024 * 1024,
+            override: bool = False,
+            to_vector_store: bool = True,
+            chunk_size=CHUNK_SIZE,
+            chunk_overlap=OVERLAP_SIZE,
+            zh_title_enhance=ZH_TITLE_ENHANCE,
+            not_refresh_vs_cache: bool = False,
+            on_progress: Callable[[int, int], None] = None,
+    ):
+        """
+        分块上传大文件到知识库，每次只读取 part_size 字节。
+        传入之前中断的 upload_id 时从服务器已接收的位置继续上传；
+        上传完成后由服务器校验 sha256，并保存到知识库、进行向量化。
+        on_progress(已上传大小, 文件大小) 在每个分块上传后调用
+        """
+        path = Path(file).absolute()
+        file_name = file_name or path.name
+        total = path.stat().st_size
+        offset = 0
+        if upload_id:
+            response = self._get(API_URI_KB_UPLOAD_STATUS, params={"upload_id": upload_id})
+            result = self._get_response_value(response, as_json=True)
+            if result.get("code") == 200:
+                offset = result["data"]["size"]
+            else:
+                upload_id = None
+
+        sha256 = hashlib.sha256()
+        with path.open("rb") as f:
+            hashed = 0
+            while True:
+                # 已上传的部分只计算哈希，不重复上传
+                while hashed < offset:
+                    data = f.read(min(part_size, offset - hashed))
+                    sha256.update(data)
+                    hashed += len(data)
+                part = f.read(part_size)
+                if not part and upload_id:
+                    break
+                response = self._post(
+                    API_URI_KB_UPLOAD_CHUNK,
+                    data={"upload_id": upload_id or "", "offset": offset},
+                    files=[("chunk", (file_name, part))],
+                )
+                result = self._get_response_value(response, as_json=True)
+                if result.get("code") == 409:  # 服务器已接收的大小与本地不一致，从服务器的位置继续
+                    offset = result["data"]["size"]
+                    sha256 = hashlib.sha256()
+                    hashed = 0
+                    f.seek(0)
+                    continue
+                if result.get("code") != 200:
+                    return result
+                upload_id = result["data"]["upload_id"]
+                sha256.update(part)
+                offset = hashed = result["data"]["size"]
+                if on_progress is not None:
+                    on_progress(offset, total)
+                if not part:
+                    break
+
+        data = {
+            "upload_id": upload_id,
+            "knowledge_base_name": knowledge_base_name,
+            "file_name": file_name,
+            "sha256": sha256.hexdigest(),
+            "override": override,
+            "to_vector_store": to_vector_store,
+            "chunk_size": chunk_size,
+            "chunk_overlap": chunk_overlap,
+            "zh_title_enhance": zh_title_enhance,
+            "not_refresh_vs_cache": not_refresh_vs_cache,
+        }
+        response = self._post(API_URI_KB_COMPLETE_UPLOAD, json=data, timeout=None)
+        return self._get_response_value(response, as_json=True)
+
     def delete_kb_docs(
             self,
             knowledge_base_name: str,
@@ -3,6 +3,7 @@ from open_chatcaht.types.tools.call_tool_param import CallToolParam
 
 API_URI_TOOL_CALL = "/tools/call"
 API_URI_TOOL_LIST = "/tools"
+API_URI_TOOL_RELOAD = "/tools/reload"
 
 
 class ToolClient(ApiClient):
@@ -24,3 +25,10 @@ class ToolClient(ApiClient):
         data = CallToolParam(name=name, tool_input=tool_input).dict()
         resp = self._post(API_URI_TOOL_CALL, json=data)
         return self._get_response_value(resp, as_json=True, value_func=lambda r: r.get("data"))
+
+    def reload(self, reimport: bool = False) -> list:
+        """
+        刷新服务端的工具注册表
+        """
+        resp = self._post(API_URI_TOOL_RELOAD, json={"reimport": reimport})
+        return self._get_response_value(resp, as_json=True, value_func=lambda r: r.get("data", []))